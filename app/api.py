@@ -1,22 +1,20 @@
 # app/api.py
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database.database import init_db
 from app.database.config import get_settings
 from app.middleware.analytics import RequestLoggingMiddleware
 from app.services.logging.logging import get_logger
 from app.core.runtime import get_worker_mode
+from app.routes.probes import probes_route, add_readiness_check, set_ready
+from app.routes.metrics import metrics_route
 
-# Routers
-from app.routes.home import home_route
-from app.routes.user import user_route
-from app.routes.fraud import fraud_route
-from app.routes.gateway import gateway_route
-from app.routes.ui import router as ui_router  
+# Роутеры и сервисы режимов импортируются в _register_routers / lifespan:
+# gateway не тянет pandas, FLAML, бустеры и клиент ClickHouse.
 
 
 logger = get_logger(logger_name=__name__)
@@ -30,7 +28,15 @@ def _register_routers(app: FastAPI) -> None:
     """
     logger.info(f"Starting service in WORKER_MODE={WORKER_MODE}")
 
+    app.include_router(probes_route, tags=["Health"])
+    app.include_router(metrics_route, tags=["Metrics"])
+
     if WORKER_MODE == "api":
+        from app.routes.home import home_route
+        from app.routes.user import user_route
+        from app.routes.gateway import gateway_route
+        from app.routes.ui import router as ui_router
+
         # Public Gateway
         app.include_router(home_route, tags=["Home"])
         app.include_router(user_route, prefix="/api/users", tags=["Users"])
@@ -38,10 +44,14 @@ def _register_routers(app: FastAPI) -> None:
         app.include_router(ui_router, prefix="/ui", include_in_schema=False)
 
     elif WORKER_MODE == "realtime":
+        from app.routes.fraud import fraud_route
+
         # Internal realtime worker
         app.include_router(fraud_route, prefix="/internal/fraud", tags=["Realtime"])
 
     elif WORKER_MODE == "batch":
+        from app.routes.fraud import fraud_route
+
         # Internal batch worker
         app.include_router(fraud_route, prefix="/internal/fraud", tags=["Batch"])
 
@@ -49,23 +59,101 @@ def _register_routers(app: FastAPI) -> None:
         raise RuntimeError(f"Unknown WORKER_MODE={WORKER_MODE}")
 
 
+def _load_model_artifacts() -> None:
+    from app.ml.registry import get_model_registry, start_model_watcher
+
+    get_model_registry().current()
+    start_model_watcher()
+
+
+async def _preload_model() -> None:
+    """
+    Модель и encoders грузятся в фоне: liveness отвечает сразу,
+    readiness — после загрузки. Ранний запрос дождётся загрузки сам.
+    """
+    try:
+        await asyncio.to_thread(_load_model_artifacts)
+    except Exception as e:
+        logger.error(f"Model preload failed: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Initializing application...")
 
     if WORKER_MODE == "api":
+        from app.database.database import init_db
+        from app.services.http_client import init_http_client
+        from app.services.upstreams import init_realtime_upstreams
+
         logger.info("Initializing database (gateway only)")
         try:
             init_db()
         except Exception as e:
             logger.error(f"Database init failed: {e}")
             raise
+        await init_http_client(app)
+        await init_realtime_upstreams(app)
+        add_readiness_check(app, "http_client", lambda: getattr(app.state, "http_client", None) is not None)
     else:
         logger.info("Skipping DB init (worker mode)")
 
+    if WORKER_MODE in ("realtime", "batch"):
+        from app.ml.model import is_model_loaded
+        from app.services.clickhouse_client import clickhouse_pool_stats, init_clickhouse_pool
+
+        app.state.model_preload = asyncio.create_task(_preload_model())
+        add_readiness_check(app, "model", is_model_loaded)
+        add_readiness_check(app, "clickhouse_pool", lambda: clickhouse_pool_stats() is not None)
+        init_clickhouse_pool()
+
+    if WORKER_MODE == "realtime":
+        from app.services.microbatch import start_microbatcher
+        from app.services.prediction_writer import start_prediction_writer
+        from app.services.realtime_executor import start_realtime_executor
+
+        start_realtime_executor()
+        start_microbatcher()
+        start_prediction_writer()
+
+    set_ready(app, True)
+
     yield
 
     logger.info("Shutting down application")
+    set_ready(app, False)
+
+    if WORKER_MODE == "api":
+        from app.services.http_client import close_http_client
+
+        await close_http_client(app)
+
+    if WORKER_MODE == "realtime":
+        from app.database.database import close_async_engine
+        from app.services.microbatch import stop_microbatcher
+        from app.services.prediction_writer import stop_prediction_writer
+        from app.services.realtime_executor import stop_realtime_executor
+
+        stop_microbatcher()
+        # после остановки приёма запросов: очередь дописывается в Postgres
+        stop_prediction_writer()
+        stop_realtime_executor()
+        await close_async_engine()
+
+    if WORKER_MODE == "batch":
+        from app.ml.parallel import shutdown_parallel_scorer
+        from app.services.jobs import shutdown_job_manager
+
+        shutdown_job_manager()
+        shutdown_parallel_scorer()
+
+    if WORKER_MODE in ("realtime", "batch"):
+        from app.ml.registry import stop_model_watcher
+        from app.services.clickhouse_client import close_clickhouse_pool
+
+        await app.state.model_preload
+        stop_model_watcher()
+        close_clickhouse_pool()
 
 
 def create_application() -> FastAPI:
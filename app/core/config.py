@@ -1,4 +1,6 @@
 # app/core/config.py
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
 
@@ -6,13 +8,106 @@ class Settings(BaseSettings):
     # antifraud thresholds
     FRAUD_REVIEW_THRESHOLD: float = 0.134
     FRAUD_BLOCK_THRESHOLD: float = 0.70
+    # JSON с N-зонными порогами по сегментам (см. app/core/decision.py); пусто — два порога выше
+    FRAUD_DECISION_TABLES_PATH: str = ""
 
     AUTH_ENABLED: bool = False
 
+    # рантайм модели: automl (pickle FLAML) | native (см. app/ml/native_model.py)
+    MODEL_RUNTIME: str = "automl"
+    MODEL_NATIVE_DIR: str = "models/native"
+    MODEL_NUM_THREADS: int = 0                 # 0 — по умолчанию библиотеки
+
+    # горячая замена модели (см. app/ml/registry.py)
+    MODEL_WATCH_SECONDS: float = 0.0           # 0 — без наблюдения за файлами
+    MODEL_KEEP_VERSIONS: int = 2               # предыдущих версий для отката
+
+    # realtime micro-batching (см. app/services/microbatch.py)
+    REALTIME_MICROBATCH_ENABLED: bool = False
+    REALTIME_MICROBATCH_MAX_WAIT_MS: float = 3.0
+    REALTIME_MICROBATCH_MAX_SIZE: int = 64
+    REALTIME_MICROBATCH_WORKERS: int = 1
+
+    # одновременные запросы одного пользователя — одно выполнение пайплайна (см. app/services/singleflight.py)
+    REALTIME_SINGLEFLIGHT_ENABLED: bool = True
+
+    # POST /predict/users: email в одном запросе (один запрос фич и один predict на всех)
+    REALTIME_BULK_MAX_USERS: int = 1000
+
+    # потоки для блокирующих вызовов async realtime-эндпоинта (см. app/services/realtime_executor.py)
+    REALTIME_EXECUTOR_WORKERS: int = 0         # 0 — CLICK_POOL_SIZE + 4
+
+    # realtime кэш признаков/скоров (см. app/ml/cache.py)
+    REALTIME_CACHE_ENABLED: bool = False
+    REALTIME_CACHE_MAX_ENTRIES: int = 100_000
+    REALTIME_CACHE_MAX_BYTES: int = 0          # 0 — без ограничения по памяти
+    REALTIME_CACHE_TTL_SECONDS: float = 300.0
+    REALTIME_CACHE_SCORES: bool = True
+
+    # batch: размер чанка потоковой обработки (строк)
+    BATCH_CHUNK_SIZE: int = 50_000
+    # формат выгрузки batch из ClickHouse: columnar (query_df) | rows (кортежи)
+    BATCH_FETCH_FORMAT: str = "columnar"
+    # шардированная выгрузка: N запросов по cityHash64(user_email) % N (см. app/ml/fetch.py)
+    BATCH_FETCH_SHARDS: int = 1                   # 1 — один потоковый запрос
+    BATCH_FETCH_PARALLEL: int = 4                 # одновременных запросов (< CLICK_POOL_SIZE)
+    BATCH_FETCH_RETRIES: int = 2                  # повторов упавшего шарда
+    BATCH_FETCH_RETRY_BACKOFF: float = 1.0        # пауза перед повтором, с (удваивается)
+    # параллельный скоринг чанка по процессам (см. app/ml/parallel.py)
+    BATCH_PARALLEL_WORKERS: int = 1               # 1 — в текущем процессе, 0 — все ядра
+    BATCH_PARALLEL_SHARD_ROWS: int = 10_000       # минимальный размер шарда
+    BATCH_PARALLEL_START_METHOD: str = "spawn"    # spawn | forkserver | fork
+
+    # инкрементальный feature store (см. app/ml/feature_store.py)
+    FEATURE_STORE_ENABLED: bool = False
+    FEATURE_STORE_BACKFILL_DAYS: int = 730        # и TTL store; не меньше окна фичей (365)
+
+    # снимок признаков batch → realtime (см. app/ml/snapshot.py)
+    FEATURE_SNAPSHOT_ENABLED: bool = False
+    FEATURE_SNAPSHOT_DIR: str = "snapshots"
+    FEATURE_SNAPSHOT_MAX_AGE_SECONDS: float = 86_400.0
+    FEATURE_SNAPSHOT_CHECK_SECONDS: float = 5.0
+    FEATURE_SNAPSHOT_KEEP: int = 3
+
+    # массовая запись предсказаний в Postgres (см. app/services/crud/prediction.py)
+    PREDICTION_INSERT_CHUNK_SIZE: int = 10_000
+    PREDICTION_INSERT_METHOD: str = "executemany"   # executemany | copy
+    # write-behind запись realtime-предсказаний (см. app/services/prediction_writer.py)
+    PREDICTION_WRITE_BEHIND_ENABLED: bool = False
+    PREDICTION_QUEUE_MAX_SIZE: int = 10_000
+    PREDICTION_FLUSH_ROWS: int = 500
+    PREDICTION_FLUSH_INTERVAL_MS: float = 200.0
+    PREDICTION_FLUSH_RETRIES: int = 2
+    PREDICTION_OVERFLOW_POLICY: str = "spill"       # spill | drop | block
+    PREDICTION_BLOCK_TIMEOUT_MS: float = 50.0       # для block: ожидание места в очереди
+    PREDICTION_SPILL_DIR: str = "spill"
+    PREDICTION_SHUTDOWN_TIMEOUT: float = 10.0       # дозапись очереди при остановке, с
+
+    # асинхронные batch-джобы (см. app/services/jobs.py)
+    BATCH_JOB_WORKERS: int = 1
+    BATCH_JOB_HISTORY: int = 20
+
+    # API gateway → воркеры (см. app/services/http_client.py)
+    GATEWAY_REALTIME_URL: str = "http://antifraud-realtime:8000/internal/fraud"
+    GATEWAY_BATCH_URL: str = "http://antifraud-batch:8000/internal/fraud"
+    GATEWAY_MAX_CONNECTIONS: int = 200
+    GATEWAY_MAX_KEEPALIVE_CONNECTIONS: int = 50
+    GATEWAY_KEEPALIVE_EXPIRY: float = 30.0
+    GATEWAY_REALTIME_TIMEOUT: float = 30.0
+    GATEWAY_BATCH_TIMEOUT: float = 300.0
+    GATEWAY_JOBS_TIMEOUT: float = 30.0
+
+    # несколько реплик realtime (см. app/services/upstreams.py)
+    GATEWAY_REALTIME_URLS: str = ""                 # через запятую; пусто — GATEWAY_REALTIME_URL
+    GATEWAY_BALANCING: str = "least_outstanding"    # least_outstanding | round_robin
+    GATEWAY_MAX_FAILURES: int = 3
+    GATEWAY_EJECT_SECONDS: float = 10.0
+
     model_config = ConfigDict(
         env_prefix="",
         extra="ignore", 
     )
 
+@lru_cache()
 def get_settings() -> Settings:
     return Settings()
\ No newline at end of file
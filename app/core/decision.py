@@ -1,5 +1,11 @@
 # app/core/decision.py
+import bisect
+import json
 from enum import Enum
+from functools import lru_cache
+
+import numpy as np
+
 from app.core.config import get_settings
 
 class Decision(str, Enum):
@@ -8,16 +14,140 @@ class Decision(str, Enum):
     BLOCK = "BLOCK"
 
 
-def make_decision(risk_score: float) -> Decision:
+# Коды решений в векторном движке: позиция в Decision (ALLOW=0, REVIEW=1, BLOCK=2)
+DECISIONS = tuple(Decision)
+DECISION_CODES = {decision: code for code, decision in enumerate(DECISIONS)}
+DECISION_LABELS = np.array([d.value for d in DECISIONS], dtype=object)
+
+
+class ThresholdTable:
+    """
+    N-зонная таблица порогов: zones = [(threshold, decision), ...] по возрастанию.
+    Скор >= threshold попадает в зону threshold; ниже первого порога — ALLOW.
+    """
+
+    def __init__(self, zones: list[tuple[float, Decision]]):
+        thresholds = [float(t) for t, _ in zones]
+        if any(b <= a for a, b in zip(thresholds, thresholds[1:])):
+            raise ValueError(f"Decision thresholds must be strictly increasing: {thresholds}")
+
+        self.zones = [(t, Decision(d)) for t, (_, d) in zip(thresholds, zones)]
+        self.thresholds = np.array(thresholds, dtype=np.float64)
+        self.codes = np.array(
+            [DECISION_CODES[Decision.ALLOW]] + [DECISION_CODES[d] for _, d in self.zones],
+            dtype=np.int8,
+        )
+        self._decisions = [Decision.ALLOW] + [d for _, d in self.zones]
+        self._bounds = thresholds
+
+    def decide(self, scores: np.ndarray) -> np.ndarray:
+        """
+        Коды решений для массива скоров (NaN — ALLOW, как у сравнений в make_decision).
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        codes = self.codes[np.searchsorted(self.thresholds, scores, side="right")]
+        nan = np.isnan(scores)
+        if nan.any():
+            codes[nan] = self.codes[0]
+        return codes
+
+    def decide_one(self, score: float) -> Decision:
+        if score != score:   # NaN
+            return self._decisions[0]
+        return self._decisions[bisect.bisect_right(self._bounds, score)]
+
+
+class DecisionPolicy:
+    """
+    Таблица порогов по умолчанию + таблицы по сегментам (значениям одной колонки,
+    например канала или main_affiliate). Пороги загружаются один раз (get_decision_policy).
+    """
+
+    def __init__(
+        self,
+        default: ThresholdTable,
+        segment_column: str | None = None,
+        segments: dict[str, ThresholdTable] | None = None,
+    ):
+        self.default = default
+        self.segment_column = segment_column
+        self.segments = segments or {}
+
+    def decide(
+        self,
+        scores: np.ndarray,
+        segments: np.ndarray | None = None,
+        tables: dict | None = None,
+    ) -> np.ndarray:
+        """
+        Коды решений; segments — значения segment_column по строкам,
+        tables — таблицы по этим значениям (по умолчанию self.segments).
+        """
+        codes = self.default.decide(scores)
+        tables = self.segments if tables is None else tables
+        if segments is None or not tables:
+            return codes
+
+        scores = np.asarray(scores, dtype=np.float64)
+        segments = np.asarray(segments)
+        for key, table in tables.items():
+            mask = segments == key
+            if mask.any():
+                codes[mask] = table.decide(scores[mask])
+        return codes
+
+    def decide_one(self, score: float, segment=None) -> Decision:
+        return self.segments.get(segment, self.default).decide_one(score)
+
+
+def decision_labels(codes: np.ndarray) -> np.ndarray:
+    """
+    Коды → строковые значения Decision (object-массив).
+    """
+    return DECISION_LABELS[codes]
+
+
+def _parse_zones(zones: list) -> ThresholdTable:
+    return ThresholdTable([(threshold, Decision(decision)) for threshold, decision in zones])
+
+
+def load_decision_policy(path: str = "") -> DecisionPolicy:
     """
-    3-zone antifraud decision logic
+    Пороги из настроек; path — JSON с N-зонными таблицами по сегментам:
+    {"segment": "channel",
+     "default": [[0.134, "REVIEW"], [0.7, "BLOCK"]],
+     "segments": {"seo": [[0.2, "REVIEW"], [0.5, "REVIEW"], [0.8, "BLOCK"]]}}
+    default необязателен (FRAUD_REVIEW_THRESHOLD / FRAUD_BLOCK_THRESHOLD).
     """
     settings = get_settings()
+    default = ThresholdTable([
+        (settings.FRAUD_REVIEW_THRESHOLD, Decision.REVIEW),
+        (settings.FRAUD_BLOCK_THRESHOLD, Decision.BLOCK),
+    ])
+    if not path:
+        return DecisionPolicy(default)
+
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+
+    segments = {str(key): _parse_zones(zones) for key, zones in config.get("segments", {}).items()}
+    if segments and not config.get("segment"):
+        raise ValueError("Decision tables: 'segment' column is required for per-segment thresholds")
 
-    if risk_score >= settings.FRAUD_BLOCK_THRESHOLD:
-        return Decision.BLOCK
+    return DecisionPolicy(
+        default=_parse_zones(config["default"]) if "default" in config else default,
+        segment_column=config.get("segment"),
+        segments=segments,
+    )
 
-    if risk_score >= settings.FRAUD_REVIEW_THRESHOLD:
-        return Decision.REVIEW
 
-    return Decision.ALLOW
\ No newline at end of file
+@lru_cache()
+def get_decision_policy() -> DecisionPolicy:
+    return load_decision_policy(get_settings().FRAUD_DECISION_TABLES_PATH)
+
+
+def make_decision(risk_score: float, segment=None) -> Decision:
+    """
+    3-zone antifraud decision logic (по умолчанию; таблицы — см. DecisionPolicy)
+    """
+    return get_decision_policy().decide_one(risk_score, segment)
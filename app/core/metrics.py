@@ -0,0 +1,65 @@
+# app/core/metrics.py
+from typing import Iterable
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+
+# Метрики процесса для Prometheus (prometheus-client, реестр по умолчанию).
+#   - счётчики, gauge и гистограммы с метками: дочернюю серию берём через .labels(...)
+#     один раз и дальше только observe / inc
+#   - значения, которые считываются в момент scrape (пул ClickHouse, очередь записи,
+#     версия модели), — collectors рядом со своими модулями: REGISTRY.register(...)
+# Каждый процесс uvicorn отдаёт свои метрики; агрегация — на стороне Prometheus.
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# секунды: от realtime-запроса (мс) до batch-чанка (минуты)
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0,
+)
+
+
+def render() -> bytes:
+    """
+    Текст для GET /metrics.
+    """
+    return generate_latest(REGISTRY)
+
+
+# ---------------- метрики сервиса ----------------
+
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "antifraud_http_requests_in_flight", "HTTP requests being processed",
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "antifraud_http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status"), buckets=DEFAULT_BUCKETS,
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    "antifraud_pipeline_stage_seconds", "Scoring pipeline stage latency",
+    ("pipeline", "stage"), buckets=DEFAULT_BUCKETS,
+)
+PIPELINE_IN_FLIGHT = Gauge(
+    "antifraud_pipeline_in_flight", "Scoring pipeline runs in progress",
+    ("pipeline",),
+)
+DECISIONS_TOTAL = Counter(
+    "antifraud_decisions_total", "Scored users by decision zone",
+    ("pipeline", "decision"),
+)
+
+
+def stage_timer(pipeline: str, stage: str):
+    """
+    with stage_timer("realtime", "fetch"): ... — время стадии пайплайна.
+    """
+    return PIPELINE_STAGE_SECONDS.labels(pipeline, stage).time()
+
+
+def count_decisions(pipeline: str, counts: Iterable[tuple[str, int]]) -> None:
+    """
+    Решения по зонам: counts — пары (значение Decision, число пользователей).
+    """
+    for decision, count in counts:
+        if count:
+            DECISIONS_TOTAL.labels(pipeline, decision).inc(count)
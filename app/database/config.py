@@ -33,19 +33,27 @@ class Settings(BaseSettings):
 
     # --- Build DB URL ---
     @property
-    def DATABASE_URL(self) -> str:
+    def SYNC_DATABASE_URL(self) -> str:
         if self.TESTING:
             return "sqlite://"
-        if self.USE_ASYNC:
-            return (
-                f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}"
-                f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
-            )
         return (
             f"postgresql+psycopg://{self.DB_USER}:{self.DB_PASS}"
             f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
         )
 
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        if self.TESTING:
+            return "sqlite+aiosqlite://"
+        return (
+            f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}"
+            f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+        )
+
+    @property
+    def DATABASE_URL(self) -> str:
+        return self.ASYNC_DATABASE_URL if self.USE_ASYNC else self.SYNC_DATABASE_URL
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -25,8 +25,9 @@ def get_database_engine():
             ", ".join(defaults)
         )
 
+    # синхронный движок всегда на psycopg; asyncpg (USE_ASYNC) — только get_async_engine
     return create_engine(
-        settings.DATABASE_URL,
+        settings.SYNC_DATABASE_URL,
         echo=settings.DEBUG,
         pool_size=5,
         max_overflow=10,
@@ -43,11 +44,87 @@ def get_session():
         yield session
 
 
+# ---------------- ASYNC (USE_ASYNC) ----------------
+
+_async_engine = None
+
+
+def get_async_engine():
+    """
+    Async-движок: asyncpg, в тестах — aiosqlite. Создаётся лениво,
+    поэтому без USE_ASYNC драйвер не нужен.
+    """
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        if settings.TESTING or os.getenv("TESTING") == "1":
+            _async_engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        else:
+            _async_engine = create_async_engine(
+                settings.ASYNC_DATABASE_URL,
+                echo=settings.DEBUG,
+                pool_size=5,
+                max_overflow=10,
+                pool_pre_ping=True,
+                pool_recycle=3600,
+            )
+    return _async_engine
+
+
+def async_session():
+    """
+    async with async_session() as db: ... — AsyncSession на async-движке.
+    """
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    return AsyncSession(get_async_engine(), expire_on_commit=False)
+
+
+async def get_async_session():
+    async with async_session() as session:
+        yield session
+
+
+async def close_async_engine() -> None:
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
+
+# ---------------- SCHEMA ----------------
+# Схему Postgres меняют миграции alembic (app/migrations), один раз до старта реплик:
+#   alembic -c app/alembic.ini upgrade head
+# Приложение DDL не выполняет — только проверяет, что база на последней ревизии.
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(__file__)), "alembic.ini")
+
+
+def check_schema_version():
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    heads = set(ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_heads())
+    with engine.connect() as conn:
+        current = set(MigrationContext.configure(conn).get_current_heads())
+    if current != heads:
+        raise RuntimeError(
+            f"Database schema is at {sorted(current) or 'no revision'}, expected {sorted(heads)}: "
+            "run `alembic -c app/alembic.ini upgrade head`"
+        )
+
+
 def init_db(drop_all: bool = False):
     try:
-        if drop_all:
-            SQLModel.metadata.drop_all(engine)
-        SQLModel.metadata.create_all(engine)
+        # тесты: in-memory SQLite без миграций — таблицы прямо из моделей
+        if settings.TESTING or os.getenv("TESTING") == "1":
+            if drop_all:
+                SQLModel.metadata.drop_all(engine)
+            SQLModel.metadata.create_all(engine)
+        else:
+            check_schema_version()
     except Exception as e:
         logger.error(f"[init_db] DB init error: {e}")
         raise
@@ -1,28 +1,64 @@
 from starlette.middleware.base import BaseHTTPMiddleware
 import time
+from app.core.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT
 from app.services.logging.logging import get_logger
 
 logger = get_logger(logger_name=__name__, level="INFO")
 
 
+def _route_template(scope: dict) -> str:
+    """
+    Шаблон маршрута (/internal/fraud/predict/user/{user_email}), а не путь:
+    иначе в метриках будет серия на каждый email. Маршрут берём из scope после роутинга:
+    у подключённого роутера FastAPI кладёт в scope["route"] исходный маршрут (без prefix),
+    а маршрут с prefix, который он сопоставил, — в effective_route_context.
+    """
+    route = scope.get("fastapi", {}).get("effective_route_context") or scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+
 class RequestLoggingMiddleware(BaseHTTPMiddleware):
     """
     Простая middleware для логирования:
     - пути запроса
     - времени обработки
+    (+ метрики: запросы в полёте, латентность по шаблону маршрута)
+
+    Время считается до конца отправки тела: у потоковых ответов (/predict/batch,
+    выгрузка джоба) call_next возвращается до первого чанка.
     """
 
     async def dispatch(self, request, call_next):
         start_time = time.time()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
 
-        response = await call_next(request)
+        def finish(status: int) -> None:
+            elapsed = time.time() - start_time
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_SECONDS.labels(
+                request.method,
+                _route_template(request.scope),
+                f"{status // 100}xx",
+            ).observe(elapsed)
+            logger.info(
+                f"{request.method} {request.url.path} completed in {elapsed * 1000:.2f} ms "
+                f"status={status}"
+            )
 
-        process_time = (time.time() - start_time) * 1000
+        try:
+            response = await call_next(request)
+        except BaseException:
+            finish(500)
+            raise
 
-        logger.info(
-            f"{request.method} {request.url.path} completed in {process_time:.2f} ms "
-            f"status={response.status_code}"
-        )
+        body = response.body_iterator
 
-        return response
+        async def timed_body():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                finish(response.status_code)
 
+        response.body_iterator = timed_body()
+        return response
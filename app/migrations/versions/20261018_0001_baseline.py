@@ -0,0 +1,51 @@
+"""baseline: user и prediction, как их создавал create_all
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Базы, созданные раньше через create_all в init_db, уже содержат эти таблицы:
+# if_not_exists позволяет применить ревизию к ним без stamp.
+
+def upgrade() -> None:
+    op.create_table(
+        "user",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("email", sqlmodel.AutoString(), nullable=False),
+        sa.Column("password", sqlmodel.AutoString(), nullable=False),
+        sa.Column("is_admin", sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_user_email", "user", ["email"], unique=True, if_not_exists=True)
+
+    op.create_table(
+        "prediction",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_email", sqlmodel.AutoString(), nullable=False),
+        sa.Column("risk_score", sa.Float(), nullable=False),
+        sa.Column("decision", sqlmodel.AutoString(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_prediction_user_email", "prediction", ["user_email"], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_prediction_user_email", table_name="prediction")
+    op.drop_table("prediction")
+    op.drop_index("ix_user_email", table_name="user")
+    op.drop_table("user")
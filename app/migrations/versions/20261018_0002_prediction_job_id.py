@@ -0,0 +1,27 @@
+"""prediction.job_id: предсказания batch-джоба (app/services/jobs.py)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # nullable, без значения по умолчанию: realtime-предсказания и старые строки — NULL
+    op.add_column("prediction", sa.Column("job_id", sqlmodel.AutoString(), nullable=True))
+    op.create_index("ix_prediction_job_id", "prediction", ["job_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_prediction_job_id", table_name="prediction")
+    op.drop_column("prediction", "job_id")
@@ -0,0 +1,176 @@
+# app/ml/cache.py
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.core.config import get_settings
+
+
+@dataclass
+class CacheEntry:
+    column_names: tuple[str, ...]
+    row: tuple
+    score: dict | None
+    expires_at: float
+    size: int
+
+
+def _estimate_size(row: tuple) -> int:
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+
+
+class FeatureCache:
+    """
+    Ограниченный TTL + LRU кэш признаков realtime-воркера.
+
+    Ключ — (нормализованный email, feature_days).
+    Значение — строка признаков из ClickHouse и (опционально) итоговый скор.
+    Вытеснение по числу записей и/или по оценке занимаемой памяти.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 100_000,
+        max_bytes: int = 0,
+        ttl_seconds: float = 300.0,
+        cache_scores: bool = True,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.cache_scores = cache_scores
+
+        self._data: OrderedDict[tuple[str, int], CacheEntry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, email: str, feature_days: int) -> CacheEntry | None:
+        key = (email, feature_days)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def put_features(self, email: str, feature_days: int, column_names: tuple[str, ...], row: tuple) -> None:
+        key = (email, feature_days)
+        entry = CacheEntry(
+            column_names=column_names,
+            row=row,
+            score=None,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            size=_estimate_size(row),
+        )
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = entry
+            self._bytes += entry.size
+            self._evict()
+
+    def put_score(self, email: str, feature_days: int, score: dict) -> None:
+        """
+        Дописывает скор к уже закэшированной строке признаков (TTL не продлевается).
+        """
+        if not self.cache_scores:
+            return
+        with self._lock:
+            entry = self._data.get((email, feature_days))
+            if entry is not None:
+                entry.score = score
+
+    def invalidate(self, email: str | None = None) -> int:
+        """
+        Удаляет записи пользователя (все feature_days) или весь кэш.
+        Возвращает число удалённых записей.
+        """
+        with self._lock:
+            if email is None:
+                removed = len(self._data)
+                self._data.clear()
+                self._bytes = 0
+                return removed
+
+            keys = [k for k in self._data if k[0] == email]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def invalidate_scores(self) -> None:
+        """
+        Сбрасывает закэшированные скоры, оставляя признаки (например, при смене модели).
+        """
+        with self._lock:
+            for entry in self._data.values():
+                entry.score = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+    def _remove(self, key) -> None:
+        entry = self._data.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self._data and (
+            len(self._data) > self.max_entries
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._data))
+            self._remove(key)
+            self._evictions += 1
+
+
+# ---------------- singleton ----------------
+
+_cache: FeatureCache | None = None
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def get_feature_cache() -> FeatureCache | None:
+    """
+    Кэш realtime-воркера или None, если он выключен в настройках.
+    Настройки читаются один раз при первом обращении.
+    """
+    global _cache, _initialized
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                settings = get_settings()
+                if settings.REALTIME_CACHE_ENABLED:
+                    _cache = FeatureCache(
+                        max_entries=settings.REALTIME_CACHE_MAX_ENTRIES,
+                        max_bytes=settings.REALTIME_CACHE_MAX_BYTES,
+                        ttl_seconds=settings.REALTIME_CACHE_TTL_SECONDS,
+                        cache_scores=settings.REALTIME_CACHE_SCORES,
+                    )
+                _initialized = True
+    return _cache
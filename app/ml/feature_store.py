@@ -0,0 +1,382 @@
+# app/ml/feature_store.py
+import time
+import uuid
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Optional
+
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+# Инкрементальный feature store.
+#
+# Вместо полного пересчёта 365 дней по сырым таблицам храним дневные частичные
+# агрегаты на пользователя (суммы, min/max, uniqState, anyHeavyState) в
+# AggregatingMergeTree. Ежедневно дописываются только новые закрытые дни;
+# запрос фичей мержит состояния за окно + «хвост» из сырых данных: все дни после
+# watermark store (последнего загруженного дня), а не только сегодняшний —
+# иначе дни между последним refresh и сегодня выпали бы из фичей.
+# sumState при повторной вставке дня удвоил бы суммы, поэтому refresh идемпотентен:
+# новые дни собираются в staging-таблице и подменяют месячные партиции store
+# целиком (REPLACE PARTITION атомарен) — параллельные и повторные запуски дают тот же store.
+# Источники считаются не-Nullable (как в dbt_mart).
+
+STORE_DATABASE = "antifraud"
+SALES_TABLE = f"{STORE_DATABASE}.user_daily_sales"
+MEMBERS_TABLE = f"{STORE_DATABASE}.user_daily_members"
+
+# Шард пользователя в batch_shard-запросах: по нормализованному email,
+# одинаково для store и сырых таблиц (app/ml/fetch.py)
+SHARD_CONDITION = "cityHash64({email}) % {{shards:UInt16}} = {{shard:UInt16}}"
+
+# Порядок колонок совпадает с SELECT в app/ml/fetch.py::_build_features_query
+FEATURE_COLUMNS = (
+    "user_email", "n_sales", "n_declines", "decline_ratio", "avg_sale_amount",
+    "max_sale_amount", "min_sale_amount", "n_active_days", "sales_density",
+    "min_sale_date", "unique_countries", "unique_card_brands", "unique_gateways",
+    "unique_mids", "unique_sites", "unique_projects", "n_trials", "n_rebills",
+    "n_upgrades", "n_conversions", "n_onetime", "multi_site_flag",
+    "multi_project_flag", "geo_mismatch_any", "main_affiliate", "unique_affiliates",
+    "n_members", "n_dc_events", "first_reg_date", "last_reg_date", "n_reg_dates",
+    "members_per_regdate", "device_type", "os", "channel", "cross_ratio",
+)
+
+SUB_TYPES = ("trial", "rebill", "upgrade", "conversion", "onetime")
+MEMBER_TRANS_TYPES = ("initial", "onetime", "rebill", "trial", "conversion")
+
+
+def _tail_start(table: str) -> str:
+    """
+    Первый день, которого нет в store (watermark + 1), — с него фичи считаются по сырым
+    данным. Пустой store: max(day) = 1970-01-01, хвост покрывает всё окно.
+    """
+    return f"(SELECT max(day) + 1 FROM {table})"
+
+
+# ---------------- CLICKHOUSE: DDL ----------------
+
+def feature_store_ddl(retention_days: int) -> tuple[str, ...]:
+    """
+    DDL store; дни старше retention_days удаляются TTL (окно фичей — не больше).
+    """
+    return (
+        f"CREATE DATABASE IF NOT EXISTS {STORE_DATABASE}",
+        f"""
+        CREATE TABLE IF NOT EXISTS {SALES_TABLE}
+        (
+            user_email String,
+            day Date,
+            n_sales_state AggregateFunction(sum, UInt64),
+            n_declines_state AggregateFunction(sum, UInt64),
+            amount_sum AggregateFunction(sum, Float64),
+            max_sale_amount_state AggregateFunction(max, Float64),
+            min_sale_amount_state AggregateFunction(min, Float64),
+            countries AggregateFunction(uniq, String),
+            card_brands AggregateFunction(uniq, String),
+            gateways AggregateFunction(uniq, String),
+            mids AggregateFunction(uniq, String),
+            sites AggregateFunction(uniq, String),
+            projects AggregateFunction(uniq, String),
+            n_trials_state AggregateFunction(sum, UInt64),
+            n_rebills_state AggregateFunction(sum, UInt64),
+            n_upgrades_state AggregateFunction(sum, UInt64),
+            n_conversions_state AggregateFunction(sum, UInt64),
+            n_onetime_state AggregateFunction(sum, UInt64),
+            n_geo_mismatch AggregateFunction(sum, UInt64),
+            main_affiliate_state AggregateFunction(anyHeavy, String),
+            affiliates AggregateFunction(uniq, String)
+    )
+    ENGINE = AggregatingMergeTree
+    PARTITION BY toYYYYMM(day)
+    ORDER BY (user_email, day)
+    TTL day + INTERVAL {retention_days} DAY
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {MEMBERS_TABLE}
+    (
+        user_email String,
+        day Date,
+        members AggregateFunction(uniq, String),
+        n_dc_events_state AggregateFunction(sum, UInt64),
+        device_type_state AggregateFunction(anyHeavy, String),
+        os_state AggregateFunction(anyHeavy, String),
+        channel_state AggregateFunction(anyHeavy, String),
+        cross_sum AggregateFunction(sum, Float64)
+    )
+    ENGINE = AggregatingMergeTree
+    PARTITION BY toYYYYMM(day)
+    ORDER BY (user_email, day)
+    TTL day + INTERVAL {retention_days} DAY
+    """,
+    )
+
+
+# ---------------- CLICKHOUSE: дневные состояния ----------------
+# Один и тот же SELECT используется для дозаписи закрытых дней в store
+# и для «хвоста» после watermark в запросе фичей — типы состояний совпадают.
+
+def _sales_daily_select(where: str) -> str:
+    return f"""
+        SELECT
+            lower(trim(user_email)) AS user_email,
+            toDate(event_date) AS day,
+            sumState(toUInt64(1)) AS n_sales_state,
+            sumState(toUInt64(transaction_status = 'DECLINED')) AS n_declines_state,
+            sumState(toFloat64(amount)) AS amount_sum,
+            maxState(toFloat64(amount)) AS max_sale_amount_state,
+            minState(toFloat64(amount)) AS min_sale_amount_state,
+            uniqState(toString(source_country)) AS countries,
+            uniqState(toString(card_brand)) AS card_brands,
+            uniqState(toString(gateway)) AS gateways,
+            uniqState(toString(mid)) AS mids,
+            uniqState(toString(site_name)) AS sites,
+            uniqState(toString(project)) AS projects,
+            sumState(toUInt64(transaction_sub_type = 'trial')) AS n_trials_state,
+            sumState(toUInt64(transaction_sub_type = 'rebill')) AS n_rebills_state,
+            sumState(toUInt64(transaction_sub_type = 'upgrade')) AS n_upgrades_state,
+            sumState(toUInt64(transaction_sub_type = 'conversion')) AS n_conversions_state,
+            sumState(toUInt64(transaction_sub_type = 'onetime')) AS n_onetime_state,
+            sumState(toUInt64(bin_country != source_country)) AS n_geo_mismatch,
+            anyHeavyState(toString(attraction_affiliate_username)) AS main_affiliate_state,
+            uniqState(toString(attraction_affiliate_username)) AS affiliates
+        FROM dbt_mart.dim_merchant_transactions
+        WHERE transaction_type = 'SALE'
+          AND is_test = 0
+          AND project != 'adxad'
+          AND user_email != ''
+          AND {where}
+        GROUP BY user_email, day
+    """
+
+
+def _members_daily_select(where: str) -> str:
+    return f"""
+        SELECT
+            lower(trim(member_email)) AS user_email,
+            toDate(attraction_date) AS day,
+            uniqState(toString(member_id)) AS members,
+            sumState(toUInt64(1)) AS n_dc_events_state,
+            anyHeavyState(toString(device_type)) AS device_type_state,
+            anyHeavyState(toString(os)) AS os_state,
+            anyHeavyState(toString(channel)) AS channel_state,
+            sumState(toFloat64(is_cross)) AS cross_sum
+        FROM dbt_mart.dim_client_paysites_member_transactions
+        WHERE trans_type IN ('initial','onetime','rebill','trial','conversion')
+          AND member_email != ''
+          AND {where}
+        GROUP BY user_email, day
+    """
+
+
+@lru_cache(maxsize=None)
+def build_store_features_query(mode: str) -> str:
+    """
+    Запрос фичей поверх store; режимы и параметры как у _build_features_query:
+    batch ({active_days}, {feature_days}), batch_shard (+ {shard}, {shards}),
+    user ({email}), users ({emails}).
+    Колонки и их порядок совпадают с запросом по сырым таблицам.
+    """
+    if mode == "user":
+        active_users_cte = """
+        active_users AS (
+            SELECT lower(trim({email:String})) AS user_email
+        ),
+        """
+    elif mode == "users":
+        active_users_cte = """
+        active_users AS (
+            SELECT DISTINCT lower(trim(arrayJoin({emails:Array(String)}))) AS user_email
+        ),
+        """
+    elif mode in ("batch", "batch_shard"):
+        store_shard = raw_shard = ""
+        if mode == "batch_shard":
+            store_shard = "AND " + SHARD_CONDITION.format(email="user_email")
+            raw_shard = "AND " + SHARD_CONDITION.format(email="lower(trim(user_email))")
+        raw_since = _tail_start(SALES_TABLE)
+        active_users_cte = f"""
+        active_users AS (
+            SELECT DISTINCT user_email
+            FROM {SALES_TABLE}
+            WHERE day >= today() - {{active_days:UInt16}}
+              {store_shard}
+            UNION DISTINCT
+            SELECT DISTINCT lower(trim(user_email)) AS user_email
+            FROM dbt_mart.dim_merchant_transactions
+            WHERE event_date >= greatest({raw_since}, today() - {{active_days:UInt16}})
+              AND transaction_type = 'SALE'
+              AND is_test = 0
+              AND project != 'adxad'
+              AND user_email != ''
+              {raw_shard}
+        ),
+        """
+    else:
+        raise ValueError(f"Unknown feature query mode: {mode}")
+
+    in_window = "day >= today() - {feature_days:UInt16} AND user_email IN (SELECT user_email FROM active_users)"
+    # store отдаёт дни до watermark включительно, сырые данные — всё после него
+    sales_tail = _sales_daily_select(
+        f"event_date >= greatest({_tail_start(SALES_TABLE)}, today() - {{feature_days:UInt16}}) "
+        "AND lower(trim(user_email)) IN (SELECT user_email FROM active_users)"
+    )
+    members_tail = _members_daily_select(
+        f"attraction_date >= greatest({_tail_start(MEMBERS_TABLE)}, today() - {{feature_days:UInt16}}) "
+        "AND lower(trim(member_email)) IN (SELECT user_email FROM active_users)"
+    )
+
+    return f"""
+    WITH
+    {active_users_cte}
+
+    sales_states AS (
+        SELECT * FROM {SALES_TABLE} WHERE {in_window}
+        UNION ALL
+        {sales_tail}
+    ),
+    members_states AS (
+        SELECT * FROM {MEMBERS_TABLE} WHERE {in_window}
+        UNION ALL
+        {members_tail}
+    ),
+    dm_features AS (
+        SELECT
+            user_email,
+            sumMerge(n_sales_state) AS n_sales,
+            sumMerge(n_declines_state) AS n_declines,
+            if(n_sales > 0, n_declines / n_sales, 0) AS decline_ratio,
+            sumMerge(amount_sum) / n_sales AS avg_sale_amount,
+            maxMerge(max_sale_amount_state) AS max_sale_amount,
+            minMerge(min_sale_amount_state) AS min_sale_amount,
+            uniqExact(day) AS n_active_days,
+            if(n_sales > 0, n_active_days / n_sales, 0) AS sales_density,
+            min(day) AS min_sale_date,
+            uniqMerge(countries) AS unique_countries,
+            uniqMerge(card_brands) AS unique_card_brands,
+            uniqMerge(gateways) AS unique_gateways,
+            uniqMerge(mids) AS unique_mids,
+            uniqMerge(sites) AS unique_sites,
+            uniqMerge(projects) AS unique_projects,
+            sumMerge(n_trials_state) AS n_trials,
+            sumMerge(n_rebills_state) AS n_rebills,
+            sumMerge(n_upgrades_state) AS n_upgrades,
+            sumMerge(n_conversions_state) AS n_conversions,
+            sumMerge(n_onetime_state) AS n_onetime,
+            unique_sites > 3 AS multi_site_flag,
+            unique_projects > 2 AS multi_project_flag,
+            sumMerge(n_geo_mismatch) > 0 AS geo_mismatch_any,
+            anyHeavyMerge(main_affiliate_state) AS main_affiliate,
+            uniqMerge(affiliates) AS unique_affiliates
+        FROM sales_states
+        GROUP BY user_email
+    ),
+    dc_features AS (
+        SELECT
+            user_email,
+            uniqMerge(members) AS n_members,
+            sumMerge(n_dc_events_state) AS n_dc_events,
+            min(day) AS first_reg_date,
+            max(day) AS last_reg_date,
+            uniqExact(day) AS n_reg_dates,
+            n_members / n_reg_dates AS members_per_regdate,
+            anyHeavyMerge(device_type_state) AS device_type,
+            anyHeavyMerge(os_state) AS os,
+            anyHeavyMerge(channel_state) AS channel,
+            sumMerge(cross_sum) / n_dc_events AS cross_ratio
+        FROM members_states
+        GROUP BY user_email
+    )
+    SELECT
+        coalesce(dm.user_email, dc.user_email) AS user_email,
+        dm.* EXCEPT user_email,
+        dc.* EXCEPT user_email
+    FROM dm_features dm
+    LEFT JOIN dc_features dc
+        ON dm.user_email = dc.user_email
+    """
+
+
+# ---------------- CLICKHOUSE: обновление ----------------
+
+def ensure_feature_store(client, retention_days: int = 730) -> None:
+    for statement in feature_store_ddl(retention_days):
+        client.command(statement)
+
+
+def _months(start_day: date, last_day: date) -> list[int]:
+    """
+    Партиции toYYYYMM(day) с start_day по last_day включительно.
+    """
+    months, year, month = [], start_day.year, start_day.month
+    while (year, month) <= (last_day.year, last_day.month):
+        months.append(year * 100 + month)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def _watermark(client, table: str) -> Optional[date]:
+    """
+    Последний загруженный день (None — таблица пуста).
+    """
+    result = client.query(f"SELECT max(day), count() FROM {table}")
+    last_day, rows = result.result_rows[0]
+    return last_day if rows else None
+
+
+def refresh_feature_store(client, backfill_days: int = 730, today: Optional[date] = None) -> dict:
+    """
+    Дописывает в store закрытые дни после watermark (до вчерашнего включительно).
+    Первый запуск — backfill за backfill_days. Сегодняшний день в store не пишется.
+    Всё после watermark (сегодня и пропущенные дни, если refresh не запускался
+    или упал) запрос фичей досчитывает из сырых данных.
+
+    Идемпотентно: затронутые месяцы собираются в staging-таблице (уже загруженные
+    дни месяца + новые) и заменяют партиции store через REPLACE PARTITION. Повторный
+    или параллельный запуск (расписание, POST /feature-store/refresh, реплики batch)
+    перезаписывает те же дни, а не добавляет их второй раз.
+    """
+    ensure_feature_store(client, retention_days=backfill_days)
+    today = today or date.today()
+    stats = {}
+
+    for table, select, date_column in (
+        (SALES_TABLE, _sales_daily_select, "event_date"),
+        (MEMBERS_TABLE, _members_daily_select, "attraction_date"),
+    ):
+        last_day = _watermark(client, table)
+        start_day = last_day + timedelta(days=1) if last_day else today - timedelta(days=backfill_days)
+        if start_day >= today:
+            stats[table] = {"from": None, "to": None, "seconds": 0.0}
+            continue
+
+        started = time.perf_counter()
+        months = _months(start_day, today - timedelta(days=1))
+        staging = f"{table}_staging_{uuid.uuid4().hex[:12]}"
+        client.command(f"CREATE TABLE {staging} AS {table}")
+        try:
+            # загруженные дни первого месяца — партиция заменяется целиком
+            client.command(
+                f"INSERT INTO {staging} SELECT * FROM {table} "
+                "WHERE day >= {month_start:Date} AND day < {start_day:Date}",
+                parameters={"month_start": start_day.replace(day=1), "start_day": start_day},
+            )
+            client.command(
+                f"INSERT INTO {staging} "
+                + select(f"{date_column} >= {{start_day:Date}} AND {date_column} < {{end_day:Date}}"),
+                parameters={"start_day": start_day, "end_day": today},
+            )
+            for month in months:
+                client.command(f"ALTER TABLE {table} REPLACE PARTITION ID '{month}' FROM {staging}")
+        finally:
+            client.command(f"DROP TABLE IF EXISTS {staging}")
+
+        stats[table] = {
+            "from": start_day.isoformat(),
+            "to": (today - timedelta(days=1)).isoformat(),
+            "partitions": len(months),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    logger.info(f"Feature store refreshed: {stats}")
+    return stats
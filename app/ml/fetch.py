@@ -1,46 +1,121 @@
 # app/ml/fetch.py
+import string
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Callable, Iterator, List, Optional
+
 import pandas as pd
-from typing import Optional
+
+from app.core.config import get_settings
+from app.ml.feature_store import SHARD_CONDITION, build_store_features_query
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
 
 
-def run_query(query: str, client) -> pd.DataFrame:
-    result = client.query(query)
+def run_query(query: str, client, parameters: Optional[dict] = None) -> pd.DataFrame:
+    result = client.query(query, parameters=parameters)
     return pd.DataFrame(result.result_rows, columns=result.column_names)
 
 
-def _build_features_query(active_days: int, feature_days: int, user_email: Optional[str] = None) -> str:
+def run_query_rows(query: str, client, parameters: Optional[dict] = None) -> tuple[tuple[str, ...], list[tuple]]:
+    """
+    Сырые строки результата без сборки DataFrame (для realtime fast path).
+    """
+    result = client.query(query, parameters=parameters)
+    return tuple(result.column_names), result.result_rows
+
+
+def run_query_df(query: str, client, parameters: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Колоночная выборка: clickhouse_connect собирает колонки сразу в NumPy-массивы
+    родного типа (UInt64, Float64, ...) без промежуточного списка кортежей.
+    """
+    return to_signed_counts(client.query_df(query, parameters=parameters, use_extended_dtypes=False))
+
+
+def to_signed_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    count()/uniq() приходят как UInt64; переводим в int64, чтобы разности
+    в feature engineering (n_declines - n_rebills) не переполнялись,
+    как и в строковом пути (Python int → int64).
+    """
+    unsigned = [col for col, dtype in df.dtypes.items() if dtype.kind == "u"]
+    if unsigned:
+        df[unsigned] = df[unsigned].astype("int64")
+    return df
+
+
+# lower() в ClickHouse меняет регистр только ASCII; str.lower() — любой Unicode
+ASCII_UPPER_TO_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def normalize_email(user_email: str) -> str:
+    """
+    Нормализация email так же, как в SQL: lower(trim(user_email)).
+    Только ASCII-буквы: "ÄBC@X.DE" → "Äbc@x.de", как вернёт ClickHouse.
+    """
+    return user_email.strip(" ").translate(ASCII_UPPER_TO_LOWER)
+
+
+# Режимы запроса фичей: batch (все активные), batch_shard (доля активных),
+# user (один email), users (список email)
+FEATURE_QUERY_MODES = ("batch", "batch_shard", "user", "users")
+
+
+@lru_cache(maxsize=None)
+def _build_features_query(mode: str) -> str:
     """
     Универсальный SQL для агрегации пользовательских фичей.
 
-    - Batch: active_days=7 (кто активен), feature_days=365/730 (агрегация по истории)
-    - Single-user: user_email задан, active_days игнорируется логически, feature_days=365/730
+    Текст собирается один раз на режим и кэшируется; значения передаются
+    серверными параметрами ClickHouse (parameters= в clickhouse_connect):
+
+    - batch: {active_days:UInt16} (кто активен), {feature_days:UInt16} (история)
+    - batch_shard: как batch + {shard:UInt16} из {shards:UInt16}
+    - user:  {email:String}, {feature_days:UInt16} (realtime / single-user)
+    - users: {emails:Array(String)}, {feature_days:UInt16} (micro-batch realtime)
     """
 
-    if user_email:
-        safe_email = user_email.replace("'", "''")
+    if mode == "user":
         # Realtime / single-user режим
-        active_users_cte = f"""
+        active_users_cte = """
         active_users AS (
-            SELECT lower(trim('{safe_email}')) AS user_email
+            SELECT lower(trim({email:String})) AS user_email
         ),
         """
-    else:
-        # Batch режим
-        active_users_cte = f"""
+    elif mode == "users":
+        # Realtime / multi-user режим
+        active_users_cte = """
+        active_users AS (
+            SELECT DISTINCT lower(trim(arrayJoin({emails:Array(String)}))) AS user_email
+        ),
+        """
+    elif mode in ("batch", "batch_shard"):
+        # Batch режим (целиком или один шард активных пользователей)
+        shard_filter = ""
+        if mode == "batch_shard":
+            shard_filter = "AND " + SHARD_CONDITION.format(email="lower(trim(user_email))")
+        active_users_cte = """
         active_users AS (
             SELECT DISTINCT lower(trim(user_email)) AS user_email
             FROM dbt_mart.dim_merchant_transactions
-            WHERE event_date >= today() - {active_days}
+            WHERE event_date >= today() - {active_days:UInt16}
               AND transaction_type = 'SALE'
               AND is_test = 0
               AND project != 'adxad'
               AND user_email != ''
+              """ + shard_filter + """
         ),
         """
+    else:
+        raise ValueError(f"Unknown feature query mode: {mode}")
 
-    query = f"""
+    query = """
     WITH
-	{active_users_cte}
+	""" + active_users_cte + """
 
     dm_features AS (
         SELECT
@@ -76,7 +151,7 @@ def _build_features_query(active_days: int, feature_days: int, user_email: Optio
             AND is_test = 0
             AND project != 'adxad'
             AND user_email != ''
-            AND event_date >= today() - {feature_days}
+            AND event_date >= today() - {feature_days:UInt16}
             AND lower(trim(user_email)) IN (SELECT user_email FROM active_users)
         GROUP BY user_email
     ),
@@ -97,7 +172,7 @@ def _build_features_query(active_days: int, feature_days: int, user_email: Optio
         WHERE 1=1
         AND trans_type IN ('initial','onetime','rebill','trial','conversion')
         AND member_email != ''
-        AND attraction_date >= today() - {feature_days}
+        AND attraction_date >= today() - {feature_days:UInt16}
         AND lower(trim(member_email)) IN (SELECT user_email FROM active_users)
         GROUP BY user_email
     )
@@ -112,28 +187,261 @@ def _build_features_query(active_days: int, feature_days: int, user_email: Optio
     return query
 
 
-def fetch_user_features_batch(client, active_days: int = 7, feature_days: int = 365) -> pd.DataFrame:
+def _features_query(mode: str) -> str:
+    """
+    Запрос фичей: по инкрементальному store (FEATURE_STORE_ENABLED)
+    или полным сканом сырых таблиц за feature_days.
+    """
+    if get_settings().FEATURE_STORE_ENABLED:
+        return build_store_features_query(mode)
+    return _build_features_query(mode)
+
+
+def fetch_user_features_batch(
+    client,
+    active_days: int = 7,
+    feature_days: int = 365,
+    columnar: bool = True,
+) -> pd.DataFrame:
     """
     Batch-агрегация фичей по всем активным пользователям за период.
+    columnar=False — старый путь через result_rows (список кортежей).
     """
-    query = _build_features_query(
-        active_days=active_days,
-        feature_days=feature_days,
-        user_email=None,
+    fetch = run_query_df if columnar else run_query
+    return fetch(
+        _features_query("batch"),
+        client,
+        parameters={"active_days": active_days, "feature_days": feature_days},
     )
-    return run_query(query, client)
+
+
+def stream_user_features_batch(
+    client,
+    active_days: int = 7,
+    feature_days: int = 365,
+    chunk_size: int = 50_000,
+    columnar: bool = True,
+) -> Iterator[pd.DataFrame]:
+    """
+    Потоковая batch-агрегация: блоки ClickHouse читаются по мере прихода
+    и отдаются DataFrame-чанками не больше chunk_size строк.
+    Память ограничена размером чанка, а не числом пользователей.
+
+    columnar=True — блоки приходят сразу типизированными колонками (query_df_stream),
+    columnar=False — строками-кортежами (query_row_block_stream).
+    """
+    query = _features_query("batch")
+    parameters = {"active_days": active_days, "feature_days": feature_days}
+    settings = {"max_block_size": chunk_size}
+
+    if columnar:
+        with client.query_df_stream(
+            query,
+            parameters=parameters,
+            settings=settings,
+            use_extended_dtypes=False,
+        ) as stream:
+            yield from _rechunk_frames((to_signed_counts(block) for block in stream), chunk_size)
+        return
+
+    with client.query_row_block_stream(query, parameters=parameters, settings=settings) as stream:
+        column_names = stream.source.column_names
+        buffer: list = []
+
+        for block in stream:
+            buffer.extend(block)
+            while len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer[:chunk_size], columns=column_names)
+                buffer = buffer[chunk_size:]
+
+        if buffer:
+            yield pd.DataFrame(buffer, columns=column_names)
+
+
+def _rechunk_frames(frames: Iterator[pd.DataFrame], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Склеивает/режет поток DataFrame-блоков в чанки по chunk_size строк.
+    """
+    buffer: list[pd.DataFrame] = []
+    buffered = 0
+
+    for frame in frames:
+        if frame.empty:
+            continue
+        buffer.append(frame)
+        buffered += len(frame)
+
+        while buffered >= chunk_size:
+            df = buffer[0] if len(buffer) == 1 else pd.concat(buffer, ignore_index=True)
+            yield df.iloc[:chunk_size].reset_index(drop=True)
+            rest = df.iloc[chunk_size:]
+            buffer = [rest] if len(rest) else []
+            buffered = len(rest)
+
+    if buffered:
+        df = buffer[0] if len(buffer) == 1 else pd.concat(buffer, ignore_index=True)
+        yield df.reset_index(drop=True)
+
+
+# ---------------- SHARDED BATCH ----------------
+
+class ShardFetchError(RuntimeError):
+    """
+    Шард batch-выгрузки не получен за все попытки.
+    """
+
+
+def fetch_user_features_shard(
+    client,
+    shard: int,
+    shards: int,
+    active_days: int = 7,
+    feature_days: int = 365,
+    columnar: bool = True,
+) -> pd.DataFrame:
+    """
+    Фичи активных пользователей с cityHash64(email) % shards = shard.
+    """
+    fetch = run_query_df if columnar else run_query
+    return fetch(
+        _features_query("batch_shard"),
+        client,
+        parameters={
+            "active_days": active_days,
+            "feature_days": feature_days,
+            "shard": shard,
+            "shards": shards,
+        },
+    )
+
+
+def stream_user_features_sharded(
+    connection_factory: Callable,
+    shards: int,
+    parallel: int = 4,
+    active_days: int = 7,
+    feature_days: int = 365,
+    chunk_size: int = 50_000,
+    columnar: bool = True,
+    retries: int = 2,
+    retry_backoff: float = 1.0,
+) -> Iterator[pd.DataFrame]:
+    """
+    Batch-выгрузка N запросами по шардам пользователей, до parallel одновременно.
+
+    - каждый шард — отдельный запрос со своим клиентом из connection_factory()
+      (context manager), поэтому лимит памяти запроса и поток ответа делятся на N
+    - шард читается целиком и отдаётся, как только готов (порядок шардов не важен),
+      в памяти не больше parallel готовых шардов
+    - упавший шард перезапрашивается до retries раз с экспоненциальной паузой;
+      частичный результат не отдаётся, поэтому повтор не даёт дублей
+    """
+    def load(shard: int) -> pd.DataFrame:
+        for attempt in range(retries + 1):
+            try:
+                start = time.perf_counter()
+                with connection_factory() as client:
+                    df = fetch_user_features_shard(client, shard, shards, active_days, feature_days, columnar)
+                logger.info(f"Batch shard {shard}/{shards}: {len(df)} rows in {time.perf_counter() - start:.2f}s")
+                return df
+            except Exception as e:
+                if attempt == retries:
+                    raise ShardFetchError(f"Batch shard {shard}/{shards} failed after {attempt + 1} attempts: {e}") from e
+                delay = retry_backoff * 2 ** attempt
+                logger.warning(f"Batch shard {shard}/{shards} failed (attempt {attempt + 1}), retry in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def frames() -> Iterator[pd.DataFrame]:
+        pending = deque(range(shards))
+        running: set = set()
+        executor = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="ch-shard")
+        try:
+            while pending or running:
+                while pending and len(running) < parallel:
+                    running.add(executor.submit(load, pending.popleft()))
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            # остановка потребителем или ошибка шарда: очередь больше не запускаем
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    yield from _rechunk_frames(frames(), chunk_size)
+
+
+def stream_batch_features(
+    connection_factory: Callable | None,
+    active_days: int = 7,
+    feature_days: int = 365,
+    chunk_size: int = 50_000,
+    columnar: bool = True,
+    client=None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Поток чанков batch-выгрузки по настройкам воркера:
+    BATCH_FETCH_SHARDS > 1 — шардированные запросы (stream_user_features_sharded)
+    на клиентах из connection_factory(), иначе один потоковый запрос на client
+    (или на клиенте из connection_factory()).
+    """
+    settings = get_settings()
+    if settings.BATCH_FETCH_SHARDS > 1 and connection_factory is not None:
+        yield from stream_user_features_sharded(
+            connection_factory,
+            shards=settings.BATCH_FETCH_SHARDS,
+            parallel=max(1, settings.BATCH_FETCH_PARALLEL),
+            active_days=active_days,
+            feature_days=feature_days,
+            chunk_size=chunk_size,
+            columnar=columnar,
+            retries=settings.BATCH_FETCH_RETRIES,
+            retry_backoff=settings.BATCH_FETCH_RETRY_BACKOFF,
+        )
+        return
+
+    params = dict(active_days=active_days, feature_days=feature_days, chunk_size=chunk_size, columnar=columnar)
+    if client is not None:
+        yield from stream_user_features_batch(client, **params)
+        return
+    with connection_factory() as client:
+        yield from stream_user_features_batch(client, **params)
 
 
 def fetch_user_features_user(client, user_email: str, feature_days: int = 365) -> pd.DataFrame:
     """
     Агрегация фичей по одному пользователю за длинный период.
     """
-    query = _build_features_query(
-        active_days=7,              # любое число так как не важно для user_email режима
-        feature_days=feature_days,
-        user_email=user_email,
+    return run_query(
+        _features_query("user"),
+        client,
+        parameters={"email": user_email, "feature_days": feature_days},
+    )
+
+
+def fetch_user_features_row(client, user_email: str, feature_days: int = 365) -> tuple[tuple[str, ...], tuple] | None:
+    """
+    То же, что fetch_user_features_user, но возвращает (column_names, row)
+    без pandas. None — если пользователь не найден.
+    """
+    column_names, rows = run_query_rows(
+        _features_query("user"),
+        client,
+        parameters={"email": user_email, "feature_days": feature_days},
+    )
+    if not rows:
+        return None
+    return column_names, rows[0]
+
+
+def fetch_user_features_users(client, user_emails: List[str], feature_days: int = 365) -> tuple[tuple[str, ...], list[tuple]]:
+    """
+    Агрегация фичей по списку пользователей одним запросом.
+    Возвращает (column_names, rows), чтобы строки можно было кэшировать.
+    """
+    return run_query_rows(
+        _features_query("users"),
+        client,
+        parameters={"emails": list(user_emails), "feature_days": feature_days},
     )
-    return run_query(query, client)
 
 
 
@@ -1,22 +1,95 @@
 # app/ml/model.py
-import pickle
-import numpy as np
-import pandas as pd
-
 MODEL_PATH = "models/fraud_model.pkl"
 
-with open(MODEL_PATH, "rb") as f:
-    payload = pickle.load(f)
+# Модель загружается лениво (первый predict / get_features) или явно в lifespan
+# realtime/batch-воркера. Gateway (WORKER_MODE=api) модель не загружает вовсе,
+# а FLAML, бустеры и pandas не импортирует.
+#
+# Текущую версию держит ModelRegistry (app/ml/registry.py): новая версия
+# загружается и проверяется в фоне и подменяет ссылку атомарно. Запрос берёт
+# load_model() один раз и доводит скоринг на этой версии.
+
 
-model = payload["automl"]        
-FEATURES = payload["features"]
-BEST_THRESHOLD = payload.get("best_threshold")
-    
-def predict(X: pd.DataFrame) -> np.ndarray:
+class LoadedModel:
+    """
+    Одна версия артефактов модели: рантайм, FEATURES, порог, label encoders.
+    """
+
+    def __init__(
+        self,
+        runtime: str,
+        model,
+        features: list[str],
+        best_threshold,
+        encoding=None,
+        version: str = "unknown",
+        payload: dict | None = None,
+        loaded_at: float | None = None,
+    ):
+        self.runtime = runtime
+        self.model = model
+        self.features = features
+        self.best_threshold = best_threshold
+        self.encoding = encoding
+        self.version = version
+        self.payload = payload
+        self.loaded_at = loaded_at
+        # производные структуры, живущие вместе с версией (план realtime-признаков)
+        self.cache: dict = {}
+
+    def predict(self, X):
+        if self.runtime == "native":
+            return self.model.predict(X)
+        return self.model.predict_proba(X)[:, 1]
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "runtime": self.runtime,
+            "features": len(self.features),
+            "best_threshold": self.best_threshold,
+            "loaded_at": self.loaded_at,
+        }
+
+
+def load_model() -> LoadedModel:
+    """
+    Текущая версия модели (первый вызов загружает её, потокобезопасно).
+    """
+    from app.ml.registry import get_model_registry
+
+    return get_model_registry().current()
+
+
+def is_model_loaded() -> bool:
+    from app.ml.registry import model_registry_loaded
+
+    return model_registry_loaded()
+
+
+def get_features() -> list[str]:
+    return load_model().features
+
+
+def predict(X):
     """
      X : pd.DataFrame
         shape (n_samples, n_features)
         Полностью подготовленные model-ready признаки.
     """
-    
-    return model.predict_proba(X)[:, 1]
\ No newline at end of file
+    return load_model().predict(X)
+
+
+def __getattr__(name: str):
+    # совместимость: from app.ml.model import FEATURES (загружает модель при обращении)
+    if name == "FEATURES":
+        return load_model().features
+    if name == "BEST_THRESHOLD":
+        return load_model().best_threshold
+    if name == "MODEL_RUNTIME":
+        return load_model().runtime
+    if name == "model":
+        return load_model().model
+    if name == "payload":
+        return load_model().payload
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,185 @@
+# app/ml/native_model.py
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+# Экспорт лучшего бустера из FLAML AutoML в родной формат библиотеки:
+#   <dir>/model.txt | model.ubj | model.cbm  — LightGBM / XGBoost / CatBoost
+#   <dir>/manifest.json                      — kind, файл, FEATURES, порог, версии
+# Сервис предсказывает бустером напрямую на непрерывном float64-массиве,
+# без проверок и конвертаций DataFrame внутри FLAML/sklearn-обёрток.
+#
+#   python -m app.ml.native_model [models/fraud_model.pkl] [models/native]
+
+MANIFEST_FILE = "manifest.json"
+
+_NATIVE_FILES = {
+    "lightgbm": "model.txt",
+    "xgboost": "model.ubj",
+    "catboost": "model.cbm",
+}
+
+
+def _estimator_kind(estimator) -> str:
+    module = type(estimator).__module__
+    for kind in _NATIVE_FILES:
+        if module.startswith(kind):
+            return kind
+    raise ValueError(f"❌ Unsupported estimator for native export: {type(estimator).__name__}")
+
+
+def _booster_feature_names(kind: str, estimator) -> list[str]:
+    if kind == "lightgbm":
+        return list(estimator.booster_.feature_name())
+    if kind == "xgboost":
+        return list(estimator.get_booster().feature_names or [])
+    return list(estimator.feature_names_ or [])
+
+
+# ---------------- EXPORT ----------------
+
+def export_native_model(payload: dict, directory: str) -> str:
+    """
+    Сохраняет бустер из payload["automl"] в родном формате и пишет manifest.
+    Возвращает путь к manifest.json.
+    """
+    automl = payload["automl"]
+    features = list(payload["features"])
+
+    # FLAML: AutoML.model — обёртка FLAML, .estimator — обученный sklearn-классификатор
+    estimator = automl.model.estimator
+    kind = _estimator_kind(estimator)
+
+    classes = getattr(estimator, "classes_", None)
+    if classes is not None and len(classes) != 2:
+        raise ValueError(f"❌ Native export supports binary models only, got {len(classes)} classes")
+
+    # порядок входа бустера может отличаться от FEATURES — сохраняем его явно
+    booster_features = _booster_feature_names(kind, estimator) or features
+    if set(booster_features) != set(features):
+        raise ValueError("❌ Booster features do not match payload FEATURES")
+
+    os.makedirs(directory, exist_ok=True)
+    model_file = _NATIVE_FILES[kind]
+    model_path = os.path.join(directory, model_file)
+
+    if kind == "lightgbm":
+        estimator.booster_.save_model(model_path)
+    elif kind == "xgboost":
+        estimator.get_booster().save_model(model_path)
+    else:
+        estimator.save_model(model_path, format="cbm")
+
+    manifest = {
+        "kind": kind,
+        "model_file": model_file,
+        "features": features,
+        "booster_features": booster_features,
+        "best_threshold": payload.get("best_threshold"),
+        "best_estimator": getattr(automl, "best_estimator", None),
+        "library_version": __import__(kind).__version__,
+    }
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"Native {kind} model exported to {model_path}")
+    return manifest_path
+
+
+def export_from_pickle(model_path: str, directory: str) -> str:
+    with open(model_path, "rb") as f:
+        payload = pickle.load(f)
+    return export_native_model(payload, directory)
+
+
+# ---------------- RUNTIME ----------------
+
+class NativeModel:
+    """
+    Бустер в родном формате: predict возвращает вероятность класса 1,
+    как AutoML.predict_proba(X)[:, 1].
+
+    num_threads = 0 — значение библиотеки по умолчанию (все ядра).
+    """
+
+    def __init__(self, manifest: dict, directory: str, num_threads: int = 0):
+        self.manifest = manifest
+        self.kind = manifest["kind"]
+        self.features = list(manifest["features"])
+        self.best_threshold = manifest.get("best_threshold")
+        self.num_threads = num_threads
+
+        # None — вход уже в порядке бустера, иначе индексы колонок FEATURES
+        booster_features = manifest.get("booster_features") or self.features
+        self._order = (
+            None
+            if booster_features == self.features
+            else np.array([self.features.index(f) for f in booster_features])
+        )
+
+        path = os.path.join(directory, manifest["model_file"])
+        if self.kind == "lightgbm":
+            import lightgbm as lgb
+
+            self._booster = lgb.Booster(model_file=path)
+        elif self.kind == "xgboost":
+            import xgboost as xgb
+
+            self._booster = xgb.Booster()
+            self._booster.load_model(path)
+            # имена колонок не передаются: вход — голый массив в порядке бустера
+            self._booster.feature_names = None
+            if num_threads:
+                self._booster.set_param({"nthread": num_threads})
+        elif self.kind == "catboost":
+            from catboost import CatBoostClassifier
+
+            self._booster = CatBoostClassifier()
+            self._booster.load_model(path, format="cbm")
+        else:
+            raise ValueError(f"❌ Unknown native model kind: {self.kind}")
+
+    def _as_array(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            if list(X.columns) != self.features:
+                X = X[self.features]
+            X = X.to_numpy(dtype=np.float64)
+        X = np.asarray(X, dtype=np.float64)
+        if self._order is not None:
+            X = X[:, self._order]
+        return np.ascontiguousarray(X)
+
+    def predict(self, X) -> np.ndarray:
+        X = self._as_array(X)
+        if self.kind == "lightgbm":
+            kwargs = {"num_threads": self.num_threads} if self.num_threads else {}
+            return self._booster.predict(X, **kwargs)
+        if self.kind == "xgboost":
+            return self._booster.inplace_predict(X)
+        kwargs = {"thread_count": self.num_threads} if self.num_threads else {}
+        return self._booster.predict_proba(X, **kwargs)[:, 1]
+
+
+def load_native_model(directory: str, num_threads: int = 0) -> NativeModel:
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    return NativeModel(manifest, directory, num_threads=num_threads)
+
+
+def native_model_exists(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "models/fraud_model.pkl"
+    target = sys.argv[2] if len(sys.argv) > 2 else "models/native"
+    print(export_from_pickle(source, target))
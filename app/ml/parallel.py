@@ -0,0 +1,307 @@
+# app/ml/parallel.py
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import get_settings
+from app.ml.fe import apply_feature_engineering
+from app.ml.model import LoadedModel
+from app.ml.preprocess import preprocess_for_model
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+# Параллельный скоринг batch-чанка: FE + preprocess + predict по шардам в пуле процессов.
+#   - модель передаётся в процесс один раз (initializer), а не с каждым шардом
+#   - колонки чанка лежат в одном сегменте SharedMemory (строковые — кодами),
+#     процессы читают их без pickle; с шардом передаются только его границы
+#     и словари значений строковых колонок
+#   - размер шарда — чанк поровну на процессы, но не меньше min_shard_rows
+#   - риск-скоры (и model-ready матрица для снимка) пишутся процессами в общий
+#     выходной сегмент по смещению шарда, поэтому порядок строк сохраняется
+#   - если процесс пула умер (OOM kill, падение нативного бустера), пул навсегда
+#     BrokenProcessPool: он пересоздаётся, чанк считается ещё раз
+
+_SHARED_KINDS = "biufcmM"   # bool, int, uint, float, complex, datetime, timedelta
+
+
+# ---------------- SHARED MEMORY ----------------
+
+def _attach(name: str) -> SharedMemory:
+    # resource_tracker общий с родителем (см. ParallelScorer._pool): повторная
+    # регистрация сегмента ничего не меняет, удаляет его только родитель
+    return SharedMemory(name=name)
+
+
+def _factorize(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Строковая колонка → int64-коды + уникальные значения.
+    -1 — NaN/NA, -2 — None (preprocess кодирует их по-разному через astype(str)).
+    """
+    codes, uniques = pd.factorize(values)
+    codes = codes.astype(np.int64)
+    missing = np.flatnonzero(codes < 0)
+    if len(missing):
+        is_none = np.fromiter((values[i] is None for i in missing), dtype=bool, count=len(missing))
+        codes[missing[is_none]] = -2
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def _restore(codes: np.ndarray, used: np.ndarray, values: np.ndarray) -> np.ndarray:
+    restored = np.empty(len(codes), dtype=object)
+    valid = codes >= 0
+    restored[valid] = values[np.searchsorted(used, codes[valid])]
+    restored[codes == -1] = np.nan
+    restored[codes == -2] = None
+    return restored
+
+
+class SharedFrame:
+    """
+    Колонки DataFrame в одном сегменте SharedMemory.
+    Числовые колонки и даты лежат как есть; строковые — int64-кодами, а процессу
+    шарда передаются только значения, встречающиеся в этом шарде.
+    spec — всё, что нужно процессу, чтобы открыть колонки как массивы.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.rows = len(df)
+        self.columns = list(df.columns)
+        self.uniques: dict[str, np.ndarray] = {}
+
+        layout, offset = [], 0
+        arrays = {}
+        for name in self.columns:
+            dtype = df[name].dtype
+            if isinstance(dtype, np.dtype) and dtype.kind in _SHARED_KINDS:
+                arr = np.ascontiguousarray(df[name].to_numpy())
+            else:
+                arr, self.uniques[name] = _factorize(df[name].to_numpy(dtype=object))
+            offset = -(-offset // 8) * 8   # выравнивание по 8 байт
+            layout.append((name, arr.dtype.str, offset))
+            arrays[name] = arr
+            offset += arr.nbytes
+
+        self.layout = layout
+        self.shm = SharedMemory(create=True, size=max(offset, 1))
+        self._codes = {}
+        for name, dtype, start in layout:
+            arr = arrays[name]
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=self.shm.buf, offset=start)[:] = arr
+            if name in self.uniques:
+                self._codes[name] = arr
+
+    def spec(self) -> dict:
+        return {"name": self.shm.name, "rows": self.rows, "columns": self.columns, "layout": self.layout}
+
+    def values_slice(self, start: int, stop: int) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """
+        Для строковых колонок: (коды шарда по возрастанию, их значения).
+        """
+        result = {}
+        for name, uniques in self.uniques.items():
+            codes = self._codes[name][start:stop]
+            used = np.unique(codes[codes >= 0])
+            result[name] = (used, uniques[used])
+        return result
+
+    def close(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _frame_slice(shm: SharedMemory, spec: dict, start: int, stop: int, values: dict) -> pd.DataFrame:
+    data = {}
+    for name, dtype, offset in spec["layout"]:
+        column = np.ndarray((spec["rows"],), dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)[start:stop]
+        if name in values:
+            column = _restore(column, *values[name])
+        data[name] = column
+    return pd.DataFrame(data, copy=False)
+
+
+# ---------------- WORKER ----------------
+
+_worker_model: LoadedModel | None = None
+
+
+def _init_worker(model: LoadedModel) -> None:
+    global _worker_model
+    _worker_model = model
+
+
+def _score_shard(frame_spec: dict, out_spec: dict, start: int, stop: int, values: dict) -> int:
+    """
+    FE + preprocess + predict одного шарда; результат — в выходной сегмент.
+    """
+    model = _worker_model
+    if model is None or model.version != out_spec["version"]:
+        raise RuntimeError("Parallel scorer worker has a different model version")
+
+    source = _attach(frame_spec["name"])
+    target = _attach(out_spec["name"])
+    try:
+        df = _frame_slice(source, frame_spec, start, stop, values)
+        X = preprocess_for_model(apply_feature_engineering(df), model=model)
+        risks = np.asarray(model.predict(X), dtype=np.float64)
+
+        n = frame_spec["rows"]
+        np.ndarray((n,), dtype=np.float64, buffer=target.buf)[start:stop] = risks
+        if out_spec["with_features"]:
+            matrix = np.ndarray((n, len(model.features)), dtype=np.float64, buffer=target.buf, offset=n * 8)
+            matrix[start:stop] = X.to_numpy(dtype=np.float64)
+
+        # представления над буферами должны исчезнуть до close()
+        del df, X
+        return stop - start
+    finally:
+        source.close()
+        target.close()
+
+
+# ---------------- SCORER ----------------
+
+class ParallelScorer:
+    """
+    Пул процессов для скоринга batch-чанков.
+    Пул пересоздаётся при смене версии модели (модель «зашита» в initializer)
+    и после гибели процесса пула.
+    """
+
+    def __init__(self, workers: int, shard_rows: int = 10_000, start_method: str = "spawn"):
+        self.workers = workers
+        self.shard_rows = shard_rows
+        self.start_method = start_method
+
+        self._executor: ProcessPoolExecutor | None = None
+        self._version: str | None = None
+        self._lock = threading.Lock()
+
+    def _pool(self, model: LoadedModel) -> ProcessPoolExecutor:
+        if self._executor is None or self._version != model.version:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            # процессы пула должны унаследовать resource_tracker родителя,
+            # иначе каждый считает открытые сегменты своими «утечками»
+            resource_tracker.ensure_running()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(model,),
+            )
+            self._version = model.version
+            logger.info(f"Parallel scorer started: {self.workers} processes, model {model.version}")
+        return self._executor
+
+    def shard_size(self, rows: int) -> int:
+        """
+        Чанк поровну на процессы, но не мельче shard_rows: у каждого шарда есть
+        постоянные накладные расходы pandas на FE/preprocess.
+        """
+        return max(self.shard_rows, -(-rows // self.workers))
+
+    def score(self, df: pd.DataFrame, model: LoadedModel, with_features: bool = False) -> tuple[np.ndarray, pd.DataFrame | None]:
+        """
+        Риск-скоры строк df (в исходном порядке) и, если нужно, model-ready матрица.
+        Сломанный пул пересоздаётся, чанк повторяется один раз.
+        """
+        for attempt in (1, 2):
+            with self._lock:
+                executor = self._pool(model)
+            try:
+                return self._score(executor, df, model, with_features)
+            except BrokenProcessPool:
+                self._discard(executor)
+                if attempt == 2:
+                    raise
+                logger.warning("Parallel scorer process died, restarting the pool")
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Убирает сломанный пул; следующий _pool() создаст новый.
+        """
+        with self._lock:
+            if self._executor is executor:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self._version = None
+
+    def _score(self, executor: ProcessPoolExecutor, df: pd.DataFrame, model: LoadedModel, with_features: bool) -> tuple[np.ndarray, pd.DataFrame | None]:
+        n = len(df)
+        width = len(model.features) if with_features else 0
+
+        # email процессам не нужен (FE и preprocess его не используют), а словарь
+        # уникальных значений был бы размером с шард
+        frame = SharedFrame(df.drop(columns=["user_email"], errors="ignore"))
+        out = SharedMemory(create=True, size=max(n * 8 * (1 + width), 1))
+        try:
+            out_spec = {"name": out.name, "version": model.version, "with_features": with_features}
+            size = self.shard_size(n)
+            futures = []
+            for start in range(0, n, size):
+                stop = min(start + size, n)
+                futures.append(
+                    executor.submit(_score_shard, frame.spec(), out_spec, start, stop, frame.values_slice(start, stop))
+                )
+            for future in futures:
+                future.result()
+
+            risks = np.ndarray((n,), dtype=np.float64, buffer=out.buf).copy()
+            X = None
+            if with_features:
+                matrix = np.ndarray((n, width), dtype=np.float64, buffer=out.buf, offset=n * 8).copy()
+                X = pd.DataFrame(matrix, columns=model.features, copy=False)
+            return risks, X
+        finally:
+            frame.close()
+            out.close()
+            out.unlink()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+                self._version = None
+
+
+# ---------------- singleton ----------------
+
+_scorer: ParallelScorer | None = None
+_scorer_lock = threading.Lock()
+
+
+def get_parallel_scorer() -> ParallelScorer | None:
+    """
+    Пул batch-воркера (None, если BATCH_PARALLEL_WORKERS = 1).
+    """
+    global _scorer
+    settings = get_settings()
+    workers = settings.BATCH_PARALLEL_WORKERS or os.cpu_count() or 1
+    if workers <= 1:
+        return None
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                _scorer = ParallelScorer(
+                    workers=workers,
+                    shard_rows=settings.BATCH_PARALLEL_SHARD_ROWS,
+                    start_method=settings.BATCH_PARALLEL_START_METHOD,
+                )
+    return _scorer
+
+
+def shutdown_parallel_scorer() -> None:
+    global _scorer
+    with _scorer_lock:
+        if _scorer is not None:
+            _scorer.shutdown()
+            _scorer = None
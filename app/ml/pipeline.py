@@ -1,54 +1,460 @@
 # app/ml/pipeline.py
+import math
+import threading
+from decimal import Decimal
+from typing import Callable, Iterator
+
+import numpy as np
 import pandas as pd
 
-from app.ml.fetch import fetch_user_features_batch, fetch_user_features_user
+from app.ml.fetch import (
+    fetch_user_features_batch,
+    fetch_user_features_row,
+    fetch_user_features_users,
+    normalize_email,
+    stream_batch_features,
+)
 from app.ml.fe import apply_feature_engineering
-from app.ml.preprocess import preprocess_for_model
-from app.ml.model import predict
-from app.core.decision import make_decision
+from app.ml.preprocess import preprocess_for_model, encode_value
+from app.ml.model import LoadedModel, load_model
+from app.core.decision import DECISION_LABELS, decision_labels, get_decision_policy
+from app.core.metrics import PIPELINE_IN_FLIGHT, PIPELINE_STAGE_SECONDS, count_decisions, stage_timer
+from app.ml.cache import get_feature_cache
+from app.ml.snapshot import SnapshotWriter, get_feature_snapshot
+from app.ml.parallel import get_parallel_scorer
 
 
 # ---------------- BATCH ----------------
 
-def run_batch_pipeline(client, active_days=7, feature_days=365) -> pd.DataFrame:
+def score_batch_frame(
+    df_struct: pd.DataFrame,
+    snapshot_writer: SnapshotWriter | None = None,
+    model: LoadedModel | None = None,
+) -> pd.DataFrame:
     """
-    Batch-пайплайн:
-    ClickHouse → features → model → decision
+    features → model → decision для одного чанка batch-выгрузки.
+    snapshot_writer — копит model-ready строки для снимка realtime.
+    model — версия модели прогона (по умолчанию текущая).
     """
-    df_struct = fetch_user_features_batch(client, active_days=active_days, feature_days=feature_days)
+    model = model or load_model()
 
-    if df_struct.empty:
-        return df_struct
+    scorer = get_parallel_scorer()
+    if scorer is not None and len(df_struct) > scorer.shard_rows:
+        # FE + preprocess + predict по шардам в пуле процессов
+        with_features = snapshot_writer is not None or get_decision_policy().segment_column is not None
+        with stage_timer("batch", "parallel_score"):
+            risks, X = scorer.score(df_struct, model, with_features=with_features)
+    else:
+        with stage_timer("batch", "features"):
+            df_fe = apply_feature_engineering(df_struct)
+        with stage_timer("batch", "preprocess"):
+            X = preprocess_for_model(df_fe, model=model)
+        with stage_timer("batch", "predict"):
+            risks = model.predict(X)
 
-    df_fe = apply_feature_engineering(df_struct)
-    X = preprocess_for_model(df_fe)
+    if snapshot_writer is not None:
+        with stage_timer("batch", "snapshot"):
+            snapshot_writer.add(df_struct["user_email"], X, model.version)
 
-    risks = predict(X)
     df_struct["risk_score"] = risks
-    df_struct["decision"] = df_struct["risk_score"].apply(
-        lambda r: make_decision(r).value
-    )
+    with stage_timer("batch", "decision"):
+        df_struct["decision"] = _decide(df_struct["risk_score"].to_numpy(), X, model, "batch")
 
     return df_struct[["user_email", "risk_score", "decision"]]
 
+
+def _segment_tables(model: LoadedModel) -> dict:
+    """
+    Таблицы порогов по сегментам, переведённые в коды label encoding модели:
+    сегмент берётся из model-ready матрицы, одинаково для batch, снимка и realtime.
+    """
+    policy = get_decision_policy()
+    key = ("decision_segments", id(policy))
+    tables = model.cache.get(key)
+    if tables is None:
+        mapping = model.encoding.maps.get(policy.segment_column) if model.encoding else None
+        if mapping is None:
+            raise ValueError(f"Decision segment column {policy.segment_column!r} is not a categorical feature")
+        tables = {mapping[value]: table for value, table in policy.segments.items() if value in mapping}
+        model.cache[key] = tables
+    return tables
+
+
+def _decide(risks: np.ndarray, X: pd.DataFrame, model: LoadedModel, pipeline: str) -> np.ndarray:
+    """
+    Решения для массива скоров одним проходом (np.searchsorted по порогам)
+    + счётчики решений по зонам.
+    """
+    policy = get_decision_policy()
+    if policy.segment_column is None:
+        codes = policy.decide(risks)
+    else:
+        codes = policy.decide(risks, X[policy.segment_column].to_numpy(), _segment_tables(model))
+    count_decisions(pipeline, zip(DECISION_LABELS, np.bincount(codes, minlength=len(DECISION_LABELS)).tolist()))
+    return decision_labels(codes)
+
+
+def iter_batch_pipeline(
+    client,
+    active_days=7,
+    feature_days=365,
+    chunk_size=50_000,
+    columnar=True,
+    snapshot_writer: SnapshotWriter | None = None,
+    model: LoadedModel | None = None,
+    connection_factory: Callable | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Потоковый batch-пайплайн:
+    ClickHouse (блоками) → features → model → decision, чанк за чанком.
+    Снимок (snapshot_writer) публикует вызывающий после полного прохода.
+    Все чанки скорятся одной версией модели, даже если её заменят посреди прогона.
+    connection_factory — клиенты для шардированной выгрузки (BATCH_FETCH_SHARDS > 1),
+    без него выгрузка идёт одним запросом на client.
+    """
+    model = model or load_model()
+    stream = stream_batch_features(
+        connection_factory,
+        active_days=active_days,
+        feature_days=feature_days,
+        chunk_size=chunk_size,
+        columnar=columnar,
+        client=client,
+    )
+    fetch_time = PIPELINE_STAGE_SECONDS.labels("batch", "fetch")
+    with PIPELINE_IN_FLIGHT.labels("batch").track_inprogress():
+        while True:
+            # время ожидания очередного чанка из ClickHouse
+            with fetch_time.time():
+                df_struct = next(stream, None)
+            if df_struct is None:
+                break
+            if not df_struct.empty:
+                yield score_batch_frame(df_struct, snapshot_writer, model)
+
+
+def run_batch_pipeline(
+    client,
+    active_days=7,
+    feature_days=365,
+    columnar=True,
+    snapshot_writer: SnapshotWriter | None = None,
+) -> pd.DataFrame:
+    """
+    Batch-пайплайн:
+    ClickHouse → features → model → decision
+    (+ публикация снимка признаков для realtime, если передан snapshot_writer)
+    """
+    with PIPELINE_IN_FLIGHT.labels("batch").track_inprogress():
+        with stage_timer("batch", "fetch"):
+            df_struct = fetch_user_features_batch(
+                client,
+                active_days=active_days,
+                feature_days=feature_days,
+                columnar=columnar,
+            )
+
+        if df_struct.empty:
+            return df_struct
+
+        try:
+            result = score_batch_frame(df_struct, snapshot_writer)
+            if snapshot_writer is not None:
+                with stage_timer("batch", "snapshot"):
+                    snapshot_writer.publish()
+        finally:
+            if snapshot_writer is not None:
+                snapshot_writer.discard()
+        return result
+
+# ---------------- REALTIME FAST PATH ----------------
+# Строка ClickHouse → float64 вектор в порядке FEATURES без pandas.
+# Повторяет apply_feature_engineering + preprocess_for_model для одной строки.
+
+# Колонки, которые preprocess_for_model выбрасывает (в FEATURES они будут 0)
+_DROPPED_COLUMNS = {"user_email", "first_reg_date", "last_reg_date"}
+
+# Входы feature engineering
+_FE_INPUTS = (
+    "avg_sale_amount", "max_sale_amount", "min_sale_amount",
+    "n_sales", "n_declines", "n_active_days", "n_trials", "n_rebills",
+    "geo_mismatch_any", "unique_sites", "unique_affiliates",
+    "cross_ratio", "unique_card_brands",
+)
+
+_buffers = threading.local()
+
+
+def _to_number(value) -> float:
+    """
+    Аналог pd.to_numeric(errors="coerce") для одного значения.
+    """
+    if isinstance(value, (bool, int, float, Decimal, np.number)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return math.nan
+    return math.nan
+
+
+def _engineer_features(raw: dict) -> dict:
+    """
+    Скалярная версия apply_feature_engineering.
+    NaN в результате далее заменяются на 0, как fillna(0) в preprocess.
+    """
+    with np.errstate(all="ignore"):
+        avg_sale_amount = raw["avg_sale_amount"]
+        if math.isnan(avg_sale_amount):
+            avg_sale_amount = 0.0
+
+        n_active_days = np.float64(raw["n_active_days"])
+        n_sales = np.float64(raw["n_sales"])
+
+        return {
+            "avg_sale_amount": avg_sale_amount,
+            "avg_sale_amount_log": np.log1p(avg_sale_amount),
+            "max_sale_amount_log": np.log1p(raw["max_sale_amount"]),
+            "min_sale_amount_log": np.log1p(raw["min_sale_amount"]),
+            "sales_freq": n_sales / (n_active_days + 1),
+            "declines_freq": raw["n_declines"] / (n_active_days + 1),
+            "trial_ratio": raw["n_trials"] / (n_sales + 1),
+            "pressure_score": raw["n_declines"] - raw["n_rebills"] + raw["geo_mismatch_any"] * 2,
+            "site_risk": float(raw["unique_sites"] >= 3),
+            "affiliate_risk": float(raw["unique_affiliates"] >= 3),
+            "cross_high": float(raw["cross_ratio"] > 0.5),
+            "card_hopper_flag": float(raw["unique_card_brands"] > 1),
+        }
+
+
+def _realtime_plan(column_names: tuple[str, ...], model: LoadedModel) -> tuple[list, list, list, list]:
+    """
+    Карта "позиция в FEATURES → индекс колонки в строке ClickHouse".
+    Строится один раз на набор колонок запроса (он фиксирован) и версию модели.
+
+    Возвращает четыре списка:
+    - encoded:   (pos, idx, mapping) — категориальные признаки
+    - direct:    (pos, idx)          — числовые признаки как есть
+    - derived:   (pos, name)         — признаки feature engineering
+    - fe_inputs: (name, idx | None)  — входы feature engineering
+    """
+    plans = model.cache.setdefault("realtime_plans", {})
+    plan = plans.get(column_names)
+    if plan is not None:
+        return plan
+
+    column_index = {name: i for i, name in enumerate(column_names)}
+    encoding_maps = model.encoding.maps
+    derived_names = set(_engineer_features({c: math.nan for c in _FE_INPUTS}))
+
+    encoded, direct, derived = [], [], []
+    for pos, feature in enumerate(model.features):
+        if feature in _DROPPED_COLUMNS:
+            continue
+        if feature in derived_names:
+            derived.append((pos, feature))
+        elif feature not in column_index:
+            continue
+        elif feature in encoding_maps:
+            encoded.append((pos, column_index[feature], encoding_maps[feature]))
+        else:
+            direct.append((pos, column_index[feature]))
+
+    fe_inputs = [(name, column_index.get(name)) for name in _FE_INPUTS]
+
+    plan = plans[column_names] = (encoded, direct, derived, fe_inputs)
+    return plan
+
+
+def build_realtime_features(column_names: tuple[str, ...], row: tuple, model: LoadedModel | None = None) -> pd.DataFrame:
+    """
+    Model-ready признаки одного пользователя из строки результата ClickHouse.
+    Вектор живёт в заранее выделенном буфере потока; DataFrame оборачивает его без копии,
+    поэтому результат валиден до следующего вызова в том же потоке.
+    """
+    model = model or load_model()
+    encoded, direct, derived, fe_inputs = _realtime_plan(tuple(column_names), model)
+    features = model.features
+
+    vector = getattr(_buffers, "vector", None)
+    if vector is None or vector.shape[1] != len(features):
+        vector = _buffers.vector = np.empty((1, len(features)), dtype=np.float64)
+    vector.fill(0.0)
+
+    for pos, idx, mapping in encoded:
+        vector[0, pos] = encode_value(row[idx], mapping)
+
+    for pos, idx in direct:
+        vector[0, pos] = _to_number(row[idx])
+
+    if derived:
+        raw = {
+            name: math.nan if idx is None else _to_number(row[idx])
+            for name, idx in fe_inputs
+        }
+        engineered = _engineer_features(raw)
+        for pos, name in derived:
+            vector[0, pos] = engineered[name]
+
+    # fillna(0)
+    vector[np.isnan(vector)] = 0.0
+
+    return pd.DataFrame(vector, columns=features, copy=False)
+
 # ---------------- SINGLE USER ----------------
 
+_realtime_in_flight = PIPELINE_IN_FLIGHT.labels("realtime")
+_multi_in_flight = PIPELINE_IN_FLIGHT.labels("multi")
+
+
+def _score(X: pd.DataFrame, model: LoadedModel, pipeline: str) -> list[tuple[float, str]]:
+    with stage_timer(pipeline, "predict"):
+        risks = np.asarray(model.predict(X), dtype=np.float64)
+    with stage_timer(pipeline, "decision"):
+        decisions = _decide(risks, X, model, pipeline)
+    return list(zip(risks.tolist(), decisions.tolist()))
+
+
+def _is_current(model: LoadedModel) -> bool:
+    # скор, посчитанный версией, которую уже заменили, в кэш не кладём
+    return load_model() is model
+
+
 def run_single_user_pipeline(client, user_email: str, feature_days: int = 365)-> dict | None:
     """
-    Realtime-пайплайн для одного пользователя
+    Realtime-пайплайн для одного пользователя.
+    Порядок: кэш (скор/признаки) → снимок признаков batch → ClickHouse.
     """
-    df_struct = fetch_user_features_user(client, user_email=user_email, feature_days=feature_days)
-    if df_struct.empty:
-        return None  
+    with _realtime_in_flight.track_inprogress(), stage_timer("realtime", "total"):
+        return _run_single_user(client, user_email, feature_days)
+
+
+def _run_single_user(client, user_email: str, feature_days: int) -> dict | None:
+    cache = get_feature_cache()
+    email = normalize_email(user_email)
+    model = load_model()
+
+    with stage_timer("realtime", "cache"):
+        entry = cache.get(email, feature_days) if cache else None
+    if entry is not None and entry.score is not None:
+        count_decisions("realtime", [(entry.score["decision"], 1)])
+        return {**entry.score, "user_email": user_email}
+
+    snapshot = get_feature_snapshot() if entry is None else None
+    X = None
+    if snapshot:
+        with stage_timer("realtime", "snapshot"):
+            X = snapshot.lookup(email, feature_days, model.version)
+
+    if X is None:
+        if entry is not None:
+            column_names, row = entry.column_names, entry.row
+        else:
+            with stage_timer("realtime", "fetch"):
+                fetched = fetch_user_features_row(client, user_email=user_email, feature_days=feature_days)
+            if fetched is None:
+                return None
+            column_names, row = fetched
+            if cache:
+                cache.put_features(email, feature_days, column_names, row)
 
-    df_fe = apply_feature_engineering(df_struct)
-    X = preprocess_for_model(df_fe)
+        with stage_timer("realtime", "features"):
+            X = build_realtime_features(column_names, row, model)
 
-    risk = float(predict(X)[0])
-    decision = make_decision(risk).value
+    [(risk, decision)] = _score(X, model, "realtime")
 
-    return {
+    result = {
         "user_email": user_email,
         "risk_score": risk,
         "decision": decision,
+        "model_version": model.version,
     }
+    if cache and _is_current(model):
+        cache.put_score(email, feature_days, result)
+
+    return result
+
+# ---------------- MULTI USER ----------------
+
+def run_multi_user_pipeline(client, user_emails: list[str], feature_days: int = 365) -> dict[str, dict]:
+    """
+    Realtime-пайплайн для нескольких пользователей: один запрос и один predict.
+    Результат — по email, который вернул ClickHouse (lower(trim(...)), совпадает
+    с normalize_email); ненайденных пользователей в нём нет.
+    """
+    with _multi_in_flight.track_inprogress(), stage_timer("multi", "total"):
+        return _run_multi_user(client, user_emails, feature_days)
+
+
+def _run_multi_user(client, user_emails: list[str], feature_days: int) -> dict[str, dict]:
+    cache = get_feature_cache()
+    emails = list(dict.fromkeys(normalize_email(e) for e in user_emails))
+    model = load_model()
+
+    results: dict[str, dict] = {}
+    column_names: tuple[str, ...] | None = None
+    rows: list[tuple] = []
+    missing: list[str] = []
+
+    cached: dict[str, int] = {}
+    with stage_timer("multi", "cache"):
+        for email in emails:
+            entry = cache.get(email, feature_days) if cache else None
+            if entry is None:
+                missing.append(email)
+            elif entry.score is not None:
+                results[email] = {**entry.score, "user_email": email}
+                cached[entry.score["decision"]] = cached.get(entry.score["decision"], 0) + 1
+            else:
+                column_names = entry.column_names
+                rows.append(entry.row)
+    count_decisions("multi", cached.items())
+
+    snapshot = get_feature_snapshot() if missing else None
+    if snapshot:
+        with stage_timer("multi", "snapshot"):
+            found, matrix = snapshot.lookup_many(missing, feature_days, model.version)
+        if found:
+            X = pd.DataFrame(matrix, columns=model.features, copy=False)
+            for email, (risk, decision) in zip(found, _score(X, model, "multi")):
+                results[email] = {
+                    "user_email": email,
+                    "risk_score": risk,
+                    "decision": decision,
+                    "model_version": model.version,
+                }
+            found_set = set(found)
+            missing = [e for e in missing if e not in found_set]
+
+    if missing:
+        with stage_timer("multi", "fetch"):
+            column_names, fetched_rows = fetch_user_features_users(client, user_emails=missing, feature_days=feature_days)
+        rows.extend(fetched_rows)
+        if cache:
+            email_idx = column_names.index("user_email")
+            for row in fetched_rows:
+                cache.put_features(row[email_idx], feature_days, column_names, row)
+
+    if not rows:
+        return results
+
+    with stage_timer("multi", "features"):
+        df_struct = pd.DataFrame(rows, columns=list(column_names))
+        df_fe = apply_feature_engineering(df_struct)
+    with stage_timer("multi", "preprocess"):
+        X = preprocess_for_model(df_fe, model=model)
+    cache_scores = cache is not None and _is_current(model)
+
+    for email, (risk, decision) in zip(df_struct["user_email"], _score(X, model, "multi")):
+        result = {
+            "user_email": email,
+            "risk_score": risk,
+            "decision": decision,
+            "model_version": model.version,
+        }
+        results[email] = result
+        if cache_scores:
+            cache.put_score(email, feature_days, result)
+
+    return results
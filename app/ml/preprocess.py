@@ -1,38 +1,105 @@
 # app/ml/preprocess.py
 import pickle
+
+import numpy as np
 import pandas as pd
-from app.ml.model import FEATURES
+from app.ml.model import LoadedModel, load_model
 
 ENCODERS_PATH = "models/label_encoders.pkl"
 
-# Загружаем label encoders
-with open(ENCODERS_PATH, "rb") as f:
-    LABEL_ENCODERS = pickle.load(f)
 
+def build_encoding_tables(encoders: dict) -> dict[str, pd.Index]:
+    """
+    Строит hash-таблицы class → code для каждого LabelEncoder.
+    Позиция класса в encoder.classes_ совпадает с кодом encoder.transform.
+    """
+    return {col: pd.Index(encoder.classes_) for col, encoder in encoders.items()}
+
+
+class LabelEncoding:
+    """
+    Label encoders и построенные по ним таблицы кодирования.
+    """
+
+    def __init__(self, encoders: dict):
+        self.encoders = encoders
+        self.tables = build_encoding_tables(encoders)
+        # те же таблицы в виде dict для покомпонентного кодирования (realtime)
+        self.maps = {
+            col: {cls: code for code, cls in enumerate(table)}
+            for col, table in self.tables.items()
+        }
+
+
+def read_label_encoders(path: str = ENCODERS_PATH) -> LabelEncoding:
+    with open(path, "rb") as f:
+        return LabelEncoding(pickle.load(f))
 
-def preprocess_for_model(df: pd.DataFrame) -> pd.DataFrame:
+
+def load_label_encoders() -> LabelEncoding:
+    """
+    Label encoders текущей версии модели (см. app/ml/registry.py).
+    """
+    return load_model().encoding
+
+
+def get_encoding_tables() -> dict[str, pd.Index]:
+    return load_label_encoders().tables
+
+
+def get_encoding_maps() -> dict[str, dict]:
+    return load_label_encoders().maps
+
+
+def __getattr__(name: str):
+    # совместимость: from app.ml.preprocess import LABEL_ENCODERS / ENCODING_TABLES / ENCODING_MAPS
+    if name == "LABEL_ENCODERS":
+        return load_label_encoders().encoders
+    if name == "ENCODING_TABLES":
+        return load_label_encoders().tables
+    if name == "ENCODING_MAPS":
+        return load_label_encoders().maps
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def encode_column(values: pd.Series, table: pd.Index) -> np.ndarray:
+    """
+    Векторный label encoding целой колонки.
+    Неизвестные значения кодируются как classes_[0] (код 0), как и раньше.
+    """
+    codes = table.get_indexer(values.astype(str))
+    codes[codes < 0] = 0
+    return codes
+
+
+def encode_value(value, mapping: dict) -> int:
+    """
+    Label encoding одного значения, семантика как у encode_column.
+    """
+    return mapping.get(str(value), 0)
+
+
+def preprocess_for_model(df: pd.DataFrame, model: LoadedModel | None = None) -> pd.DataFrame:
     """
    Преобразование данных в формат, подходящий для модели:
     - label encoding категориальных признаков
     - удаление ненужных колонок
     - заполнение пропусков
     - приведение к нужному порядку колонок FEATURES
-    """
 
+    model — версия модели запроса (по умолчанию текущая).
+    """
+    model = model or load_model()
     df = df.copy()
 
     # 1. Label encoding
-    for col, encoder in LABEL_ENCODERS.items():
+    for col, table in model.encoding.tables.items():
         if col in df.columns:
-            df[col] = df[col].astype(str)
-            df[col] = df[col].map(
-                lambda v: v if v in encoder.classes_ else encoder.classes_[0]
-            )
-            df[col] = encoder.transform(df[col])
+            df[col] = encode_column(df[col], table)
 
     # 2. Удаляем ненужные поля
     df = df.drop(
-        columns=["user_email", "first_reg_date", "last_reg_date"], 
+        columns=["user_email", "first_reg_date", "last_reg_date"],
         errors="ignore"
     )
 
@@ -40,9 +107,10 @@ def preprocess_for_model(df: pd.DataFrame) -> pd.DataFrame:
     df = df.apply(pd.to_numeric, errors="coerce").fillna(0)
 
     # 4. Порядок признаков модели
-    df = df.reindex(columns=FEATURES, fill_value=0)
+    features = model.features
+    df = df.reindex(columns=features, fill_value=0)
 
-    if list(df.columns) != FEATURES:
+    if list(df.columns) != features:
         raise ValueError("❌ Feature contract broken")
 
     return df
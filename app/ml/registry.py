@@ -0,0 +1,366 @@
+# app/ml/registry.py
+import hashlib
+import json
+import math
+import os
+import pickle
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+
+from app.core.config import get_settings
+from app.ml.model import MODEL_PATH, LoadedModel
+from app.ml.preprocess import ENCODERS_PATH, preprocess_for_model, read_label_encoders
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+# Реестр версий модели процесса:
+#   - новая версия (pickle/экспорт + label encoders) грузится в фоне,
+#     проверяется (контракт FEATURES, encoders, пробный predict) и только потом
+#     подменяет текущую одной присваиваемой ссылкой
+#   - предыдущие версии остаются в памяти для мгновенного отката
+#   - источники обновления: POST /internal/fraud/model/reload или наблюдатель
+#     за файлами артефактов (MODEL_WATCH_SECONDS > 0)
+
+
+class ModelValidationError(ValueError):
+    """
+    Новая версия модели не прошла проверку и не была включена.
+    """
+
+
+# ---------------- LOADING ----------------
+
+def _native_paths(directory: str) -> list[str] | None:
+    from app.ml.native_model import MANIFEST_FILE, native_model_exists
+
+    if not native_model_exists(directory):
+        return None
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    return [os.path.join(directory, MANIFEST_FILE), os.path.join(directory, manifest["model_file"])]
+
+
+def artifact_paths() -> list[str]:
+    """
+    Файлы, из которых собирается версия: модель (pickle или экспорт) и encoders.
+    """
+    settings = get_settings()
+    model_paths = _native_paths(settings.MODEL_NATIVE_DIR) if settings.MODEL_RUNTIME == "native" else None
+    return (model_paths or [MODEL_PATH]) + [ENCODERS_PATH]
+
+
+def artifacts_version(paths: list[str]) -> str:
+    """
+    Версия — хэш содержимого артефактов: одинаковые файлы дают одну версию.
+    """
+    digest = hashlib.md5()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def artifacts_signature(paths: list[str]) -> tuple:
+    """
+    Дешёвый признак изменения файлов (mtime + размер) для наблюдателя.
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+def load_artifacts() -> LoadedModel:
+    """
+    Читает модель и label encoders с диска в новую LoadedModel.
+    """
+    settings = get_settings()
+    paths = artifact_paths()
+    version = artifacts_version(paths)
+    encoding = read_label_encoders(ENCODERS_PATH)
+
+    # MODEL_RUNTIME=native — бустер из экспорта (app/ml/native_model.py),
+    # pickle FLAML не загружается; без экспорта — откат на AutoML
+    if settings.MODEL_RUNTIME == "native":
+        from app.ml.native_model import load_native_model, native_model_exists
+
+        if native_model_exists(settings.MODEL_NATIVE_DIR):
+            native = load_native_model(settings.MODEL_NATIVE_DIR, num_threads=settings.MODEL_NUM_THREADS)
+            return LoadedModel(
+                "native", native, native.features, native.best_threshold,
+                encoding=encoding, version=version, loaded_at=time.time(),
+            )
+        logger.warning(f"Native model not found in {settings.MODEL_NATIVE_DIR}, falling back to AutoML")
+
+    with open(MODEL_PATH, "rb") as f:
+        payload = pickle.load(f)
+    return LoadedModel(
+        "automl", payload["automl"], payload["features"], payload.get("best_threshold"),
+        encoding=encoding, version=version, payload=payload, loaded_at=time.time(),
+    )
+
+
+def validate_model(candidate: LoadedModel, current: LoadedModel | None = None, allow_feature_change: bool = False) -> None:
+    """
+    Проверки перед включением версии:
+    - FEATURES — непустой список без повторов; совпадает с текущим
+      (иначе нужен allow_feature_change: меняется контракт снимков и кэша)
+    - каждый label encoder относится к признаку модели
+    - пробный прогон preprocess → predict (он же прогрев) даёт вероятности в [0, 1]
+    """
+    features = candidate.features
+    if not features or len(set(features)) != len(features):
+        raise ModelValidationError("FEATURES must be a non-empty list without duplicates")
+
+    if current is not None and features != current.features and not allow_feature_change:
+        added = sorted(set(features) - set(current.features))
+        removed = sorted(set(current.features) - set(features))
+        raise ModelValidationError(
+            f"FEATURES contract changed (added={added}, removed={removed}, "
+            f"order_changed={not added and not removed}); reload with force to accept"
+        )
+
+    unknown = sorted(set(candidate.encoding.tables) - set(features))
+    if unknown:
+        raise ModelValidationError(f"Label encoders for columns missing in FEATURES: {unknown}")
+
+    try:
+        X = preprocess_for_model(pd.DataFrame([{"user_email": "warmup@example.com"}]), model=candidate)
+        X = pd.concat([X, pd.DataFrame([np.ones(len(features))], columns=features)], ignore_index=True)
+        risks = np.asarray(candidate.predict(X), dtype=np.float64)
+    except Exception as e:
+        raise ModelValidationError(f"Warm-up predict failed: {e}") from e
+
+    if risks.shape != (2,) or not all(math.isfinite(r) and 0.0 <= r <= 1.0 for r in risks):
+        raise ModelValidationError(f"Warm-up predict returned invalid probabilities: {risks.tolist()}")
+
+
+# ---------------- REGISTRY ----------------
+
+class ModelRegistry:
+    """
+    Держит текущую версию модели и несколько предыдущих для отката.
+
+    Чтение current() — без блокировок: смена версии — замена одной ссылки,
+    запросы, уже получившие старую LoadedModel, дорабатывают на ней.
+    Загрузка/откат сериализуются отдельной блокировкой.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], LoadedModel] = load_artifacts,
+        keep: int = 2,
+        on_swap: Callable[[LoadedModel, LoadedModel], None] | None = None,
+    ):
+        self.loader = loader
+        self.on_swap = on_swap
+
+        self._current: LoadedModel | None = None
+        self._previous: deque[LoadedModel] = deque(maxlen=max(keep, 0))
+        self._lock = threading.Lock()
+
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: str | None = None
+
+        self._watcher: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    # ---------------- read ----------------
+
+    def current(self) -> LoadedModel:
+        model = self._current
+        if model is None:
+            with self._lock:
+                if self._current is None:
+                    start = time.perf_counter()
+                    candidate = self.loader()
+                    validate_model(candidate)
+                    self._current = candidate
+                    logger.info(
+                        f"Model {self._current.version} loaded ({self._current.runtime}) "
+                        f"in {time.perf_counter() - start:.2f}s"
+                    )
+                model = self._current
+        return model
+
+    @property
+    def loaded(self) -> bool:
+        return self._current is not None
+
+    # ---------------- update ----------------
+
+    def reload(self, force: bool = False) -> LoadedModel:
+        """
+        Загружает артефакты с диска, проверяет и включает новую версию.
+        Если содержимое не изменилось — остаётся текущая версия.
+        """
+        with self._lock:
+            current = self._current
+            try:
+                candidate = self.loader()
+                if current is not None and candidate.version == current.version:
+                    return current
+                validate_model(candidate, current, allow_feature_change=force)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.error(f"Model reload rejected: {e}")
+                raise
+            self._swap(candidate)
+            self.reloads += 1
+            self.last_error = None
+            return candidate
+
+    def rollback(self, version: str | None = None) -> LoadedModel:
+        """
+        Возвращает предыдущую версию (или указанную из сохранённых).
+        """
+        with self._lock:
+            target = next(
+                (m for m in self._previous if version is None or m.version == version),
+                None,
+            )
+            if target is None:
+                raise LookupError(f"Model version {version or '(previous)'} is not available for rollback")
+            self._previous.remove(target)
+            self._swap(target)
+            return target
+
+    def _swap(self, new: LoadedModel) -> None:
+        old = self._current
+        if old is not None and self._previous.maxlen:
+            self._previous.appendleft(old)
+        self._current = new
+        logger.info(f"Model switched: {old.version if old else None} → {new.version}")
+        if old is not None and self.on_swap is not None:
+            try:
+                self.on_swap(old, new)
+            except Exception as e:
+                logger.error(f"Model swap hook failed: {e}")
+
+    # ---------------- watcher ----------------
+
+    def start_watching(self, interval: float, paths: Callable[[], list[str]] = artifact_paths) -> None:
+        """
+        Фоновая проверка файлов артефактов. Перезагрузка — когда изменение
+        держится два опроса подряд (DVC/копирование успели дописать оба файла).
+        """
+        if self._watcher is not None or interval <= 0:
+            return
+        self._stop.clear()
+        # исходное состояние фиксируется до старта потока
+        initial = artifacts_signature(paths())
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval, paths, initial), name="model-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def _watch(self, interval: float, paths: Callable[[], list[str]], initial: tuple) -> None:
+        applied = seen = initial
+        while not self._stop.wait(interval):
+            signature = artifacts_signature(paths())
+            if signature != applied and signature == seen:
+                applied = signature
+                try:
+                    self.reload()
+                except Exception:
+                    pass  # ошибка записана в last_error, текущая версия продолжает работать
+            seen = signature
+
+    # ---------------- views ----------------
+
+    def stats(self) -> dict:
+        current = self._current
+        return {
+            "current": current.info() if current else None,
+            "previous": [m.info() for m in self._previous],
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "watching": self._watcher is not None,
+        }
+
+
+def _invalidate_scores(old: LoadedModel, new: LoadedModel) -> None:
+    # скоры в кэше посчитаны старой версией; строки признаков остаются валидными
+    from app.ml.cache import get_feature_cache
+
+    cache = get_feature_cache()
+    if cache is not None:
+        cache.invalidate_scores()
+
+
+# ---------------- singleton ----------------
+
+_registry: ModelRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(
+                    keep=get_settings().MODEL_KEEP_VERSIONS,
+                    on_swap=_invalidate_scores,
+                )
+    return _registry
+
+
+def model_registry_loaded() -> bool:
+    registry = _registry
+    return registry is not None and registry.loaded
+
+
+def start_model_watcher() -> None:
+    """
+    Наблюдатель за артефактами (lifespan воркера), если MODEL_WATCH_SECONDS > 0.
+    """
+    get_model_registry().start_watching(get_settings().MODEL_WATCH_SECONDS)
+
+
+def stop_model_watcher() -> None:
+    registry = _registry
+    if registry is not None:
+        registry.stop_watching()
+
+
+class _ModelCollector:
+    """
+    Версия модели и перезагрузки для /metrics (считываются при scrape).
+    """
+
+    def collect(self):
+        registry = _registry
+        if registry is None or not registry.loaded:
+            return
+        current = registry.current()
+
+        info = GaugeMetricFamily("antifraud_model_info", "Loaded model version", labels=["version", "runtime"])
+        info.add_metric([current.version, current.runtime], 1)
+        yield info
+        yield CounterMetricFamily("antifraud_model_reloads", "Successful model swaps", value=registry.reloads)
+        yield CounterMetricFamily("antifraud_model_reload_failures", "Rejected model versions", value=registry.failures)
+
+
+REGISTRY.register(_ModelCollector())
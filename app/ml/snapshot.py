@@ -0,0 +1,397 @@
+# app/ml/snapshot.py
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import get_settings
+from app.ml.fetch import normalize_email
+from app.ml.model import get_features, load_model
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+# Снимок признаков для realtime: batch-воркер по ходу прогона пишет чанки в <dir>/.tmp-*,
+# после прогона публикует версию
+#   <dir>/v<version>/keys.npy    — отсортированные uint64-хэши email
+#   <dir>/v<version>/matrix.npy  — float64 матрица (n, len(FEATURES)) в порядке FEATURES
+#   <dir>/v<version>/meta.json   — версия, время, feature_days, список FEATURES, версия модели
+#   <dir>/CURRENT                — имя актуальной версии (меняется атомарно через os.replace)
+# Realtime-воркер открывает файлы через mmap и ищет пользователя бинарным поиском.
+# Категории в матрице уже закодированы label encoders модели, поэтому снимок
+# годится только для той версии модели, которой собран (model_version в meta.json).
+
+POINTER_FILE = "CURRENT"
+# строк матрицы за один шаг переноса в matrix.npy при публикации
+GATHER_ROWS = 65_536
+# временный каталог без публикации дольше этого — брошен упавшим прогоном
+STAGING_STALE_SECONDS = 86_400.0
+
+
+def email_key(email: str) -> int:
+    """
+    64-битный ключ нормализованного email.
+    """
+    digest = hashlib.blake2b(normalize_email(email).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def email_keys(emails: Iterable[str]) -> np.ndarray:
+    return np.fromiter((email_key(e) for e in emails), dtype=np.uint64)
+
+
+# ---------------- WRITER (batch) ----------------
+
+class SnapshotWriter:
+    """
+    Пишет model-ready строки batch-прогона на диск по чанкам и публикует новую версию снимка.
+
+    Чанки дописываются в сырые файлы во временном каталоге версии (keys.bin, matrix.bin),
+    в памяти — только текущий чанк. publish() сортирует одни ключи (8 байт на пользователя)
+    и переносит строки матрицы в matrix.npy блоками через mmap: пик памяти не растёт
+    с размером популяции, как и у потокового batch.
+    """
+
+    def __init__(self, directory: str, feature_days: int = 365, keep: int = 3):
+        self.directory = directory
+        self.feature_days = feature_days
+        self.keep = keep
+        self.model_version: str | None = None
+        self._tmp_dir: str | None = None
+        self._rows = 0
+
+    def _staging(self) -> str:
+        if self._tmp_dir is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._tmp_dir = os.path.join(self.directory, f".tmp-{time.time_ns()}-{os.getpid()}")
+            os.makedirs(self._tmp_dir)
+        return self._tmp_dir
+
+    def add(self, emails: pd.Series, X: pd.DataFrame, model_version: str | None = None) -> None:
+        """
+        model_version — версия модели, чьими encoders закодирован X (по умолчанию текущая).
+        """
+        if list(X.columns) != get_features():
+            raise ValueError("❌ Feature contract broken")
+        model_version = model_version or load_model().version
+        if self.model_version is None:
+            self.model_version = model_version
+        elif self.model_version != model_version:
+            raise ValueError("❌ Snapshot chunks encoded by different model versions")
+
+        staging = self._staging()
+        with open(os.path.join(staging, "keys.bin"), "ab") as f:
+            f.write(email_keys(emails).tobytes())
+        with open(os.path.join(staging, "matrix.bin"), "ab") as f:
+            f.write(np.ascontiguousarray(X.to_numpy(dtype=np.float64)).tobytes())
+        self._rows += len(X)
+
+    @property
+    def rows(self) -> int:
+        return self._rows
+
+    def publish(self) -> str:
+        """
+        Досортировывает временный каталог в версию, переименовывает его и атомарно
+        переключает CURRENT. Читатели старой версии не затрагиваются.
+        """
+        staging = self._staging()
+        n_features = len(get_features())
+        keys_path = os.path.join(staging, "keys.bin")
+        matrix_path = os.path.join(staging, "matrix.bin")
+
+        keys = np.fromfile(keys_path, dtype=np.uint64) if os.path.exists(keys_path) else np.empty(0, dtype=np.uint64)
+
+        # сортировка по ключу; при повторе email побеждает последняя строка
+        order = np.argsort(keys, kind="stable")[::-1]
+        _, first = np.unique(keys[order], return_index=True)
+        order = order[first]
+        np.save(os.path.join(staging, "keys.npy"), keys[order])
+        del keys
+
+        if len(order):
+            source = np.memmap(matrix_path, dtype=np.float64, mode="r", shape=(self._rows, n_features))
+            matrix = np.lib.format.open_memmap(
+                os.path.join(staging, "matrix.npy"), mode="w+", dtype=np.float64, shape=(len(order), n_features),
+            )
+            for start in range(0, len(order), GATHER_ROWS):
+                block = order[start:start + GATHER_ROWS]
+                matrix[start:start + len(block)] = source[block]
+            matrix.flush()
+            del matrix, source
+        else:
+            np.save(os.path.join(staging, "matrix.npy"), np.empty((0, n_features), dtype=np.float64))
+        for raw in (keys_path, matrix_path):
+            if os.path.exists(raw):
+                os.remove(raw)
+
+        version = f"{time.time_ns()}"
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "version": version,
+                    "created_at": time.time(),
+                    "feature_days": self.feature_days,
+                    "rows": int(len(order)),
+                    "features": get_features(),
+                    "model_version": self.model_version,
+                },
+                f,
+            )
+
+        os.rename(staging, os.path.join(self.directory, f"v{version}"))
+
+        pointer_tmp = os.path.join(self.directory, f".{POINTER_FILE}.{os.getpid()}")
+        with open(pointer_tmp, "w") as f:
+            f.write(f"v{version}")
+        os.replace(pointer_tmp, os.path.join(self.directory, POINTER_FILE))
+
+        self._cleanup(current=f"v{version}")
+        logger.info(f"Feature snapshot v{version} published: {len(order)} users, model {self.model_version}")
+        self._tmp_dir, self._rows, self.model_version = None, 0, None
+        return version
+
+    def discard(self) -> None:
+        """
+        Удаляет временный каталог прогона, который не будет опубликован.
+        """
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        self._tmp_dir, self._rows, self.model_version = None, 0, None
+
+    def _cleanup(self, current: str) -> None:
+        versions = sorted(
+            (d for d in os.listdir(self.directory) if d.startswith("v") and d != current),
+            reverse=True,
+        )
+        # mmap уже открытых файлов переживает удаление каталога
+        for stale in versions[max(self.keep - 1, 0):]:
+            shutil.rmtree(os.path.join(self.directory, stale), ignore_errors=True)
+
+        # временные каталоги упавших прогонов (свой уже переименован)
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".tmp-") and time.time() - _last_modified(path) > STAGING_STALE_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def _last_modified(path: str) -> float:
+    """
+    mtime каталога или самого свежего файла в нём (дописывание не меняет mtime каталога).
+    """
+    try:
+        with os.scandir(path) as entries:
+            return max([os.path.getmtime(path), *(e.stat().st_mtime for e in entries)])
+    except OSError:
+        return time.time()
+
+
+# ---------------- READER (realtime) ----------------
+
+class FeatureSnapshot:
+    """
+    Одна неизменяемая версия снимка, открытая через mmap.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.version = self.meta["version"]
+        self.created_at = self.meta["created_at"]
+        self.feature_days = self.meta["feature_days"]
+        self.model_version = self.meta.get("model_version")
+        self.keys = np.load(os.path.join(path, "keys.npy"), mmap_mode="r")
+        self.matrix = np.load(os.path.join(path, "matrix.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.created_at
+
+    def find(self, email: str) -> int | None:
+        """
+        Позиция пользователя в матрице (бинарный поиск, O(log n)).
+        """
+        key = np.uint64(email_key(email))
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return i
+        return None
+
+
+class SnapshotReader:
+    """
+    Держит актуальную версию снимка и подменяет её при публикации новой.
+
+    Смена версии — это замена одной ссылки: запросы, уже получившие старый
+    FeatureSnapshot, дорабатывают на нём. Проверка CURRENT — не чаще
+    check_seconds и без блокировки читателей.
+    """
+
+    def __init__(self, directory: str, max_age_seconds: float = 86_400.0, check_seconds: float = 5.0):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+        self.check_seconds = check_seconds
+
+        self._snapshot: FeatureSnapshot | None = None
+        self._checked_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._model_mismatch = 0
+
+    def current(self) -> FeatureSnapshot | None:
+        if time.monotonic() - self._checked_at >= self.check_seconds:
+            self.refresh()
+        return self._snapshot
+
+    def refresh(self) -> None:
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # версию уже проверяет другой поток
+        try:
+            self._checked_at = time.monotonic()
+            try:
+                with open(os.path.join(self.directory, POINTER_FILE)) as f:
+                    name = f.read().strip()
+            except FileNotFoundError:
+                return
+
+            snapshot = self._snapshot
+            if snapshot is not None and f"v{snapshot.version}" == name:
+                return
+
+            loaded = FeatureSnapshot(os.path.join(self.directory, name))
+            if loaded.meta["features"] != get_features():
+                logger.warning(f"Feature snapshot {name} ignored: FEATURES differ from the model")
+                return
+
+            self._snapshot = loaded
+            logger.info(f"Feature snapshot {name} loaded: {len(loaded)} users")
+        except Exception as e:
+            logger.error(f"Feature snapshot refresh failed: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    def _usable(self, snapshot: FeatureSnapshot | None, count: int, feature_days: int, model_version: str | None) -> bool:
+        """
+        Подходит ли снимок запросу; иначе count поисков уходят в нужный счётчик.
+        """
+        if snapshot is None or snapshot.feature_days != feature_days:
+            self._misses += count
+            return False
+        # hot reload модели не меняет CURRENT — версию сверяем на каждом поиске
+        if snapshot.model_version != (model_version or load_model().version):
+            self._model_mismatch += count
+            return False
+        if snapshot.age_seconds > self.max_age_seconds:
+            self._stale += count
+            return False
+        return True
+
+    def lookup_many(
+        self, emails: list[str], feature_days: int = 365, model_version: str | None = None
+    ) -> tuple[list[str], np.ndarray]:
+        """
+        Найденные email и их строки признаков (n, len(FEATURES)).
+        Промах — нет снимка, другой feature_days, снимок другой версии модели,
+        снимок устарел или email не найден.
+        """
+        snapshot = self.current()
+        empty = np.empty((0, len(get_features())), dtype=np.float64)
+
+        if not self._usable(snapshot, len(emails), feature_days, model_version):
+            return [], empty
+
+        found, positions = [], []
+        for email in emails:
+            pos = snapshot.find(email)
+            if pos is not None:
+                found.append(email)
+                positions.append(pos)
+
+        self._hits += len(found)
+        self._misses += len(emails) - len(found)
+        if not positions:
+            return [], empty
+        return found, snapshot.matrix[positions]
+
+    def lookup(self, email: str, feature_days: int = 365, model_version: str | None = None) -> pd.DataFrame | None:
+        """
+        Строка признаков одного пользователя в формате preprocess_for_model.
+        model_version — версия модели, которая будет скорить строку (по умолчанию текущая).
+        """
+        snapshot = self.current()
+        if not self._usable(snapshot, 1, feature_days, model_version):
+            return None
+
+        pos = snapshot.find(email)
+        if pos is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        # срез mmap без копирования
+        return pd.DataFrame(snapshot.matrix[pos: pos + 1], columns=get_features(), copy=False)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "users": len(snapshot) if snapshot else 0,
+            "model_version": snapshot.model_version if snapshot else None,
+            "age_seconds": round(snapshot.age_seconds, 1) if snapshot else None,
+            "hits": self._hits,
+            "misses": self._misses,
+            "stale": self._stale,
+            "model_mismatch": self._model_mismatch,
+        }
+
+
+# ---------------- singletons ----------------
+
+_reader: SnapshotReader | None = None
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def get_feature_snapshot() -> SnapshotReader | None:
+    """
+    Reader снимка realtime-воркера (None, если снимки выключены).
+    """
+    global _reader, _initialized
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                settings = get_settings()
+                if settings.FEATURE_SNAPSHOT_ENABLED:
+                    _reader = SnapshotReader(
+                        directory=settings.FEATURE_SNAPSHOT_DIR,
+                        max_age_seconds=settings.FEATURE_SNAPSHOT_MAX_AGE_SECONDS,
+                        check_seconds=settings.FEATURE_SNAPSHOT_CHECK_SECONDS,
+                    )
+                _initialized = True
+    return _reader
+
+
+def create_snapshot_writer(feature_days: int = 365) -> SnapshotWriter | None:
+    """
+    Writer для batch-прогона (None, если снимки выключены).
+    """
+    settings = get_settings()
+    if not settings.FEATURE_SNAPSHOT_ENABLED:
+        return None
+    return SnapshotWriter(
+        directory=settings.FEATURE_SNAPSHOT_DIR,
+        feature_days=feature_days,
+        keep=settings.FEATURE_SNAPSHOT_KEEP,
+    )
@@ -8,3 +8,4 @@ class Prediction(SQLModel, table=True):
     risk_score: float
     decision: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    job_id: str | None = Field(default=None, index=True)   # batch-джоб (app/services/jobs.py)
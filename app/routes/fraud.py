@@ -1,22 +1,52 @@
 # app/routes/fraud.py
+import json
 import pandas as pd
+from contextlib import ExitStack
+from datetime import datetime
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlmodel import Session
 
-from app.database.database import get_session
-from app.services.clickhouse_client import get_clickhouse_client
+from app.database.config import get_settings as get_db_settings
+from app.database.database import async_session, engine
+from app.services.clickhouse_client import (
+    ClickHousePoolTimeout,
+    clickhouse_connection,
+    clickhouse_pool_stats,
+    get_clickhouse_pool,
+)
+from app.services.microbatch import get_microbatcher
+from app.services.prediction_writer import get_prediction_writer
+from app.services.realtime_executor import run_blocking
+from app.services.singleflight import get_single_flight
+from app.services.jobs import get_job_manager
 
-from app.ml.pipeline import run_batch_pipeline, run_single_user_pipeline
-from app.ml.model import predict, FEATURES
+from app.ml.pipeline import iter_batch_pipeline, run_multi_user_pipeline, run_single_user_pipeline
+from app.ml.model import load_model
+from app.ml.registry import ModelValidationError, get_model_registry
+from app.ml.cache import get_feature_cache
+from app.ml.fetch import normalize_email
+from app.ml.feature_store import refresh_feature_store
+from app.ml.snapshot import create_snapshot_writer, get_feature_snapshot
 from app.models.prediction import Prediction
-from app.schemas.response import PredictResponse
+from app.services.crud.prediction import TimedPredictionRow, bulk_insert_predictions, insert_prediction_records
+from app.schemas.request import PredictUsersRequest
+from app.schemas.response import PredictResponse, PredictUsersResponse
 from app.core.runtime import get_worker_mode
 from app.core.decision import Decision
+from app.core.config import get_settings
+from app.core.metrics import stage_timer
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
 
 fraud_route = APIRouter()
 WORKER_MODE = get_worker_mode()
 
+BATCH_RESULT_COLUMNS = ["user_email", "risk_score", "decision"]
+
 def store_prediction(db: Session, user_email: str, risk: float, decision: str):
     """
     Сохраняет предсказание в Postgres.
@@ -37,30 +67,164 @@ def fraud_healthcheck():
     - что preprocess + predict работают
     """
     try:
-        dummy = pd.DataFrame([{c: 0 for c in FEATURES}])
-        _ = predict(dummy)
+        model = load_model()
+        dummy = pd.DataFrame([{c: 0 for c in model.features}])
+        _ = model.predict(dummy)
 
-        return {
+        health = {
             "status": "ok",
             "worker_mode": WORKER_MODE,
-            "features": len(FEATURES),
+            "features": len(model.features),
+            "model_runtime": model.runtime,
+            "model_version": model.version,
         }
+
+        batcher = get_microbatcher()
+        if batcher is not None:
+            health["microbatch"] = batcher.stats()
+
+        flight = get_single_flight()
+        if flight is not None:
+            health["singleflight"] = flight.stats()
+
+        writer = get_prediction_writer()
+        if writer is not None:
+            health["prediction_writer"] = writer.stats()
+
+        cache = get_feature_cache()
+        if cache is not None:
+            health["cache"] = cache.stats()
+
+        snapshot = get_feature_snapshot()
+        if snapshot is not None:
+            health["snapshot"] = snapshot.stats()
+
+        pool_stats = clickhouse_pool_stats()
+        if pool_stats is not None:
+            health["clickhouse_pool"] = pool_stats
+
+        return health
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# ---------------- MODEL ----------------
+@fraud_route.get("/model", summary="Current and rollback model versions")
+def fraud_model_info():
+    return get_model_registry().stats()
+
+
+@fraud_route.post("/model/reload", summary="Load, validate and switch to the model on disk")
+def fraud_model_reload(force: bool = Query(default=False, description="Accept a changed FEATURES contract")):
+    """
+    Загружает артефакты из models/, проверяет их и атомарно включает новую версию.
+    Запросы в полёте дорабатывают на старой; при ошибке остаётся текущая версия.
+    """
+    registry = get_model_registry()
+    previous = registry.current().version
+    try:
+        model = registry.reload(force=force)
+    except ModelValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {e}")
+    return {"previous_version": previous, **model.info()}
+
+
+@fraud_route.post("/model/rollback", summary="Switch back to a previous model version")
+def fraud_model_rollback(version: Optional[str] = None):
+    registry = get_model_registry()
+    previous = registry.current().version
+    try:
+        model = registry.rollback(version)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"previous_version": previous, **model.info()}
+
+# ---------------- CACHE ----------------
+@fraud_route.delete("/cache", summary="Invalidate realtime feature cache")
+def fraud_cache_invalidate_all():
+    cache = get_feature_cache()
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Feature cache is disabled")
+    return {"invalidated": cache.invalidate()}
+
+
+@fraud_route.delete("/cache/{user_email}", summary="Invalidate cached features of a user")
+def fraud_cache_invalidate_user(user_email: str):
+    cache = get_feature_cache()
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Feature cache is disabled")
+    return {"invalidated": cache.invalidate(normalize_email(user_email))}
+
 # ---------------- BATCH ----------------
+def _stream_batch_results(ch_client, db: Session, model, allowed: list[str] | None, resources: ExitStack):
+    """
+    Чанки сохраняются, коммитятся и сразу уходят клиенту кусками JSON-массива:
+    в памяти воркера — не больше одного чанка результатов.
+
+    Статус 200 уходит с первым чанком, поэтому ошибка посреди прогона не может
+    стать 500: массив закрывается последним элементом {"error": ..., "rows": N}
+    (N — сколько строк отдано до ошибки). Без него клиент принял бы оборванный
+    прогон за короткий результат.
+    """
+    settings = get_settings()
+    snapshot_writer = create_snapshot_writer()
+    try:
+        yield "["
+        first = True
+        rows = 0
+        try:
+            for df in iter_batch_pipeline(
+                ch_client,
+                chunk_size=settings.BATCH_CHUNK_SIZE,
+                columnar=settings.BATCH_FETCH_FORMAT == "columnar",
+                snapshot_writer=snapshot_writer,
+                model=model,
+                connection_factory=get_clickhouse_pool().connection,
+            ):
+                if allowed:
+                    df = df[df["decision"].isin(allowed)]
+                if df.empty:
+                    continue
+
+                with stage_timer("batch", "persist"):
+                    bulk_insert_predictions(
+                        db,
+                        df.itertuples(index=False, name=None),
+                        chunk_size=settings.PREDICTION_INSERT_CHUNK_SIZE,
+                        method=settings.PREDICTION_INSERT_METHOD,
+                    )
+                records = df[BATCH_RESULT_COLUMNS].to_json(orient="records")[1:-1]
+                yield records if first else "," + records
+                first = False
+                rows += len(df)
+        except Exception as e:
+            logger.exception(f"Batch stream failed after {rows} rows")
+            error = json.dumps({"error": f"{type(e).__name__}: {e}", "rows": rows})
+            yield (error if first else "," + error) + "]"
+            return
+        yield "]"
+
+        if snapshot_writer is not None:
+            snapshot_writer.publish()
+    finally:
+        if snapshot_writer is not None:
+            snapshot_writer.discard()   # прогон оборвался — чанки снимка не публикуются
+        resources.close()
+
+
 @fraud_route.post("/predict/batch")
 def fraud_predict_batch(
     decision: Optional[List[Decision]] = Query(
         default=None,
         description="Allowed values: REVIEW, BLOCK",
     ),
-    ch_client=Depends(get_clickhouse_client),
-    db: Session = Depends(get_session),
 ):
     """
     Batch-прогон всех пользователей:
     ClickHouse → pipeline → Postgres
+    Ответ — JSON-массив, который отдаётся потоком по мере готовности чанков.
+    Если прогон упал посреди ответа, последний элемент — {"error": ..., "rows": N}.
     Можно фильтровать вывод:
     REVIEW & BLOCK
     """
@@ -69,34 +233,157 @@ def fraud_predict_batch(
             status_code=403,
             detail="Batch scoring is disabled on realtime workers"
         )
-    
-    df = run_batch_pipeline(ch_client)
-    if df.empty:
-        return []
-    
-    if decision:
-        df = df[df["decision"].isin([d.value for d in decision])]
-
-    for _, row in df.iterrows():
-        store_prediction(
-            db,
-            row["user_email"],
-            row["risk_score"],
-            row["decision"],
+
+    allowed = [d.value for d in decision] if decision else None
+    # все чанки скорятся одной версией модели
+    model = load_model()
+
+    # клиент ClickHouse и сессия нужны, пока отдаётся ответ, а не до выхода из обработчика
+    resources = ExitStack()
+    try:
+        ch_client = resources.enter_context(get_clickhouse_pool().connection())
+        db = resources.enter_context(Session(engine))
+    except ClickHousePoolTimeout as e:
+        resources.close()
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return StreamingResponse(
+        _stream_batch_results(ch_client, db, model, allowed, resources),
+        media_type="application/json",
+        headers={"X-Model-Version": model.version},
+        # если клиент отключился до начала ответа, генератор не запускается
+        background=BackgroundTask(resources.close),
+    )
+
+@fraud_route.post("/feature-store/refresh", summary="Append new days to the incremental feature store")
+def fraud_feature_store_refresh(ch_client=Depends(clickhouse_connection)):
+    """
+    Дозаписывает в feature store закрытые дни после последнего загруженного.
+    """
+    if WORKER_MODE != "batch":
+        raise HTTPException(
+            status_code=403,
+            detail="Feature store refresh is disabled on realtime workers"
+        )
+    return refresh_feature_store(ch_client, backfill_days=get_settings().FEATURE_STORE_BACKFILL_DAYS)
+
+# ---------------- BATCH JOBS ----------------
+def _require_batch_worker():
+    if WORKER_MODE != "batch":
+        raise HTTPException(
+            status_code=403,
+            detail="Batch jobs are disabled on realtime workers"
         )
 
-    db.commit()
-    return df[["user_email", "risk_score", "decision"]].to_dict(orient="records")
+
+def _get_job_or_404(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@fraud_route.post("/jobs", status_code=202, summary="Submit async batch scoring job")
+def fraud_job_submit(active_days: int = 7, feature_days: int = 365):
+    """
+    Запускает batch-прогон в фоне и сразу возвращает job_id.
+    """
+    _require_batch_worker()
+    job = get_job_manager().submit(active_days=active_days, feature_days=feature_days)
+    return job.to_dict()
+
+
+@fraud_route.get("/jobs", summary="List batch jobs")
+def fraud_job_list():
+    _require_batch_worker()
+    return [job.to_dict() for job in get_job_manager().all()]
+
+
+@fraud_route.get("/jobs/{job_id}", summary="Batch job status and progress")
+def fraud_job_status(job_id: str):
+    """
+    Статус джоба: строки fetched / scored / persisted и время по стадиям.
+    """
+    _require_batch_worker()
+    return _get_job_or_404(job_id).to_dict()
+
+
+@fraud_route.get("/jobs/{job_id}/results", summary="Batch job results page")
+def fraud_job_results(
+    job_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=1000, ge=1, le=100_000),
+    decision: Optional[List[Decision]] = Query(default=None),
+    sort: Optional[str] = Query(default=None, description="risk_desc — по убыванию risk_score"),
+):
+    """
+    Результаты джоба постранично из Postgres, с фильтром по decision.
+    Доступны и во время выполнения (уже сохранённые чанки).
+    """
+    _require_batch_worker()
+    return get_job_manager().results_page(
+        _get_job_or_404(job_id),
+        offset=offset,
+        limit=limit,
+        decisions=[d.value for d in decision] if decision else None,
+        sort_by_risk=sort == "risk_desc",
+    )
+
+
+@fraud_route.delete("/jobs/{job_id}", summary="Cancel batch job")
+def fraud_job_cancel(job_id: str):
+    _require_batch_worker()
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 # ---------------- SINGLE USER ----------------
+def _score_user(user_email: str) -> dict | None:
+    with get_clickhouse_pool().connection() as ch_client:
+        return run_single_user_pipeline(ch_client, user_email)
+
+
+async def _score_user_async(user_email: str) -> dict | None:
+    batcher = get_microbatcher()
+    if batcher is not None:
+        return await batcher.score_async(user_email)
+    return await run_blocking(_score_user, user_email)
+
+
+def _store_prediction_sync(result: dict) -> None:
+    with Session(engine) as db:
+        store_prediction(db, result["user_email"], result["risk_score"], result["decision"])
+        db.commit()
+
+
+async def _persist_prediction(result: dict) -> None:
+    """
+    write-behind очередь → AsyncSession (USE_ASYNC) → синхронный commit в пуле realtime.
+    """
+    writer = get_prediction_writer()
+    if writer is not None:
+        # write-behind: запись в очередь, commit — в фоне пачками. Очередь полна —
+        # overflow_policy (block ждёт место, spill пишет на диск) в пуле realtime, не на event loop
+        row = (result["user_email"], result["risk_score"], result["decision"])
+        if not writer.submit_nowait(*row):
+            await run_blocking(writer.submit, *row)
+    elif get_db_settings().USE_ASYNC:
+        async with async_session() as db:
+            store_prediction(db, result["user_email"], result["risk_score"], result["decision"])
+            await db.commit()
+    else:
+        await run_blocking(_store_prediction_sync, result)
+
+
 @fraud_route.get("/predict/user/{user_email}", response_model=PredictResponse)
-def fraud_predict_user(
-    user_email: str,
-    ch_client=Depends(get_clickhouse_client),
-    db: Session = Depends(get_session),
-):
+async def fraud_predict_user(user_email: str):
     """
     Прогноз фрода для одного пользователя.
+    Запрос ждёт на event loop: при micro-batching — Future батча, иначе —
+    ClickHouse и пайплайн в пуле потоков realtime (app/services/realtime_executor.py).
+    Одновременные запросы одного email разделяют один скоринг (single-flight),
+    предсказание сохраняет каждый. При write-behind — в фоне.
     """
     if WORKER_MODE != "realtime":
         raise HTTPException(
@@ -104,17 +391,107 @@ def fraud_predict_user(
             detail="Realtime scoring is disabled on batch workers"
         )
 
-    result = run_single_user_pipeline(ch_client, user_email)
+    try:
+        flight = get_single_flight()
+        if flight is not None:
+            # повторы одного email (card testing) ждут уже идущий скоринг
+            result = await flight.do_async(normalize_email(user_email), lambda: _score_user_async(user_email))
+        else:
+            result = await _score_user_async(user_email)
+    except ClickHousePoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     if result is None:
         raise HTTPException(status_code=404, detail="User not found")
+    result = {**result, "user_email": user_email}   # общий результат — с email этого запроса
 
-    store_prediction(
-        db,
-        result["user_email"],
-        result["risk_score"],
-        result["decision"],
-    )
-    db.commit()
+    with stage_timer("realtime", "persist"):
+        await _persist_prediction(result)
 
     return PredictResponse(**result)
+
+
+# ---------------- MULTI USER ----------------
+def _score_users(user_emails: list[str]) -> dict[str, dict]:
+    with get_clickhouse_pool().connection() as ch_client:
+        return run_multi_user_pipeline(ch_client, user_emails)
+
+
+def _store_predictions_sync(rows: list[TimedPredictionRow]) -> None:
+    with Session(engine) as db:
+        insert_prediction_records(db, rows, get_settings().PREDICTION_INSERT_METHOD)
+        db.commit()
+
+
+async def _persist_predictions(results: list[dict]) -> None:
+    """
+    Пачка предсказаний одного запроса: write-behind очередь → одна транзакция
+    AsyncSession (USE_ASYNC) → одна синхронная транзакция в пуле realtime.
+    """
+    writer = get_prediction_writer()
+    if writer is not None:
+        # одна неблокирующая постановка пачки; не поместилось — overflow_policy в пуле realtime
+        rows = [(r["user_email"], r["risk_score"], r["decision"]) for r in results]
+        queued = writer.submit_many_nowait(rows)
+        if queued < len(rows):
+            await run_blocking(writer.submit_many, rows[queued:])
+        return
+
+    created_at = datetime.utcnow()
+    rows = [(r["user_email"], r["risk_score"], r["decision"], created_at) for r in results]
+    if get_db_settings().USE_ASYNC:
+        async with async_session() as db:
+            # COPY — только через psycopg, на asyncpg — executemany
+            await db.run_sync(insert_prediction_records, rows)
+            await db.commit()
+    else:
+        await run_blocking(_store_predictions_sync, rows)
+
+
+@fraud_route.post("/predict/users", response_model=PredictUsersResponse)
+async def fraud_predict_users(request: PredictUsersRequest):
+    """
+    Прогноз фрода для списка пользователей (до REALTIME_BULK_MAX_USERS email):
+    один запрос признаков в ClickHouse и один predict на весь список.
+    Повторы email (с точностью до регистра и пробелов) скорятся один раз,
+    результаты — в порядке запроса, пользователи без данных — в not_found.
+    Предсказания сохраняются одной пачкой.
+    """
+    if WORKER_MODE != "realtime":
+        raise HTTPException(
+            status_code=403,
+            detail="Realtime scoring is disabled on batch workers"
+        )
+
+    max_users = get_settings().REALTIME_BULK_MAX_USERS
+    if len(request.user_emails) > max_users:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Too many emails: {len(request.user_emails)} > {max_users}"
+        )
+
+    # нормализованный email → написание из запроса (первое)
+    requested: dict[str, str] = {}
+    for email in request.user_emails:
+        requested.setdefault(normalize_email(email), email)
+
+    try:
+        scored = await run_blocking(_score_users, list(requested.values()))
+    except ClickHousePoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    results = [
+        {**scored[key], "user_email": email}
+        for key, email in requested.items()
+        if key in scored
+    ]
+    not_found = [email for key, email in requested.items() if key not in scored]
+
+    if results:
+        with stage_timer("multi", "persist"):
+            await _persist_predictions(results)
+
+    return PredictUsersResponse(
+        results=[PredictResponse(**r) for r in results],
+        not_found=not_found,
+    )
@@ -1,26 +1,164 @@
 # app/routes/gateway.py
 import httpx
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from app.core.config import get_settings
+from app.schemas.request import PredictUsersRequest
+from app.services.http_client import get_http_client
+from app.services.upstreams import UpstreamPool, get_realtime_upstreams
 
 gateway_route = APIRouter()
+settings = get_settings()
+
+BATCH_URL = settings.GATEWAY_BATCH_URL
+
+# Заголовки ответа воркера, которые пробрасываются клиенту как есть
+_PASSTHROUGH_HEADERS = ("content-type", "content-encoding")
+
+
+def _passthrough_headers(r: httpx.Response) -> dict:
+    return {h: r.headers[h] for h in _PASSTHROUGH_HEADERS if h in r.headers}
+
 
-REALTIME_URL = "http://antifraud-realtime:8000/internal/fraud"
-BATCH_URL = "http://antifraud-batch:8000/internal/fraud"
+def _as_response(r: httpx.Response) -> Response:
+    if r.status_code >= 400:
+        raise HTTPException(status_code=r.status_code, detail=r.text)
+    return Response(
+        content=r.content,
+        status_code=r.status_code,
+        media_type=r.headers.get("content-type", "application/json"),
+    )
+
+
+async def _forward(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    timeout: float,
+    params=None,
+) -> Response:
+    """
+    Проксирует запрос и отдаёт тело ответа без повторной JSON-сериализации.
+    """
+    r = await client.request(method, url, params=params, timeout=timeout)
+    return _as_response(r)
+
+
+async def _forward_stream(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    timeout: float,
+    params=None,
+) -> StreamingResponse:
+    """
+    Потоковый проброс больших ответов: байты идут клиенту по мере чтения.
+    """
+    request = client.build_request(method, url, params=params, timeout=timeout)
+    r = await client.send(request, stream=True)
+    if r.status_code >= 400:
+        await r.aread()
+        await r.aclose()
+        raise HTTPException(status_code=r.status_code, detail=r.text)
+    return StreamingResponse(
+        r.aiter_raw(),
+        status_code=r.status_code,
+        headers=_passthrough_headers(r),
+        background=BackgroundTask(r.aclose),
+    )
 
 
 @gateway_route.get("/fraud/predict/user/{email}")
-async def proxy_realtime(email: str):
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(f"{REALTIME_URL}/predict/user/{email}")
-        if r.status_code >= 400:
-            raise HTTPException(status_code=r.status_code, detail=r.text)
-        return r.json()
+async def proxy_realtime(
+    email: str,
+    client: httpx.AsyncClient = Depends(get_http_client),
+    upstreams: UpstreamPool = Depends(get_realtime_upstreams),
+):
+    try:
+        r = await upstreams.request(
+            client,
+            "GET",
+            f"/predict/user/{email}",
+            timeout=settings.GATEWAY_REALTIME_TIMEOUT,
+        )
+    except httpx.TransportError as e:
+        raise HTTPException(status_code=502, detail=f"Realtime upstream unavailable: {e}")
+    return _as_response(r)
+
+
+@gateway_route.post("/fraud/predict/users")
+async def proxy_realtime_users(
+    payload: PredictUsersRequest,
+    client: httpx.AsyncClient = Depends(get_http_client),
+    upstreams: UpstreamPool = Depends(get_realtime_upstreams),
+):
+    try:
+        r = await upstreams.request(
+            client,
+            "POST",
+            "/predict/users",
+            json=payload.model_dump(),
+            timeout=settings.GATEWAY_REALTIME_TIMEOUT,
+        )
+    except httpx.TransportError as e:
+        raise HTTPException(status_code=502, detail=f"Realtime upstream unavailable: {e}")
+    return _as_response(r)
+
+
+@gateway_route.get("/gateway/upstreams")
+async def realtime_upstreams_stats(upstreams: UpstreamPool = Depends(get_realtime_upstreams)):
+    """
+    Состояние реплик realtime: доступность, запросы в полёте, ошибки, повторы.
+    """
+    return upstreams.stats()
 
 
 @gateway_route.post("/fraud/predict/batch")
-async def proxy_batch():
-    async with httpx.AsyncClient(timeout=300) as client:
-        r = await client.post(f"{BATCH_URL}/predict/batch")
-        if r.status_code >= 400:
-            raise HTTPException(status_code=r.status_code, detail=r.text)
-        return r.json()
+async def proxy_batch(request: Request, client: httpx.AsyncClient = Depends(get_http_client)):
+    return await _forward_stream(
+        client,
+        "POST",
+        f"{BATCH_URL}/predict/batch",
+        timeout=settings.GATEWAY_BATCH_TIMEOUT,
+        params=request.query_params.multi_items(),
+    )
+
+
+# ---------------- BATCH JOBS ----------------
+@gateway_route.post("/fraud/jobs", status_code=202)
+async def proxy_job_submit(request: Request, client: httpx.AsyncClient = Depends(get_http_client)):
+    return await _forward(
+        client,
+        "POST",
+        f"{BATCH_URL}/jobs",
+        timeout=settings.GATEWAY_JOBS_TIMEOUT,
+        params=request.query_params.multi_items(),
+    )
+
+
+@gateway_route.get("/fraud/jobs")
+async def proxy_job_list(client: httpx.AsyncClient = Depends(get_http_client)):
+    return await _forward(client, "GET", f"{BATCH_URL}/jobs", timeout=settings.GATEWAY_JOBS_TIMEOUT)
+
+
+@gateway_route.get("/fraud/jobs/{job_id}")
+async def proxy_job_status(job_id: str, client: httpx.AsyncClient = Depends(get_http_client)):
+    return await _forward(client, "GET", f"{BATCH_URL}/jobs/{job_id}", timeout=settings.GATEWAY_JOBS_TIMEOUT)
+
+
+@gateway_route.get("/fraud/jobs/{job_id}/results")
+async def proxy_job_results(job_id: str, request: Request, client: httpx.AsyncClient = Depends(get_http_client)):
+    return await _forward_stream(
+        client,
+        "GET",
+        f"{BATCH_URL}/jobs/{job_id}/results",
+        timeout=settings.GATEWAY_JOBS_TIMEOUT,
+        params=request.query_params.multi_items(),
+    )
+
+
+@gateway_route.delete("/fraud/jobs/{job_id}")
+async def proxy_job_cancel(job_id: str, client: httpx.AsyncClient = Depends(get_http_client)):
+    return await _forward(client, "DELETE", f"{BATCH_URL}/jobs/{job_id}", timeout=settings.GATEWAY_JOBS_TIMEOUT)
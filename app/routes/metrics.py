@@ -0,0 +1,15 @@
+# app/routes/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core.metrics import CONTENT_TYPE, render
+
+metrics_route = APIRouter()
+
+
+@metrics_route.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Метрики процесса в текстовом формате Prometheus (см. app/core/metrics.py).
+    """
+    return Response(content=render(), media_type=CONTENT_TYPE)
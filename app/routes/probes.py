@@ -0,0 +1,46 @@
+# app/routes/probes.py
+from typing import Callable
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse
+
+probes_route = APIRouter()
+
+# Liveness — процесс жив и обслуживает HTTP (не зависит от модели и внешних систем).
+# Readiness — воркер закончил старт (lifespan) и его компоненты готовы принимать трафик:
+#   api      — httpx-клиент к воркерам
+#   realtime — модель, label encoders, пул ClickHouse
+#   batch    — то же
+# Проверки регистрирует lifespan через add_readiness_check.
+
+
+def add_readiness_check(app: FastAPI, name: str, check: Callable[[], bool]) -> None:
+    if not hasattr(app.state, "readiness_checks"):
+        app.state.readiness_checks = {}
+    app.state.readiness_checks[name] = check
+
+
+def set_ready(app: FastAPI, ready: bool) -> None:
+    app.state.started = ready
+
+
+@probes_route.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+
+@probes_route.get("/health/ready")
+async def readiness(request: Request):
+    state = request.app.state
+    checks = {"startup": bool(getattr(state, "started", False))}
+    for name, check in getattr(state, "readiness_checks", {}).items():
+        try:
+            checks[name] = bool(check())
+        except Exception:
+            checks[name] = False
+
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks},
+    )
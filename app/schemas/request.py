@@ -1,5 +1,10 @@
 # app/api/schemas/request.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class PredictRequest(BaseModel):
     user_email: str
+
+
+class PredictUsersRequest(BaseModel):
+    # верхняя граница — REALTIME_BULK_MAX_USERS, проверяется эндпоинтом
+    user_emails: list[str] = Field(min_length=1)
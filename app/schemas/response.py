@@ -5,3 +5,9 @@ class PredictResponse(BaseModel):
     user_email: str
     risk_score: float
     decision: str
+    model_version: str | None = None
+
+
+class PredictUsersResponse(BaseModel):
+    results: list[PredictResponse]     # в порядке запроса, без повторов
+    not_found: list[str]               # email, по которым нет данных в ClickHouse
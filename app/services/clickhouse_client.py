@@ -1,7 +1,25 @@
 # app/services/clickhouse_client.py
+import math
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Iterator
+
 import clickhouse_connect
+from clickhouse_connect.driver.exceptions import OperationalError, StreamClosedError, StreamFailureError
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from functools import lru_cache
+
+from app.core.runtime import get_worker_mode
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+# Ошибки, после которых сессия считается сломанной и пересоздаётся
+BROKEN_SESSION_ERRORS = (OperationalError, StreamClosedError, StreamFailureError)
+
 
 class ClickHouseSettings(BaseSettings):
     CLICK_HOST: str
@@ -9,6 +27,17 @@ class ClickHouseSettings(BaseSettings):
     CLICK_USER: str
     CLICK_PASSWORD: str
 
+    # пул клиентов (см. ClickHousePool)
+    CLICK_POOL_SIZE: int = 8
+    CLICK_POOL_WARMUP: bool = True
+    CLICK_POOL_ACQUIRE_TIMEOUT: float = 5.0
+    CLICK_POOL_CHECK_IDLE_SECONDS: float = 30.0   # ping клиента, простоявшего дольше
+
+    # таймауты запросов по профилю воркера, с
+    CLICK_CONNECT_TIMEOUT: float = 10.0
+    CLICK_REALTIME_TIMEOUT: float = 2.0
+    CLICK_BATCH_TIMEOUT: float = 600.0
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -20,6 +49,9 @@ def get_ch_settings() -> ClickHouseSettings:
     return ClickHouseSettings()
 
 def get_clickhouse_client():
+    """
+    Отдельный клиент вне пула (скрипты, отладка).
+    """
     s = get_ch_settings()
     return clickhouse_connect.get_client(
         host=s.CLICK_HOST,
@@ -30,3 +62,288 @@ def get_clickhouse_client():
         connect_timeout=60,
         send_receive_timeout=60,
     )
+
+
+def create_clickhouse_client(profile: str = "realtime"):
+    """
+    Клиент с таймаутами профиля:
+    - realtime: короткий send/receive и max_execution_time на сервере
+    - batch: длинные запросы на минуты
+    """
+    s = get_ch_settings()
+    timeout = s.CLICK_BATCH_TIMEOUT if profile == "batch" else s.CLICK_REALTIME_TIMEOUT
+    return clickhouse_connect.get_client(
+        host=s.CLICK_HOST,
+        port=s.CLICK_PORT,
+        username=s.CLICK_USER,
+        password=s.CLICK_PASSWORD,
+        compression=True,
+        connect_timeout=s.CLICK_CONNECT_TIMEOUT,
+        send_receive_timeout=timeout,
+        settings={"max_execution_time": max(1, math.ceil(timeout))},
+    )
+
+
+# ---------------- POOL ----------------
+
+class ClickHousePoolTimeout(TimeoutError):
+    """
+    Свободный клиент не освободился за acquire_timeout.
+    """
+
+
+class ClickHousePool:
+    """
+    Потокобезопасный пул клиентов ClickHouse на процесс.
+
+    - не больше size клиентов одновременно, ожидание — до acquire_timeout
+    - клиенты переиспользуются (LIFO: «тёплые» соединения первыми)
+    - клиент, простоявший дольше check_idle_seconds, проверяется ping()
+    - после ошибки соединения клиент закрывается и создаётся заново
+    """
+
+    def __init__(
+        self,
+        factory: Callable,
+        size: int = 8,
+        acquire_timeout: float = 5.0,
+        check_idle_seconds: float = 30.0,
+        name: str = "clickhouse",
+    ):
+        self.factory = factory
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.check_idle_seconds = check_idle_seconds
+        self.name = name
+
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+        # метрики
+        self._in_use = 0
+        self._created = 0
+        self._recycled = 0
+        self._acquires = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # ---------------- lifecycle ----------------
+
+    def warm_up(self) -> int:
+        """
+        Создаёт клиентов заранее, чтобы первые запросы не платили за handshake.
+        Ошибки не фатальны: недостающие клиенты создадутся по требованию.
+        """
+        warmed = 0
+        for _ in range(self.size - self._idle.qsize()):
+            try:
+                client = self._create()
+            except Exception as e:
+                logger.warning(f"ClickHouse pool '{self.name}' warm-up failed: {e}")
+                break
+            self._idle.put((client, time.monotonic()))
+            warmed += 1
+        logger.info(f"ClickHouse pool '{self.name}' warmed up: {warmed}/{self.size} clients")
+        return warmed
+
+    def close(self) -> None:
+        while True:
+            try:
+                client, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            _close_quietly(client)
+
+    # ---------------- API ----------------
+
+    @contextmanager
+    def connection(self, timeout: float | None = None) -> Iterator:
+        """
+        Выдаёт клиента на время блока with и возвращает его в пул.
+        """
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.acquire_timeout if timeout is None else timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise ClickHousePoolTimeout(f"ClickHouse pool '{self.name}' exhausted ({self.size} clients busy)")
+
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._acquires += 1
+            self._in_use += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+        client = None
+        try:
+            client = self._checkout()
+            yield client
+        except BROKEN_SESSION_ERRORS:
+            if client is not None:
+                self._discard(client)
+                client = None
+            raise
+        finally:
+            if client is not None:
+                self._idle.put((client, time.monotonic()))
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "utilization": round(self._in_use / self.size, 3) if self.size else 0.0,
+                "created": self._created,
+                "recycled": self._recycled,
+                "acquires": self._acquires,
+                "timeouts": self._timeouts,
+                "wait_ms_avg": round(self._wait_total / self._acquires * 1000, 3) if self._acquires else 0.0,
+                "wait_ms_max": round(self._wait_max * 1000, 3),
+            }
+
+    # ---------------- internals ----------------
+
+    def _create(self):
+        client = self.factory()
+        with self._lock:
+            self._created += 1
+        return client
+
+    def _discard(self, client) -> None:
+        _close_quietly(client)
+        with self._lock:
+            self._recycled += 1
+
+    def _checkout(self):
+        try:
+            client, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            return self._create()
+
+        if time.monotonic() - last_used > self.check_idle_seconds and not _ping(client):
+            logger.warning(f"ClickHouse pool '{self.name}': stale client recycled")
+            self._discard(client)
+            return self._create()
+        return client
+
+
+def _ping(client) -> bool:
+    try:
+        return bool(client.ping())
+    except Exception:
+        return False
+
+
+def _close_quietly(client) -> None:
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+# ---------------- singleton ----------------
+
+_pool: ClickHousePool | None = None
+_pool_lock = threading.Lock()
+
+
+def _worker_profile() -> str:
+    return "batch" if get_worker_mode() == "batch" else "realtime"
+
+
+def _create_pool(profile: str) -> ClickHousePool:
+    s = get_ch_settings()
+    return ClickHousePool(
+        factory=lambda: create_clickhouse_client(profile),
+        size=s.CLICK_POOL_SIZE,
+        acquire_timeout=s.CLICK_POOL_ACQUIRE_TIMEOUT,
+        check_idle_seconds=s.CLICK_POOL_CHECK_IDLE_SECONDS,
+        name=profile,
+    )
+
+
+def init_clickhouse_pool(profile: str | None = None) -> ClickHousePool:
+    """
+    Создаёт пул воркера при старте (lifespan) и прогревает его.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _create_pool(profile or _worker_profile())
+            if get_ch_settings().CLICK_POOL_WARMUP:
+                _pool.warm_up()
+    return _pool
+
+
+def get_clickhouse_pool() -> ClickHousePool:
+    """
+    Пул процесса; если lifespan не запускался — создаётся лениво, без прогрева.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _create_pool(_worker_profile())
+    return _pool
+
+
+def clickhouse_pool_stats() -> dict | None:
+    """
+    Метрики пула (None, если пул ещё не создан).
+    """
+    pool = _pool
+    return pool.stats() if pool is not None else None
+
+
+class _PoolCollector:
+    """
+    Состояние пула для /metrics (считывается при scrape).
+    """
+
+    def collect(self):
+        pool = _pool
+        if pool is None:
+            return
+        stats = pool.stats()
+
+        size = GaugeMetricFamily("antifraud_clickhouse_pool_size", "ClickHouse pool size", labels=["pool"])
+        size.add_metric([pool.name], stats["size"])
+        connections = GaugeMetricFamily(
+            "antifraud_clickhouse_pool_connections", "ClickHouse clients by state", labels=["pool", "state"],
+        )
+        connections.add_metric([pool.name, "in_use"], stats["in_use"])
+        connections.add_metric([pool.name, "idle"], stats["idle"])
+        timeouts = CounterMetricFamily("antifraud_clickhouse_pool_timeouts", "Pool acquire timeouts", labels=["pool"])
+        timeouts.add_metric([pool.name], stats["timeouts"])
+        recycled = CounterMetricFamily(
+            "antifraud_clickhouse_pool_recycled", "Broken or stale clients replaced", labels=["pool"],
+        )
+        recycled.add_metric([pool.name], stats["recycled"])
+        wait = GaugeMetricFamily("antifraud_clickhouse_pool_wait_seconds_max", "Longest wait for a client", labels=["pool"])
+        wait.add_metric([pool.name], stats["wait_ms_max"] / 1000)
+        yield from (size, connections, timeouts, recycled, wait)
+
+
+REGISTRY.register(_PoolCollector())
+
+
+def close_clickhouse_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def clickhouse_connection() -> Iterator:
+    """
+    FastAPI dependency: клиент из пула на время запроса.
+    """
+    with get_clickhouse_pool().connection() as client:
+        yield client
@@ -0,0 +1,136 @@
+# app/services/crud/prediction.py
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Iterable
+
+from sqlalchemy import func, insert
+from sqlmodel import Session, select
+
+from app.models.prediction import Prediction
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+PredictionRow = tuple[str, float, str]   # (user_email, risk_score, decision)
+TimedPredictionRow = tuple[str, float, str, datetime]   # + created_at
+
+_COLUMNS = ("user_email", "risk_score", "decision", "created_at", "job_id")
+
+
+def _chunks(rows: Iterable[PredictionRow], size: int):
+    it = iter(rows)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def _insert_executemany(db: Session, chunk: list[TimedPredictionRow], job_id: str | None = None) -> None:
+    db.execute(
+        insert(Prediction),
+        [
+            {
+                "user_email": user_email,
+                "risk_score": float(risk),
+                "decision": decision,
+                "created_at": created_at,
+                "job_id": job_id,
+            }
+            for user_email, risk, decision, created_at in chunk
+        ],
+    )
+
+
+def _insert_copy(db: Session, chunk: list[TimedPredictionRow], job_id: str | None = None) -> None:
+    """
+    Postgres COPY через psycopg (только для postgresql+psycopg).
+    """
+    raw = db.connection().connection.driver_connection
+    table = Prediction.__tablename__
+    with raw.cursor() as cursor:
+        with cursor.copy(f"COPY {table} ({', '.join(_COLUMNS)}) FROM STDIN") as copy:
+            for user_email, risk, decision, created_at in chunk:
+                copy.write_row((user_email, float(risk), decision, created_at, job_id))
+
+
+def _writer(db: Session, method: str):
+    if method == "copy" and db.get_bind().dialect.name != "postgresql":
+        method = "executemany"
+    return method, (_insert_copy if method == "copy" else _insert_executemany)
+
+
+def insert_prediction_records(db: Session, rows: list[TimedPredictionRow], method: str = "executemany") -> None:
+    """
+    Одна пачка предсказаний со своим created_at (write-behind очередь realtime).
+    Без commit — транзакцией управляет вызывающий.
+    """
+    _, write = _writer(db, method)
+    write(db, rows)
+
+
+def bulk_insert_predictions(
+    db: Session,
+    rows: Iterable[PredictionRow],
+    chunk_size: int = 10_000,
+    method: str = "executemany",
+    job_id: str | None = None,
+) -> dict:
+    """
+    Массовая запись предсказаний с commit на каждый чанк.
+    job_id — batch-джоб, по нему страницы результатов читаются из Postgres.
+
+    method:
+    - "executemany" — insert().values пачками (работает и на SQLite)
+    - "copy" — Postgres COPY через psycopg; на других СУБД откатывается на executemany
+
+    Возвращает статистику: rows, seconds, rows_per_sec.
+    """
+    method, write = _writer(db, method)
+
+    start = time.perf_counter()
+    total = 0
+
+    for chunk in _chunks(rows, chunk_size):
+        created_at = datetime.utcnow()
+        write(db, [(*row, created_at) for row in chunk], job_id)
+        db.commit()
+        total += len(chunk)
+
+    seconds = time.perf_counter() - start
+    stats = {
+        "rows": total,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(total / seconds, 1) if seconds > 0 else 0.0,
+    }
+    logger.info(f"Persisted predictions ({method}): {stats}")
+    return stats
+
+
+def job_predictions_page(
+    db: Session,
+    job_id: str,
+    offset: int = 0,
+    limit: int = 1000,
+    decisions: list[str] | None = None,
+    sort_by_risk: bool = False,
+) -> tuple[int, list[dict]]:
+    """
+    Страница предсказаний batch-джоба: (всего с учётом фильтра, строки страницы).
+    Порядок — как записывались, или по убыванию risk_score.
+    """
+    where = [Prediction.job_id == job_id]
+    if decisions:
+        where.append(Prediction.decision.in_(decisions))
+
+    total = db.exec(select(func.count()).select_from(Prediction).where(*where)).one()
+    order = (Prediction.risk_score.desc(), Prediction.id) if sort_by_risk else (Prediction.id,)
+    rows = db.exec(
+        select(Prediction.user_email, Prediction.risk_score, Prediction.decision)
+        .where(*where)
+        .order_by(*order)
+        .offset(offset)
+        .limit(limit)
+    ).all()
+    return total, [
+        {"user_email": email, "risk_score": risk, "decision": decision}
+        for email, risk, decision in rows
+    ]
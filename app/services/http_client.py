@@ -0,0 +1,43 @@
+# app/services/http_client.py
+import httpx
+from fastapi import FastAPI, Request
+
+from app.core.config import get_settings
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Общий httpx-клиент gateway: keep-alive и пул соединений к воркерам.
+    Таймауты задаются на уровне маршрута.
+    """
+    settings = get_settings()
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.GATEWAY_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GATEWAY_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.GATEWAY_KEEPALIVE_EXPIRY,
+        ),
+        timeout=settings.GATEWAY_REALTIME_TIMEOUT,
+    )
+
+
+async def init_http_client(app: FastAPI) -> None:
+    app.state.http_client = create_http_client()
+
+
+async def close_http_client(app: FastAPI) -> None:
+    client = getattr(app.state, "http_client", None)
+    if client is not None:
+        await client.aclose()
+        app.state.http_client = None
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """
+    FastAPI dependency. Клиент создаётся в lifespan; если lifespan не запускался
+    (например, TestClient без контекстного менеджера) — создаётся лениво.
+    """
+    client = getattr(request.app.state, "http_client", None)
+    if client is None:
+        client = request.app.state.http_client = create_http_client()
+    return client
@@ -0,0 +1,302 @@
+# app/services/jobs.py
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from enum import Enum
+from typing import Callable
+
+import pandas as pd
+from sqlmodel import Session
+
+from app.core.config import get_settings
+from app.core.metrics import PIPELINE_IN_FLIGHT, PIPELINE_STAGE_SECONDS
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+
+class JobStatus(str, Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
+
+
+class BatchJob:
+    """
+    Один batch-прогон: прогресс по стадиям, счётчики решений, отмена.
+    """
+
+    def __init__(self, active_days: int, feature_days: int):
+        self.id = uuid.uuid4().hex
+        self.active_days = active_days
+        self.feature_days = feature_days
+
+        self.status = JobStatus.PENDING
+        self.error: str | None = None
+        self.model_version: str | None = None
+        self.created_at = datetime.utcnow()
+        self.started_at: datetime | None = None
+        self.finished_at: datetime | None = None
+
+        self.rows_fetched = 0
+        self.rows_scored = 0
+        self.rows_persisted = 0
+        self.stage_seconds = {"fetch": 0.0, "score": 0.0, "persist": 0.0}
+
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        # результаты — в Postgres (prediction.job_id), в памяти только счётчики
+        self.decision_counts: dict[str, int] = {}
+
+    # ---------------- state ----------------
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def add_stage_time(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+
+    def count_decisions(self, df: pd.DataFrame) -> None:
+        counts = df["decision"].value_counts()
+        with self._lock:
+            for decision, n in counts.items():
+                self.decision_counts[decision] = self.decision_counts.get(decision, 0) + int(n)
+
+    # ---------------- views ----------------
+
+    def to_dict(self) -> dict:
+        finished = self.finished_at or datetime.utcnow()
+        elapsed = (finished - self.started_at).total_seconds() if self.started_at else 0.0
+        with self._lock:
+            decision_counts = dict(self.decision_counts)
+
+        return {
+            "job_id": self.id,
+            "status": self.status.value,
+            "error": self.error,
+            "model_version": self.model_version,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_fetched": self.rows_fetched,
+            "rows_scored": self.rows_scored,
+            "rows_persisted": self.rows_persisted,
+            "stage_seconds": {k: round(v, 3) for k, v in self.stage_seconds.items()},
+            "decision_counts": decision_counts,
+        }
+
+
+def run_batch_job(job: BatchJob, connection_factory: Callable, session_factory: Callable) -> None:
+    """
+    ClickHouse (поток чанков) → score → Postgres с учётом времени каждой стадии.
+    Отмена проверяется между чанками. Клиенты ClickHouse берутся из
+    connection_factory() (context manager): один на всё время джоба
+    или по клиенту на шард (BATCH_FETCH_SHARDS > 1).
+    """
+    from app.ml.feature_store import refresh_feature_store
+    from app.ml.fetch import stream_batch_features
+    from app.ml.model import load_model
+    from app.ml.pipeline import score_batch_frame
+    from app.ml.snapshot import create_snapshot_writer
+    from app.services.crud.prediction import bulk_insert_predictions
+
+    if job.cancel_requested:
+        job.status = JobStatus.CANCELLED
+        return
+
+    settings = get_settings()
+    job.status = JobStatus.RUNNING
+    job.started_at = datetime.utcnow()
+
+    snapshot_writer = create_snapshot_writer(job.feature_days)
+    in_flight = PIPELINE_IN_FLIGHT.labels("batch")
+    in_flight.inc()
+
+    try:
+        # весь джоб скорится одной версией модели
+        model = load_model()
+        job.model_version = model.version
+        if settings.FEATURE_STORE_ENABLED:
+            start = time.perf_counter()
+            with connection_factory() as client:
+                refresh_feature_store(client, backfill_days=settings.FEATURE_STORE_BACKFILL_DAYS)
+            job.add_stage_time("fetch", time.perf_counter() - start)
+
+        with closing(
+            stream_batch_features(
+                connection_factory,
+                active_days=job.active_days,
+                feature_days=job.feature_days,
+                chunk_size=settings.BATCH_CHUNK_SIZE,
+                columnar=settings.BATCH_FETCH_FORMAT == "columnar",
+            )
+        ) as stream:
+            while not job.cancel_requested:
+                start = time.perf_counter()
+                df_struct = next(stream, None)
+                elapsed = time.perf_counter() - start
+                job.add_stage_time("fetch", elapsed)
+                PIPELINE_STAGE_SECONDS.labels("batch", "fetch").observe(elapsed)
+                if df_struct is None:
+                    break
+                job.rows_fetched += len(df_struct)
+
+                start = time.perf_counter()
+                df = score_batch_frame(df_struct, snapshot_writer, model)
+                job.add_stage_time("score", time.perf_counter() - start)
+                job.rows_scored += len(df)
+
+                start = time.perf_counter()
+                with session_factory() as db:
+                    stats = bulk_insert_predictions(
+                        db,
+                        df.itertuples(index=False, name=None),
+                        chunk_size=settings.PREDICTION_INSERT_CHUNK_SIZE,
+                        method=settings.PREDICTION_INSERT_METHOD,
+                        job_id=job.id,
+                    )
+                elapsed = time.perf_counter() - start
+                job.add_stage_time("persist", elapsed)
+                PIPELINE_STAGE_SECONDS.labels("batch", "persist").observe(elapsed)
+                job.rows_persisted += stats["rows"]
+                job.count_decisions(df)
+
+        # снимок для realtime публикуется только после полного прохода
+        if snapshot_writer is not None and not job.cancel_requested:
+            snapshot_writer.publish()
+
+        job.status = JobStatus.CANCELLED if job.cancel_requested else JobStatus.DONE
+    except Exception as e:
+        logger.error(f"Batch job {job.id} failed: {e}")
+        job.status = JobStatus.FAILED
+        job.error = str(e)
+    finally:
+        if snapshot_writer is not None:
+            snapshot_writer.discard()   # неопубликованные чанки отменённого / упавшего джоба
+        in_flight.dec()
+        job.finished_at = datetime.utcnow()
+        logger.info(f"Batch job {job.id} finished: {job.to_dict()}")
+
+
+class JobManager:
+    """
+    Реестр batch-джобов батч-воркера: запуск в фоне, статус, результаты, отмена.
+    Хранит последние max_history джобов.
+    """
+
+    def __init__(self, connection_factory: Callable, session_factory: Callable, workers: int = 1, max_history: int = 20):
+        self.connection_factory = connection_factory
+        self.session_factory = session_factory
+        self.max_history = max_history
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-job")
+        self._jobs: OrderedDict[str, BatchJob] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, active_days: int = 7, feature_days: int = 365) -> BatchJob:
+        job = BatchJob(active_days=active_days, feature_days=feature_days)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        self._executor.submit(run_batch_job, job, self.connection_factory, self.session_factory)
+        return job
+
+    def get(self, job_id: str) -> BatchJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def all(self) -> list[BatchJob]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def results_page(
+        self,
+        job: BatchJob,
+        offset: int = 0,
+        limit: int = 1000,
+        decisions: list[str] | None = None,
+        sort_by_risk: bool = False,
+    ) -> dict:
+        """
+        Страница результатов джоба из Postgres. Во время выполнения —
+        уже сохранённые чанки.
+        """
+        from app.services.crud.prediction import job_predictions_page
+
+        with self.session_factory() as db:
+            total, items = job_predictions_page(
+                db, job.id, offset=offset, limit=limit, decisions=decisions, sort_by_risk=sort_by_risk,
+            )
+        return {
+            "job_id": job.id,
+            "status": job.status.value,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "items": items,
+        }
+
+    def cancel(self, job_id: str) -> BatchJob | None:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel()
+        if job.status == JobStatus.PENDING:
+            job.status = JobStatus.CANCELLED
+        return job
+
+    def shutdown(self) -> None:
+        for job in self.all():
+            job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _trim(self) -> None:
+        finished = (JobStatus.DONE, JobStatus.FAILED, JobStatus.CANCELLED)
+        while len(self._jobs) > self.max_history:
+            oldest = next((k for k, j in self._jobs.items() if j.status in finished), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
+
+
+# ---------------- singleton ----------------
+
+_manager: JobManager | None = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                from app.database.database import engine
+                from app.services.clickhouse_client import get_clickhouse_pool
+
+                settings = get_settings()
+                _manager = JobManager(
+                    connection_factory=get_clickhouse_pool().connection,
+                    session_factory=lambda: Session(engine),
+                    workers=settings.BATCH_JOB_WORKERS,
+                    max_history=settings.BATCH_JOB_HISTORY,
+                )
+    return _manager
+
+
+def shutdown_job_manager() -> None:
+    global _manager
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None
@@ -0,0 +1,229 @@
+# app/services/microbatch.py
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable
+
+from app.core.config import get_settings
+from app.ml.fetch import normalize_email
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    In-process micro-batching для realtime-воркера.
+
+    Запросы, пришедшие в пределах max_wait_ms (или пока не набралось
+    max_batch_size пользователей), объединяются: один запрос в ClickHouse
+    с IN (...) по email и один predict. Результаты раздаются ожидающим
+    запросам через Future.
+
+    score_fn(client, emails) -> {normalized_email: result}
+    connection_factory() -> context manager с клиентом ClickHouse
+    (например, ClickHousePool.connection — клиент берётся на один батч)
+    """
+
+    def __init__(
+        self,
+        score_fn: Callable,
+        connection_factory: Callable,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 3.0,
+        workers: int = 1,
+        stats_window: int = 1000,
+    ):
+        self.score_fn = score_fn
+        self.connection_factory = connection_factory
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.workers = workers
+
+        self._queue: queue.Queue = queue.Queue()
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+        # метрики
+        self._batches = 0
+        self._requests = 0
+        self._errors = 0
+        self._sizes = deque(maxlen=stats_window)
+        self._latencies_ms = deque(maxlen=stats_window)
+
+    # ---------------- lifecycle ----------------
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"microbatch-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(
+            f"MicroBatcher started: workers={self.workers} "
+            f"max_batch_size={self.max_batch_size} max_wait_ms={self.max_wait * 1000}"
+        )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+        # Всё, что осталось в очереди, завершаем ошибкой
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("MicroBatcher stopped"))
+
+    # ---------------- API ----------------
+
+    def submit(self, user_email: str) -> Future:
+        future: Future = Future()
+        self._queue.put((normalize_email(user_email), future))
+        return future
+
+    def score(self, user_email: str) -> dict | None:
+        """
+        Блокирующий скоринг одного пользователя через батч.
+        """
+        result = self.submit(user_email).result()
+        if result is None:
+            return None
+        return {**result, "user_email": user_email}
+
+    async def score_async(self, user_email: str) -> dict | None:
+        """
+        Скоринг через батч без блокировки event loop: запрос ждёт Future батча,
+        поток не занимается.
+        """
+        result = await asyncio.wrap_future(self.submit(user_email))
+        if result is None:
+            return None
+        return {**result, "user_email": user_email}
+
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = list(self._sizes)
+            latencies = sorted(self._latencies_ms)
+            return {
+                "batches": self._batches,
+                "requests": self._requests,
+                "errors": self._errors,
+                "queue_size": self._queue.qsize(),
+                "avg_batch_size": sum(sizes) / len(sizes) if sizes else 0.0,
+                "max_batch_size": max(sizes) if sizes else 0,
+                "latency_ms_p50": _percentile(latencies, 0.50),
+                "latency_ms_p95": _percentile(latencies, 0.95),
+                "latency_ms_max": latencies[-1] if latencies else 0.0,
+            }
+
+    # ---------------- worker ----------------
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # вернём сигнал остановки в очередь после обработки батча
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+
+            # отменённые запросы (клиент async-эндпоинта отключился) не скорим;
+            # остальные переводятся в RUNNING и больше не отменяются
+            batch = [item for item in self._collect(first) if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            emails = list(dict.fromkeys(email for email, _ in batch))
+
+            start = time.perf_counter()
+            try:
+                with self.connection_factory() as client:
+                    results = self.score_fn(client, emails)
+            except Exception as e:
+                logger.error(f"MicroBatcher batch of {len(emails)} failed: {e}")
+                with self._lock:
+                    self._errors += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            latency_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._sizes.append(len(batch))
+                self._latencies_ms.append(latency_ms)
+
+            for email, future in batch:
+                future.set_result(results.get(email))
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+# ---------------- singleton ----------------
+
+_batcher: MicroBatcher | None = None
+
+
+def get_microbatcher() -> MicroBatcher | None:
+    return _batcher
+
+
+def start_microbatcher() -> MicroBatcher | None:
+    """
+    Запускает micro-batcher, если он включён в настройках.
+    """
+    global _batcher
+    settings = get_settings()
+    if not settings.REALTIME_MICROBATCH_ENABLED:
+        return None
+
+    from app.ml.pipeline import run_multi_user_pipeline
+    from app.services.clickhouse_client import get_clickhouse_pool
+
+    _batcher = MicroBatcher(
+        score_fn=lambda client, emails: run_multi_user_pipeline(client, emails),
+        connection_factory=get_clickhouse_pool().connection,
+        max_batch_size=settings.REALTIME_MICROBATCH_MAX_SIZE,
+        max_wait_ms=settings.REALTIME_MICROBATCH_MAX_WAIT_MS,
+        workers=settings.REALTIME_MICROBATCH_WORKERS,
+    )
+    _batcher.start()
+    return _batcher
+
+
+def stop_microbatcher() -> None:
+    global _batcher
+    if _batcher is not None:
+        _batcher.stop()
+        _batcher = None
@@ -0,0 +1,486 @@
+# app/services/prediction_writer.py
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+from typing import Callable
+
+from prometheus_client import Histogram
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+
+from app.core.config import get_settings
+from app.core.metrics import DEFAULT_BUCKETS
+from app.services.crud.prediction import PredictionRow, TimedPredictionRow, insert_prediction_records
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+OVERFLOW_POLICIES = ("spill", "drop", "block")
+
+_STOP = object()
+
+# как часто простаивающий поток проверяет spill-файлы; чужой файл моложе этого
+# считается дописываемым живым процессом и не трогается
+SPILL_REPLAY_SECONDS = 5.0
+# replay-файл, который его процесс не трогал дольше этого, брошен (процесс
+# в другом контейнере упал посреди дозаливки) — mtime обновляется после каждой пачки
+REPLAY_STALE_SECONDS = 60.0
+
+FLUSH_SECONDS = Histogram(
+    "antifraud_prediction_flush_seconds", "Write-behind flush latency (insert + commit)",
+    buckets=DEFAULT_BUCKETS,
+)
+
+
+class PredictionWriter:
+    """
+    Write-behind запись realtime-предсказаний в Postgres.
+
+    submit() кладёт запись (с временем скоринга) в ограниченную очередь и сразу
+    возвращается — commit и fsync Postgres больше не на пути ответа. Фоновый поток
+    сбрасывает накопленное одной транзакцией каждые flush_interval_ms или по
+    flush_rows записей; упавшая пачка повторяется flush_retries раз.
+
+    Очередь полна (Postgres не успевает или недоступен) — overflow_policy:
+    - "spill" — запись дописывается в JSONL в spill_dir; поток дозаливает файлы,
+      когда очередь пуста, и при старте (at-least-once: падение посреди дозаливки
+      может дать дубли)
+    - "drop" — запись отбрасывается, растёт счётчик dropped
+    - "block" — запрос ждёт место до block_timeout_ms, затем запись отбрасывается
+    Пачка, не записанная после всех повторов, тоже уходит в spill или отбрасывается.
+
+    session_factory() -> sqlmodel.Session (context manager)
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        max_queue: int = 10_000,
+        flush_rows: int = 500,
+        flush_interval_ms: float = 200.0,
+        overflow_policy: str = "spill",
+        block_timeout_ms: float = 50.0,
+        spill_dir: str = "spill",
+        flush_retries: int = 2,
+        retry_backoff: float = 0.5,
+        insert_method: str = "executemany",
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow_policy!r}, expected one of {OVERFLOW_POLICIES}")
+
+        self.session_factory = session_factory
+        self.max_queue = max_queue
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval_ms / 1000
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout_ms / 1000
+        self.spill_dir = Path(spill_dir)
+        self.flush_retries = flush_retries
+        self.retry_backoff = retry_backoff
+        self.insert_method = insert_method
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        # владелец файлов: hostname + pid + nonce. Каталог spill — общий том, а в каждом
+        # контейнере процесс — PID 1: одного pid мало ни для имени, ни для проверки жизни
+        self._host = socket.gethostname()
+        self._pid = os.getpid()
+        self._owner = f"{self._host}.{self._pid}.{uuid.uuid4().hex[:8]}"
+        self._spill_path = self.spill_dir / f"spill-{self._owner}.jsonl"
+        self._seq = count()
+        self._next_replay = 0.0
+
+        # метрики
+        self._submitted = 0
+        self._written = 0
+        self._flushes = 0
+        self._spilled = 0
+        self._dropped = 0
+        self._replayed = 0
+        self._errors = 0
+        self._last_flush_ms = 0.0
+
+    # ---------------- lifecycle ----------------
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="prediction-writer", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"PredictionWriter started: max_queue={self.max_queue} flush_rows={self.flush_rows} "
+            f"flush_interval_ms={self.flush_interval * 1000} policy={self.overflow_policy}"
+        )
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Дописывает очередь и останавливает поток. Что не успело за timeout —
+        в spill (или отбрасывается с записью в лог).
+        """
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(_STOP)   # разбудить поток; полная очередь разбудит и так
+        except queue.Full:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            if self._thread.is_alive():
+                logger.error(f"PredictionWriter did not finish in {timeout}s")
+            self._thread = None
+
+        leftover = self._drain_nowait()
+        if leftover:
+            self._overflow(leftover, reason="shutdown")
+        logger.info(f"PredictionWriter stopped: {self.stats()}")
+
+    # ---------------- API ----------------
+
+    def submit(self, user_email: str, risk_score: float, decision: str) -> bool:
+        """
+        Ставит предсказание в очередь записи.
+        False — очередь полна, запись ушла в spill или отброшена.
+        """
+        return self.submit_many([(user_email, risk_score, decision)]) == 1
+
+    def submit_many(self, rows: list[PredictionRow]) -> int:
+        """
+        Пачка предсказаний одного запроса (одно время скоринга).
+        Возвращает число принятых в очередь; не поместившийся хвост целиком уходит
+        в spill или отбрасывается (block ждёт место не дольше block_timeout_ms на пачку).
+        """
+        created_at = datetime.utcnow()
+        timed = [(email, float(risk), decision, created_at) for email, risk, decision in rows]
+        with self._lock:
+            self._submitted += len(timed)
+
+        if self._stopping.is_set():
+            self._overflow(timed, reason="writer stopped")
+            return 0
+        deadline = time.monotonic() + self.block_timeout
+        for i, row in enumerate(timed):
+            try:
+                if self.overflow_policy == "block":
+                    self._queue.put(row, timeout=max(0.0, deadline - time.monotonic()))
+                else:
+                    self._queue.put_nowait(row)
+            except queue.Full:
+                self._overflow(timed[i:])
+                return i
+        return len(timed)
+
+    def submit_nowait(self, user_email: str, risk_score: float, decision: str) -> bool:
+        """
+        submit() для event loop — см. submit_many_nowait.
+        """
+        return self.submit_many_nowait([(user_email, risk_score, decision)]) == 1
+
+    def submit_many_nowait(self, rows: list[PredictionRow]) -> int:
+        """
+        submit_many() для event loop: только put_nowait, без ожидания места и без spill на диск.
+        Возвращает число принятых в очередь (0 — writer остановлен); остаток rows[n:]
+        вызывающий отдаёт submit_many() в пуле потоков, где срабатывает overflow_policy.
+        """
+        if self._stopping.is_set():
+            return 0
+        created_at = datetime.utcnow()
+        queued = 0
+        for email, risk, decision in rows:
+            try:
+                self._queue.put_nowait((email, float(risk), decision, created_at))
+            except queue.Full:
+                break
+            queued += 1
+        with self._lock:
+            self._submitted += queued
+        return queued
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "policy": self.overflow_policy,
+                "queue_size": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "submitted": self._submitted,
+                "written": self._written,
+                "flushes": self._flushes,
+                "spilled": self._spilled,
+                "dropped": self._dropped,
+                "replayed": self._replayed,
+                "errors": self._errors,
+                "last_flush_ms": round(self._last_flush_ms, 3),
+            }
+
+    # ---------------- worker ----------------
+
+    def _drain_nowait(self, limit: int | None = None) -> list[TimedPredictionRow]:
+        rows = []
+        while limit is None or len(rows) < limit:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not _STOP:
+                rows.append(row)
+        return rows
+
+    def _run(self) -> None:
+        self._replay_spill()
+
+        buffer: list[TimedPredictionRow] = []
+        deadline = 0.0
+        while True:
+            if not buffer and self._stopping.is_set() and self._queue.empty():
+                break
+            timeout = self.flush_interval if not buffer else max(0.0, deadline - time.monotonic())
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                row = None
+
+            if row is not None and row is not _STOP:
+                if not buffer:
+                    deadline = time.monotonic() + self.flush_interval
+                buffer.append(row)
+                # доберём уже накопившееся без ожидания
+                buffer.extend(self._drain_nowait(self.flush_rows - len(buffer)))
+
+            if buffer:
+                if len(buffer) >= self.flush_rows or time.monotonic() >= deadline or self._stopping.is_set():
+                    self._flush(buffer)
+                    buffer = []
+            elif not self._stopping.is_set() and time.monotonic() >= self._next_replay:
+                self._next_replay = time.monotonic() + SPILL_REPLAY_SECONDS
+                self._replay_spill()
+
+    def _write(self, rows: list[TimedPredictionRow]) -> None:
+        with self.session_factory() as db:
+            insert_prediction_records(db, rows, self.insert_method)
+            db.commit()
+
+    def _flush(self, rows: list[TimedPredictionRow]) -> None:
+        for attempt in range(self.flush_retries + 1):
+            start = time.perf_counter()
+            try:
+                self._write(rows)
+            except Exception as e:
+                logger.warning(f"PredictionWriter flush of {len(rows)} rows failed (attempt {attempt + 1}): {e}")
+                with self._lock:
+                    self._errors += 1
+                if attempt < self.flush_retries:
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+                continue
+
+            elapsed = time.perf_counter() - start
+            FLUSH_SECONDS.observe(elapsed)
+            with self._lock:
+                self._written += len(rows)
+                self._flushes += 1
+                self._last_flush_ms = elapsed * 1000
+            return
+
+        self._overflow(rows, reason="flush failed")
+
+    # ---------------- overflow / spill ----------------
+
+    def _overflow(self, rows: list[TimedPredictionRow], reason: str | None = None) -> None:
+        if self.overflow_policy == "spill" and self._spill(rows):
+            if reason:
+                logger.warning(f"PredictionWriter: {len(rows)} rows spilled to {self._spill_path} ({reason})")
+            return
+
+        with self._lock:
+            self._dropped += len(rows)
+        if reason:
+            logger.error(f"PredictionWriter: {len(rows)} rows dropped ({reason})")
+
+    def _spill(self, rows: list[TimedPredictionRow], counted: bool = False) -> bool:
+        lines = "".join(
+            json.dumps([email, risk, decision, created_at.isoformat()]) + "\n"
+            for email, risk, decision, created_at in rows
+        )
+        try:
+            with self._spill_lock:
+                self.spill_dir.mkdir(parents=True, exist_ok=True)
+                with open(self._spill_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+        except OSError as e:
+            logger.error(f"PredictionWriter spill to {self._spill_path} failed: {e}")
+            return False
+
+        if not counted:
+            with self._lock:
+                self._spilled += len(rows)
+        return True
+
+    def _owner_alive(self, owner: str) -> bool | None:
+        """
+        Жив ли процесс-владелец файла. Проверить можно только в своём контейнере
+        (тот же hostname); для чужого — None, решает возраст файла.
+        Тот же hostname и тот же pid, но другой nonce — прошлый запуск контейнера.
+        """
+        if owner == self._owner:
+            return True
+        try:
+            host, pid, _ = owner.rsplit(".", 2)
+            pid = int(pid)
+        except ValueError:
+            return None   # имя старого формата (spill-<pid>)
+        if host != self._host:
+            return None
+        return pid != self._pid and _pid_alive(pid)
+
+    def _claimable(self, path: Path) -> bool:
+        """
+        Свои spill-файлы берутся всегда; чужие — если владелец мёртв или, для другого
+        контейнера, файл давно не дописывался. replay-файлы (дозаливка, прерванная
+        падением) — если владелец мёртв или давно не отмечался.
+        """
+        kind, owner = path.stem.split("-", 1)
+        if kind == "replay":
+            owner = owner.rsplit("-", 1)[0]
+        elif kind != "spill":
+            return False
+
+        alive = self._owner_alive(owner)
+        if alive is not None:
+            return (kind == "spill" and owner == self._owner) or not alive
+        stale = REPLAY_STALE_SECONDS if kind == "replay" else SPILL_REPLAY_SECONDS
+        return time.time() - path.stat().st_mtime >= stale
+
+    def _replay_spill(self) -> None:
+        """
+        Дозаливает spill-файлы в Postgres пачками по flush_rows.
+        Файл сначала переименовывается (атомарный захват между процессами).
+        """
+        if not self.spill_dir.is_dir():
+            return
+
+        for path in sorted(self.spill_dir.glob("*.jsonl")):
+            try:
+                if not self._claimable(path):
+                    continue
+                claimed = self.spill_dir / f"replay-{self._owner}-{next(self._seq)}.jsonl"
+                with self._spill_lock:
+                    path.rename(claimed)
+                os.utime(claimed)   # rename сохраняет mtime spill-файла
+            except (ValueError, OSError):
+                continue   # чужое имя или файл уже забрал другой процесс
+
+            with open(claimed, encoding="utf-8") as f:
+                rows = [
+                    (email, float(risk), decision, datetime.fromisoformat(created_at))
+                    for email, risk, decision, created_at in map(json.loads, filter(str.strip, f))
+                ]
+
+            done = 0
+            try:
+                for i in range(0, len(rows), self.flush_rows):
+                    self._write(rows[i:i + self.flush_rows])
+                    done = min(i + self.flush_rows, len(rows))
+                    os.utime(claimed)   # файл в работе — для процессов других контейнеров
+            except Exception as e:
+                logger.warning(f"PredictionWriter replay of {claimed.name} failed: {e}")
+                with self._lock:
+                    self._errors += 1
+                    self._replayed += done
+                # недозалитое — обратно в свой spill (уже посчитано как spilled)
+                if not self._spill(rows[done:], counted=True):
+                    with self._lock:
+                        self._dropped += len(rows) - done
+                claimed.unlink()
+                return
+
+            claimed.unlink()
+            with self._lock:
+                self._replayed += len(rows)
+            logger.info(f"PredictionWriter replayed {len(rows)} rows from {path.name}")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# ---------------- singleton ----------------
+
+_writer: PredictionWriter | None = None
+
+
+def get_prediction_writer() -> PredictionWriter | None:
+    return _writer
+
+
+def start_prediction_writer() -> PredictionWriter | None:
+    """
+    Запускает write-behind запись предсказаний, если она включена в настройках.
+    """
+    global _writer
+    settings = get_settings()
+    if not settings.PREDICTION_WRITE_BEHIND_ENABLED:
+        return None
+
+    from sqlmodel import Session
+
+    from app.database.database import engine
+
+    _writer = PredictionWriter(
+        session_factory=lambda: Session(engine),
+        max_queue=settings.PREDICTION_QUEUE_MAX_SIZE,
+        flush_rows=settings.PREDICTION_FLUSH_ROWS,
+        flush_interval_ms=settings.PREDICTION_FLUSH_INTERVAL_MS,
+        overflow_policy=settings.PREDICTION_OVERFLOW_POLICY,
+        block_timeout_ms=settings.PREDICTION_BLOCK_TIMEOUT_MS,
+        spill_dir=settings.PREDICTION_SPILL_DIR,
+        flush_retries=settings.PREDICTION_FLUSH_RETRIES,
+        insert_method=settings.PREDICTION_INSERT_METHOD,
+    )
+    _writer.start()
+    return _writer
+
+
+def stop_prediction_writer() -> None:
+    global _writer
+    if _writer is not None:
+        _writer.stop(timeout=get_settings().PREDICTION_SHUTDOWN_TIMEOUT)
+        _writer = None
+
+
+class _WriterCollector:
+    """
+    Очередь и исходы записи для /metrics (считывается при scrape).
+    """
+
+    def collect(self):
+        writer = _writer
+        if writer is None:
+            return
+        stats = writer.stats()
+
+        yield GaugeMetricFamily(
+            "antifraud_prediction_queue_size", "Predictions waiting for write-behind flush", value=stats["queue_size"],
+        )
+        records = CounterMetricFamily(
+            "antifraud_prediction_records", "Write-behind predictions by outcome", labels=["outcome"],
+        )
+        for outcome in ("written", "spilled", "dropped", "replayed"):
+            records.add_metric([outcome], stats[outcome])
+        yield records
+        yield CounterMetricFamily(
+            "antifraud_prediction_flush_errors", "Failed write-behind flush attempts", value=stats["errors"],
+        )
+
+
+REGISTRY.register(_WriterCollector())
@@ -0,0 +1,67 @@
+# app/services/realtime_executor.py
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from app.core.config import get_settings
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+# Async-эндпоинты realtime-воркера не занимают поток threadpool Starlette (≈40 на процесс)
+# на всё время запроса: запрос ждёт на event loop (asyncio.Future), а блокирующие
+# вызовы — пул ClickHouse + пайплайн, синхронный commit — уходят в отдельный пул
+# потоков явного размера. Его размер ограничивает одновременные блокирующие вызовы,
+# а не число запросов в полёте.
+
+# потоки сверх CLICK_POOL_SIZE — для синхронной записи в Postgres
+_DB_THREADS = 4
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _default_workers() -> int:
+    from app.services.clickhouse_client import get_ch_settings
+
+    # больше потоков, чем клиентов в пуле, ждали бы свободного клиента
+    return get_ch_settings().CLICK_POOL_SIZE + _DB_THREADS
+
+
+def start_realtime_executor(workers: int | None = None) -> ThreadPoolExecutor:
+    """
+    Создаёт пул потоков realtime-воркера (lifespan).
+    workers — явно; иначе REALTIME_EXECUTOR_WORKERS, 0 — CLICK_POOL_SIZE + 4.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = workers or get_settings().REALTIME_EXECUTOR_WORKERS or _default_workers()
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="realtime-io")
+            logger.info(f"Realtime executor started: workers={workers}")
+    return _executor
+
+
+def get_realtime_executor() -> ThreadPoolExecutor:
+    """
+    Пул процесса; если lifespan не запускался — создаётся лениво.
+    """
+    return _executor or start_realtime_executor()
+
+
+def stop_realtime_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+async def run_blocking(fn: Callable, *args, **kwargs):
+    """
+    await run_blocking(fn, ...) — блокирующий вызов в пуле realtime без блокировки event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_realtime_executor(), functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,120 @@
+# app/services/singleflight.py
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Hashable
+
+from prometheus_client import Counter
+
+from app.core.config import get_settings
+
+COALESCED_TOTAL = Counter(
+    "antifraud_singleflight_coalesced_total", "Requests served by another in-flight execution",
+    ("name",),
+)
+
+
+class SingleFlight:
+    """
+    Single-flight: одновременные вызовы с одним ключом разделяют одно выполнение.
+
+    Первый вызов (лидер) выполняет функцию. Остальные, пришедшие до её завершения,
+    ждут тот же concurrent.futures.Future и получают тот же результат или исключение.
+    Future общий для потоков и event loop, поэтому синхронные (do) и async (do_async)
+    вызовы объединяются между собой. Результат не кэшируется: ключ освобождается,
+    как только выполнение завершилось, следующий вызов выполняет функцию заново.
+    """
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._flights: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._coalesced_metric = COALESCED_TOTAL.labels(name)
+
+        # метрики
+        self._executions = 0
+        self._coalesced = 0
+
+    def _join(self, key: Hashable) -> tuple[Future, bool]:
+        with self._lock:
+            future = self._flights.get(key)
+            if future is None:
+                future = self._flights[key] = Future()
+                self._executions += 1
+                return future, True
+            self._coalesced += 1
+        self._coalesced_metric.inc()
+        return future, False
+
+    def _land(self, key: Hashable, future: Future, result=None, error: BaseException | None = None) -> None:
+        # ключ освобождается до публикации результата: пришедший позже начнёт новое выполнение
+        with self._lock:
+            self._flights.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable):
+        """
+        Синхронный вызов (def-эндпоинты, потоки). Не вызывать из event loop:
+        ожидание блокирует поток.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._land(key, future, error=e)
+            raise
+        self._land(key, future, result)
+        return result
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """
+        Async-вызов: fn() -> awaitable. Выполнение идёт отдельной задачей,
+        поэтому отмена запроса-лидера не отменяет его для остальных.
+        """
+        future, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._land_task(key, future, t))
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _land_task(self, key: Hashable, future: Future, task: asyncio.Task) -> None:
+        if task.cancelled():
+            self._land(key, future, error=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self._land(key, future, error=task.exception())
+        else:
+            self._land(key, future, task.result())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "executions": self._executions,
+                "coalesced": self._coalesced,
+            }
+
+
+# ---------------- singleton ----------------
+
+_flight: SingleFlight | None = None
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight | None:
+    """
+    Single-flight realtime-скоринга или None, если он выключен в настройках.
+    """
+    global _flight, _initialized
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                if get_settings().REALTIME_SINGLEFLIGHT_ENABLED:
+                    _flight = SingleFlight("realtime")
+                _initialized = True
+    return _flight
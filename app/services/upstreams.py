@@ -0,0 +1,164 @@
+# app/services/upstreams.py
+import itertools
+import time
+from dataclasses import dataclass
+
+import httpx
+from fastapi import FastAPI, Request
+
+from app.core.config import get_settings
+from app.services.logging.logging import get_logger
+
+logger = get_logger(logger_name=__name__)
+
+
+@dataclass
+class Upstream:
+    url: str
+    outstanding: int = 0
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    requests: int = 0
+    failures: int = 0
+
+    def is_available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+
+class UpstreamPool:
+    """
+    Балансировка запросов gateway между репликами realtime-воркера.
+
+    - strategy: least_outstanding (меньше всего запросов в полёте) или round_robin
+    - пассивный health-tracking: после max_failures подряд (ошибка соединения
+      или 5xx) реплика исключается на eject_seconds
+    - повтор в другой реплике — только если соединение не установлено (ConnectError /
+      ConnectTimeout): запрос, дошедший до реплики, уже мог сохранить предсказание
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        strategy: str = "least_outstanding",
+        max_failures: int = 3,
+        eject_seconds: float = 10.0,
+    ):
+        if not urls:
+            raise ValueError("UpstreamPool requires at least one upstream URL")
+        if strategy not in ("least_outstanding", "round_robin"):
+            raise ValueError(f"Unknown balancing strategy: {strategy}")
+
+        self.upstreams = [Upstream(url=u.rstrip("/")) for u in urls]
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.retried = 0
+
+        self._rr = itertools.count()
+
+    # ---------------- selection ----------------
+
+    def _candidates(self, exclude: tuple = ()) -> list[Upstream]:
+        now = time.monotonic()
+        candidates = [u for u in self.upstreams if u not in exclude]
+        healthy = [u for u in candidates if u.is_available(now)]
+        # если выброшены все — fail-open: пробуем хоть кого-то
+        return healthy or candidates
+
+    def pick(self, exclude: tuple = ()) -> Upstream | None:
+        candidates = self._candidates(exclude)
+        if not candidates:
+            return None
+        if self.strategy == "round_robin":
+            return candidates[next(self._rr) % len(candidates)]
+        return min(candidates, key=lambda u: u.outstanding)
+
+    # ---------------- health ----------------
+
+    def _record(self, upstream: Upstream, ok: bool) -> None:
+        upstream.requests += 1
+        if ok:
+            upstream.consecutive_failures = 0
+            return
+
+        upstream.failures += 1
+        upstream.consecutive_failures += 1
+        if upstream.consecutive_failures >= self.max_failures:
+            upstream.ejected_until = time.monotonic() + self.eject_seconds
+            upstream.consecutive_failures = 0
+            logger.warning(f"Upstream {upstream.url} ejected for {self.eject_seconds}s")
+
+    # ---------------- requests ----------------
+
+    async def _send(self, client: httpx.AsyncClient, upstream: Upstream, method: str, path: str, **kwargs) -> httpx.Response:
+        upstream.outstanding += 1
+        try:
+            r = await client.request(method, f"{upstream.url}{path}", **kwargs)
+        except httpx.TransportError:
+            self._record(upstream, ok=False)
+            raise
+        finally:
+            upstream.outstanding -= 1
+
+        self._record(upstream, ok=r.status_code < 500)
+        return r
+
+    async def request(self, client: httpx.AsyncClient, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Отправляет запрос в одну из реплик. Если соединение не установлено,
+        один раз повторяет его в другой реплике; таймаут чтения и обрыв ответа
+        не повторяются — реплика могла уже записать предсказание.
+        """
+        primary = self.pick()
+        try:
+            return await self._send(client, primary, method, path, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            fallback = self.pick(exclude=(primary,))
+            if fallback is None:
+                raise
+            self.retried += 1
+            return await self._send(client, fallback, method, path, **kwargs)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "strategy": self.strategy,
+            "retried": self.retried,
+            "upstreams": [
+                {
+                    "url": u.url,
+                    "available": u.is_available(now),
+                    "outstanding": u.outstanding,
+                    "requests": u.requests,
+                    "failures": u.failures,
+                }
+                for u in self.upstreams
+            ],
+        }
+
+
+# ---------------- gateway wiring ----------------
+
+def create_realtime_upstreams() -> UpstreamPool:
+    settings = get_settings()
+    urls = [u.strip() for u in settings.GATEWAY_REALTIME_URLS.split(",") if u.strip()]
+    return UpstreamPool(
+        urls=urls or [settings.GATEWAY_REALTIME_URL],
+        strategy=settings.GATEWAY_BALANCING,
+        max_failures=settings.GATEWAY_MAX_FAILURES,
+        eject_seconds=settings.GATEWAY_EJECT_SECONDS,
+    )
+
+
+async def init_realtime_upstreams(app: FastAPI) -> None:
+    app.state.realtime_upstreams = create_realtime_upstreams()
+
+
+def get_realtime_upstreams(request: Request) -> UpstreamPool:
+    """
+    FastAPI dependency (создаётся в lifespan, иначе — лениво).
+    """
+    pool = getattr(request.app.state, "realtime_upstreams", None)
+    if pool is None:
+        pool = request.app.state.realtime_upstreams = create_realtime_upstreams()
+    return pool
@@ -0,0 +1,151 @@
+# app/tests/bench_async_realtime.py
+# Нагрузочный тест realtime-эндпоинта: прежний def-эндпоинт (поток threadpool Starlette на весь
+# запрос, ≈40 на процесс) против async fraud_predict_user при 50 / 500 / 5000 одновременных клиентах.
+# Без ClickHouse — заглушка клиента: запрос стоит BENCH_LATENCY_MS + BENCH_PER_USER_MS на пользователя,
+# клиентов в пуле — BENCH_POOL_SIZE. Запросы идут в приложение через ASGI-транспорт httpx (без сокетов),
+# предсказания пишутся write-behind очередью во временный SQLite.
+#   PYTHONPATH=. python app/tests/bench_async_realtime.py
+# BENCH_MICROBATCH=0 — без micro-batching: оба эндпоинта упираются в пул (size / latency запросов в секунду).
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+os.environ.setdefault("WORKER_MODE", "realtime")
+os.environ.setdefault("TESTING", "1")
+for _name, _value in (("CLICK_HOST", "stand-in"), ("CLICK_USER", "bench"), ("CLICK_PASSWORD", "")):
+    os.environ.setdefault(_name, _value)
+
+import httpx
+from fastapi import FastAPI
+from sqlmodel import SQLModel, Session, create_engine
+
+import app.routes.fraud as fraud
+import app.services.clickhouse_client as clickhouse_client
+import app.services.microbatch as microbatch
+import app.services.prediction_writer as prediction_writer
+from app.core.config import get_settings
+from app.ml.model import load_model
+from app.ml.pipeline import run_multi_user_pipeline
+from app.schemas.response import PredictResponse
+from app.services.clickhouse_client import ClickHousePool
+from app.services.microbatch import MicroBatcher
+from app.services.prediction_writer import PredictionWriter
+from app.services.realtime_executor import start_realtime_executor, stop_realtime_executor
+from app.tests.test_pipeline import COLUMNS, ROWS
+
+CLIENTS = [int(c) for c in os.getenv("BENCH_CLIENTS", "50,500,5000").split(",")]
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "5000"))
+LATENCY = float(os.getenv("BENCH_LATENCY_MS", "20")) / 1000
+PER_USER = float(os.getenv("BENCH_PER_USER_MS", "0.05")) / 1000
+POOL_SIZE = int(os.getenv("BENCH_POOL_SIZE", "8"))
+MICROBATCH = os.getenv("BENCH_MICROBATCH", "1") == "1"
+
+logging.getLogger("httpx").setLevel(logging.WARNING)   # строка лога на запрос клиента
+
+
+class _Result:
+    def __init__(self, rows):
+        self.result_rows = rows
+        self.column_names = COLUMNS
+
+
+class StandInClient:
+    """
+    Заглушка клиента ClickHouse: ожидание ответа без CPU (как сетевой запрос).
+    """
+
+    def query(self, query, parameters=None, settings=None):
+        emails = parameters.get("emails") or [parameters["email"]]
+        time.sleep(LATENCY + PER_USER * len(emails))
+        return _Result([(email,) + ROWS[0][1:] for email in emails])
+
+    def ping(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def legacy_predict_user(user_email: str):
+    """
+    Прежний эндпоинт: def — весь запрос занимает поток threadpool Starlette.
+    """
+    batcher = microbatch.get_microbatcher()
+    result = batcher.score(user_email) if batcher is not None else fraud._score_user(user_email)
+    prediction_writer.get_prediction_writer().submit(result["user_email"], result["risk_score"], result["decision"])
+    return PredictResponse(**result)
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(fraud.fraud_route, prefix="/internal/fraud")
+    app.add_api_route("/legacy/predict/user/{user_email}", legacy_predict_user, response_model=PredictResponse)
+    return app
+
+
+async def load(app: FastAPI, path: str, clients: int, total: int) -> tuple[float, list[float]]:
+    transport = httpx.ASGITransport(app=app)
+    latencies: list[float] = []
+    counter = iter(range(total))
+
+    async def client_loop(http: httpx.AsyncClient):
+        for i in counter:
+            start = time.perf_counter()
+            response = await http.get(f"{path}/user{i}@example.com")
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(http) for _ in range(clients)))
+        return time.perf_counter() - start, sorted(latencies)
+
+
+def main() -> None:
+    load_model()
+    clickhouse_client._pool = ClickHousePool(factory=StandInClient, size=POOL_SIZE, acquire_timeout=600)
+    start_realtime_executor()
+    if MICROBATCH:
+        settings = get_settings()
+        microbatch._batcher = MicroBatcher(
+            score_fn=run_multi_user_pipeline,
+            connection_factory=clickhouse_client._pool.connection,
+            max_batch_size=settings.REALTIME_MICROBATCH_MAX_SIZE,
+            max_wait_ms=settings.REALTIME_MICROBATCH_MAX_WAIT_MS,
+            workers=settings.REALTIME_MICROBATCH_WORKERS,
+        )
+        microbatch._batcher.start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        SQLModel.metadata.create_all(engine)
+        writer = PredictionWriter(session_factory=lambda: Session(engine), spill_dir=f"{tmp}/spill")
+        prediction_writer._writer = writer
+        writer.start()
+
+        app = make_app()
+        print(
+            f"=== REALTIME LOAD TEST: {REQUESTS:,}+ requests per run, ClickHouse stand-in "
+            f"{LATENCY * 1000:.0f} ms + {PER_USER * 1000:.2f} ms/user, pool {POOL_SIZE}, "
+            f"microbatch {'on' if MICROBATCH else 'off'} ==="
+        )
+        for clients in CLIENTS:
+            total = max(REQUESTS, 2 * clients)
+            for name, path in (("sync def (threadpool)", "/legacy/predict/user"), ("async", "/internal/fraud/predict/user")):
+                elapsed, latencies = asyncio.run(load(app, path, clients, total))
+                p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+                print(
+                    f"{clients:>5} clients  {name:<22} {total / elapsed:8.0f} req/s   "
+                    f"p50 {p(0.5):8.1f} ms   p99 {p(0.99):8.1f} ms"
+                )
+
+        writer.stop()
+    if MICROBATCH:
+        microbatch.stop_microbatcher()
+    stop_realtime_executor()
+
+
+if __name__ == "__main__":
+    main()
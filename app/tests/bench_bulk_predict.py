@@ -0,0 +1,81 @@
+# app/tests/bench_bulk_predict.py
+# Проверка корзины из BENCH_BASKET аккаунтов: N запросов GET /predict/user (по очереди и все сразу)
+# против одного POST /predict/users. ClickHouse — заглушка из bench_async_realtime
+# (BENCH_LATENCY_MS + BENCH_PER_USER_MS на пользователя, BENCH_POOL_SIZE), без micro-batching и single-flight.
+# Сеть gateway → realtime не моделируется: в проде каждый одиночный запрос добавляет ещё и её.
+#   PYTHONPATH=. python app/tests/bench_bulk_predict.py
+from app.tests.bench_async_realtime import LATENCY, PER_USER, POOL_SIZE, StandInClient  # noqa: I001 — задаёт окружение
+
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+
+import app.routes.fraud as fraud
+import app.services.clickhouse_client as clickhouse_client
+import app.services.prediction_writer as prediction_writer
+from app.ml.model import load_model
+from app.schemas.request import PredictUsersRequest
+from app.services.clickhouse_client import ClickHousePool
+from app.services.prediction_writer import PredictionWriter
+from app.services.realtime_executor import start_realtime_executor, stop_realtime_executor
+
+BASKETS = [int(b) for b in os.getenv("BENCH_BASKET", "10,100,1000").split(",")]
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "5"))
+
+queries = itertools.count()
+
+
+class CountingClient(StandInClient):
+    def query(self, query, parameters=None, settings=None):
+        next(queries)
+        return super().query(query, parameters, settings)
+
+
+async def sequential(emails):
+    for email in emails:
+        await fraud.fraud_predict_user(email)
+
+
+async def concurrent(emails):
+    await asyncio.gather(*(fraud.fraud_predict_user(e) for e in emails))
+
+
+async def bulk(emails):
+    await fraud.fraud_predict_users(PredictUsersRequest(user_emails=emails))
+
+
+def main() -> None:
+    global queries
+    load_model()
+    clickhouse_client._pool = ClickHousePool(factory=CountingClient, size=POOL_SIZE, acquire_timeout=600)
+    start_realtime_executor()
+    fraud.get_single_flight = lambda: None
+    fraud.get_microbatcher = lambda: None
+
+    print(
+        f"=== BULK SCORING: basket of N emails, {ROUNDS} rounds, ClickHouse stand-in "
+        f"{LATENCY * 1000:.0f} ms + {PER_USER * 1000:.2f} ms/user, pool {POOL_SIZE} ==="
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        prediction_writer._writer = PredictionWriter(session_factory=None, spill_dir=tmp, overflow_policy="drop",
+                                                     max_queue=max(BASKETS) * ROUNDS * 3)
+        for basket in BASKETS:
+            emails = [f"basket{i}@example.com" for i in range(basket)]
+            for name, scenario in (("N x GET, sequential", sequential), ("N x GET, concurrent", concurrent),
+                                   ("1 x POST /predict/users", bulk)):
+                queries = itertools.count()
+                start = time.perf_counter()
+                for _ in range(ROUNDS):
+                    asyncio.run(scenario(emails))
+                elapsed = (time.perf_counter() - start) / ROUNDS
+                print(
+                    f"N={basket:>5}  {name:<24} {elapsed * 1000:9.1f} ms/basket   "
+                    f"ClickHouse queries {next(queries) // ROUNDS:5,}"
+                )
+    stop_realtime_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# app/tests/bench_columnar_fetch.py
+# Сравнение строкового (result_rows → DataFrame) и колоночного пути выгрузки batch.
+# Без ClickHouse эмулирует оба формата результата на синтетических данных:
+#   PYTHONPATH=. python app/tests/bench_columnar_fetch.py
+# С реальным ClickHouse (.env) — сравнивает fetch_user_features_batch(columnar=...):
+#   BENCH_CLICKHOUSE=1 PYTHONPATH=. python app/tests/bench_columnar_fetch.py
+import os
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app.ml.fe import apply_feature_engineering
+from app.ml.fetch import fetch_user_features_batch, to_signed_counts
+from app.tests.test_pipeline import COLUMNS, ROWS
+
+SIZES = [10_000, 100_000, 500_000]
+
+
+def make_columns(n: int, rng) -> dict[str, np.ndarray]:
+    """
+    Колонки в типах, которые отдаёт query_df: UInt64, Float64, datetime64, object.
+    """
+    columns = {}
+    for col, value in zip(COLUMNS, ROWS[0]):
+        if isinstance(value, str):
+            columns[col] = np.array([f"{col}_{i % 50}" for i in range(n)], dtype=object)
+        elif isinstance(value, date):
+            columns[col] = np.datetime64("2024-01-01") + rng.integers(0, 365, n).astype("timedelta64[D]")
+        elif isinstance(value, int):
+            columns[col] = rng.integers(0, 100, n).astype(np.uint64)
+        else:
+            columns[col] = rng.random(n) * 100
+    return columns
+
+
+def as_rows(columns: dict[str, np.ndarray]) -> list[tuple]:
+    """
+    То, что отдаёт result_rows: список кортежей Python-объектов.
+    """
+    epoch = date(1970, 1, 1)
+    values = []
+    for col, arr in columns.items():
+        if arr.dtype.kind == "M":
+            days = arr.astype("datetime64[D]").astype(np.int64)
+            values.append([epoch + timedelta(days=int(d)) for d in days])
+        else:
+            values.append(arr.tolist())
+    return list(zip(*values))
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def bench_synthetic():
+    rng = np.random.default_rng(42)
+    for n in SIZES:
+        columns = make_columns(n, rng)
+        rows = as_rows(columns)
+
+        legacy, legacy_t, legacy_mb = measure(
+            lambda: apply_feature_engineering(pd.DataFrame(rows, columns=list(COLUMNS)))
+        )
+        columnar, columnar_t, columnar_mb = measure(
+            lambda: apply_feature_engineering(to_signed_counts(pd.DataFrame(columns)))
+        )
+
+        assert np.allclose(
+            legacy["pressure_score"].astype(float), columnar["pressure_score"].astype(float)
+        ), "❌ FE differs"
+
+        print(
+            f"rows={n:>8,}  tuples→FE={legacy_t * 1000:9.1f} ms ({legacy_mb:7.1f} MB)  "
+            f"columnar→FE={columnar_t * 1000:8.1f} ms ({columnar_mb:7.1f} MB)  "
+            f"speedup=x{legacy_t / max(columnar_t, 1e-9):.1f}"
+        )
+
+
+def bench_clickhouse():
+    from app.services.clickhouse_client import create_clickhouse_client
+
+    client = create_clickhouse_client("batch")
+    for columnar in (False, True):
+        df, elapsed, peak = measure(lambda: apply_feature_engineering(
+            fetch_user_features_batch(client, columnar=columnar)
+        ))
+        mode = "columnar" if columnar else "tuples"
+        print(f"{mode:>8}: rows={len(df):,}  {elapsed:.2f} s  peak={peak:.1f} MB")
+
+
+print("=== COLUMNAR FETCH BENCHMARK ===")
+if os.getenv("BENCH_CLICKHOUSE") == "1":
+    bench_clickhouse()
+else:
+    bench_synthetic()
@@ -0,0 +1,78 @@
+# app/tests/bench_decisions.py
+# Назначение решений для batch: построчный apply (как было) против векторного DecisionPolicy.
+#   PYTHONPATH=. python app/tests/bench_decisions.py
+# BENCH_ROWS — число скоров (по умолчанию 1000000). Старый путь (Settings() на каждую строку)
+# меряется на BENCH_LEGACY_ROWS строк и пересчитывается на BENCH_ROWS.
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import Settings
+from app.core.decision import (
+    Decision,
+    DecisionPolicy,
+    ThresholdTable,
+    decision_labels,
+    load_decision_policy,
+    make_decision,
+)
+
+ROWS = int(os.getenv("BENCH_ROWS", "1000000"))
+LEGACY_ROWS = int(os.getenv("BENCH_LEGACY_ROWS", "20000"))
+
+
+def legacy_decision(risk_score: float) -> Decision:
+    """
+    make_decision до кэширования настроек: pydantic-settings читает окружение на каждый вызов.
+    """
+    settings = Settings()
+    if risk_score >= settings.FRAUD_BLOCK_THRESHOLD:
+        return Decision.BLOCK
+    if risk_score >= settings.FRAUD_REVIEW_THRESHOLD:
+        return Decision.REVIEW
+    return Decision.ALLOW
+
+
+def measure(fn) -> tuple[object, float]:
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    rng = np.random.default_rng(42)
+    scores = pd.Series(rng.random(ROWS))
+    channels = rng.choice(np.array(["direct", "ppc", "seo"], dtype=object), ROWS)
+
+    policy = load_decision_policy()
+    segmented = DecisionPolicy(
+        default=policy.default,
+        segment_column="channel",
+        segments={
+            "seo": ThresholdTable([(0.1, Decision.REVIEW), (0.5, Decision.REVIEW), (0.8, Decision.BLOCK)]),
+            "ppc": ThresholdTable([(0.2, Decision.REVIEW), (0.6, Decision.BLOCK)]),
+        },
+    )
+
+    _, legacy = measure(lambda: scores.iloc[:LEGACY_ROWS].apply(lambda r: legacy_decision(r).value))
+    legacy *= ROWS / LEGACY_ROWS
+    cached, cached_t = measure(lambda: scores.apply(lambda r: make_decision(r).value))
+    vector, vector_t = measure(lambda: decision_labels(policy.decide(scores.to_numpy())))
+    _, segmented_t = measure(lambda: decision_labels(segmented.decide(scores.to_numpy(), channels)))
+
+    assert vector.tolist() == cached.tolist(), "❌ vectorized decisions differ"
+
+    print(f"=== DECISION BENCHMARK: {ROWS:,} scores ===")
+    for name, elapsed in (
+        ("apply + Settings() per row (legacy)", legacy),
+        ("apply + cached thresholds", cached_t),
+        ("searchsorted, 3 zones", vector_t),
+        ("searchsorted, tables by channel", segmented_t),
+    ):
+        print(f"{name:>36}: {elapsed * 1000:10.1f} ms  ({elapsed / ROWS * 1e9:8.1f} ns/row)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# app/tests/bench_metrics.py
+# Стоимость метрик на горячем пути: observe, таймер стадии, счётчик решений, scrape,
+# в сравнении с realtime-скорингом одной строки (FE + preprocess + predict + decision).
+#   PYTHONPATH=. python app/tests/bench_metrics.py
+import time
+
+from app.core.metrics import PIPELINE_STAGE_SECONDS, count_decisions, render, stage_timer
+from app.ml.model import load_model
+from app.ml.pipeline import _score, build_realtime_features
+from app.tests.test_pipeline import COLUMNS, ROWS
+
+N = 200_000
+
+
+def per_call(fn, n: int = N) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def timed_block():
+    with stage_timer("bench", "stage"):
+        pass
+
+
+def main() -> None:
+    series = PIPELINE_STAGE_SECONDS.labels("bench", "observe")
+    observe = per_call(lambda: series.observe(0.003))
+    timer = per_call(timed_block)
+    decisions = per_call(lambda: count_decisions("bench", [("ALLOW", 1)]))
+
+    model = load_model()
+    row = ROWS[0]
+    request = per_call(lambda: _score(build_realtime_features(COLUMNS, row, model), model, "bench"), 2_000)
+    # на realtime-запрос: ~7 таймеров стадий + in-flight gauge + счётчик решений
+    overhead = 7 * timer + 2 * observe + decisions
+
+    start = time.perf_counter()
+    text = render().decode()
+    scrape = time.perf_counter() - start
+
+    print("=== METRICS OVERHEAD BENCHMARK ===")
+    print(f"histogram.observe:        {observe * 1e9:8.0f} ns")
+    print(f"stage_timer (labels+with): {timer * 1e9:7.0f} ns")
+    print(f"count_decisions:          {decisions * 1e9:8.0f} ns")
+    print(f"realtime score (1 row):   {request * 1e6:8.1f} us, metrics ≈ {overhead * 1e6:.1f} us "
+          f"({overhead / request:.2%})")
+    print(f"scrape /metrics:          {scrape * 1e3:8.2f} ms ({len(text.splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# app/tests/bench_native_model.py
+# Латентность predict: AutoML.predict_proba (pickle FLAML) против родного бустера
+# (app/ml/native_model.py) на батчах 1, 64 и 100k строк:
+#   PYTHONPATH=. python app/tests/bench_native_model.py
+# Число потоков родного бустера — MODEL_NUM_THREADS (0 — по умолчанию библиотеки).
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.ml.native_model import export_native_model, load_native_model
+from app.ml.model import MODEL_PATH
+
+SIZES = [1, 64, 100_000]
+NUM_THREADS = int(os.getenv("MODEL_NUM_THREADS", "0"))
+
+
+def timeit(fn, repeat: int) -> tuple[float, float]:
+    """
+    Медиана и p99 одного вызова, мс.
+    """
+    fn()  # прогрев
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times)), float(np.percentile(times, 99))
+
+
+def main() -> None:
+    with open(MODEL_PATH, "rb") as f:
+        payload = pickle.load(f)
+    automl = payload["automl"]
+    features = payload["features"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        export_native_model(payload, directory)
+        native = load_native_model(directory, num_threads=NUM_THREADS)
+
+        rng = np.random.default_rng(0)
+        print(f"estimator: {automl.best_estimator}, features: {len(features)}, threads: {NUM_THREADS or 'default'}")
+        print(f"{'rows':>8} | {'automl p50':>11} | {'automl p99':>11} | {'native p50':>11} | {'native p99':>11} | speedup")
+
+        for n in SIZES:
+            X = pd.DataFrame(rng.integers(0, 10, size=(n, len(features))).astype(np.float64), columns=features)
+            repeat = 200 if n < 1000 else 5
+
+            expected = automl.predict_proba(X)[:, 1]
+            assert np.allclose(native.predict(X), expected, rtol=0, atol=1e-9)
+
+            a50, a99 = timeit(lambda: automl.predict_proba(X)[:, 1], repeat)
+            n50, n99 = timeit(lambda: native.predict(X), repeat)
+            print(f"{n:>8} | {a50:>9.3f}ms | {a99:>9.3f}ms | {n50:>9.3f}ms | {n99:>9.3f}ms | {a50 / n50:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# app/tests/bench_parallel_scoring.py
+# Масштабирование скоринга batch-чанка (FE + preprocess + predict) по процессам:
+# один процесс против ParallelScorer (app/ml/parallel.py) с 1..N процессами.
+#   PYTHONPATH=. python app/tests/bench_parallel_scoring.py
+# BENCH_ROWS — размер чанка (по умолчанию 500000), BENCH_SHARD_ROWS — минимальный размер шарда,
+# BENCH_MAX_WORKERS — верхняя граница процессов (по умолчанию os.cpu_count()).
+import os
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from app.ml.fe import apply_feature_engineering
+from app.ml.fetch import to_signed_counts
+from app.ml.model import load_model
+from app.ml.parallel import ParallelScorer
+from app.ml.preprocess import preprocess_for_model
+
+ROWS = int(os.getenv("BENCH_ROWS", "500000"))
+SHARD_ROWS = int(os.getenv("BENCH_SHARD_ROWS", "10000"))
+MAX_WORKERS = int(os.getenv("BENCH_MAX_WORKERS", str(os.cpu_count() or 1)))
+START_METHOD = os.getenv("BENCH_START_METHOD", "spawn")
+
+
+def make_frame(n: int, rng) -> pd.DataFrame:
+    """
+    Чанк в типах query_df (как bench_columnar_fetch, но без запуска его замеров
+    в процессах пула: spawn импортирует __main__ заново).
+    """
+    # test_pipeline загружает модель при импорте — не тянем его в процессы пула
+    from app.tests.test_pipeline import COLUMNS, ROWS as SAMPLE_ROWS
+
+    columns = {}
+    for col, value in zip(COLUMNS, SAMPLE_ROWS[0]):
+        if isinstance(value, str):
+            columns[col] = np.array([f"{col}_{i % 50}" for i in range(n)], dtype=object)
+        elif isinstance(value, date):
+            columns[col] = np.datetime64("2024-01-01") + rng.integers(0, 365, n).astype("timedelta64[D]")
+        elif isinstance(value, int):
+            columns[col] = rng.integers(0, 100, n).astype(np.uint64)
+        else:
+            columns[col] = rng.random(n) * 100
+    return to_signed_counts(pd.DataFrame(columns))
+
+
+def worker_counts(limit: int) -> list[int]:
+    counts, n = [], 1
+    while n < limit:
+        counts.append(n)
+        n *= 2
+    return counts + [limit]
+
+
+def main() -> None:
+    model = load_model()
+    df = make_frame(ROWS, np.random.default_rng(42))
+
+    start = time.perf_counter()
+    expected = model.predict(preprocess_for_model(apply_feature_engineering(df), model=model))
+    single = time.perf_counter() - start
+
+    print(f"=== PARALLEL SCORING BENCHMARK: rows={ROWS:,}, shard={SHARD_ROWS:,}, cores={os.cpu_count()} ===")
+    print(f"{'processes':>9} | {'time':>9} | {'rows/s':>11} | speedup")
+    print(f"{'in-proc':>9} | {single:>8.2f}s | {ROWS / single:>11,.0f} | x1.0")
+
+    for workers in worker_counts(MAX_WORKERS):
+        scorer = ParallelScorer(workers=workers, shard_rows=SHARD_ROWS, start_method=START_METHOD)
+        try:
+            scorer.score(df.iloc[: SHARD_ROWS * workers * 2], model)   # старт пула и прогрев процессов
+            start = time.perf_counter()
+            risks, _ = scorer.score(df, model)
+            elapsed = time.perf_counter() - start
+        finally:
+            scorer.shutdown()
+
+        assert np.allclose(risks, expected), "❌ parallel scores differ"
+        print(f"{workers:>9} | {elapsed:>8.2f}s | {ROWS / elapsed:>11,.0f} | x{single / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
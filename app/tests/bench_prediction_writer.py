@@ -0,0 +1,86 @@
+# app/tests/bench_prediction_writer.py
+# Сохранение realtime-предсказания на пути ответа: store_prediction + commit (как было)
+# против PredictionWriter.submit (write-behind, commit пачками в фоне).
+#   PYTHONPATH=. python app/tests/bench_prediction_writer.py
+# BENCH_DATABASE_URL — своя БД (например, postgresql+psycopg://...); по умолчанию — файловый SQLite
+# с fsync на commit. BENCH_COMMIT_DELAY_MS — искусственная задержка commit (медленный Postgres).
+import os
+import tempfile
+import time
+
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine, delete
+
+from app.models.prediction import Prediction
+from app.routes.fraud import store_prediction
+from app.services.prediction_writer import PredictionWriter
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "2000"))
+COMMIT_DELAY = float(os.getenv("BENCH_COMMIT_DELAY_MS", "2")) / 1000
+
+
+def make_engine(tmp: str):
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tmp}/bench.db"
+    engine = create_engine(url)
+    SQLModel.metadata.create_all(engine)
+
+    if COMMIT_DELAY:
+        @event.listens_for(engine, "commit")
+        def slow_commit(conn):
+            time.sleep(COMMIT_DELAY)
+
+    return engine
+
+
+def percentiles(latencies: list[float]) -> str:
+    latencies = sorted(latencies)
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1e6
+    return f"p50 {p(0.5):9.1f} us  p99 {p(0.99):9.1f} us"
+
+
+def run_sync(engine) -> list[float]:
+    latencies = []
+    with Session(engine) as db:
+        for i in range(REQUESTS):
+            start = time.perf_counter()
+            store_prediction(db, f"user{i}@example.com", 0.42, "REVIEW")
+            db.commit()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_write_behind(engine, tmp: str) -> tuple[list[float], float, dict]:
+    writer = PredictionWriter(session_factory=lambda: Session(engine), spill_dir=f"{tmp}/spill")
+    writer.start()
+    latencies = []
+    for i in range(REQUESTS):
+        start = time.perf_counter()
+        writer.submit(f"user{i}@example.com", 0.42, "REVIEW")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    writer.stop()
+    return latencies, time.perf_counter() - start, writer.stats()
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(tmp)
+
+        sync = run_sync(engine)
+        with Session(engine) as db:
+            db.exec(delete(Prediction))
+            db.commit()
+        behind, drain, stats = run_write_behind(engine, tmp)
+
+        with Session(engine) as db:
+            stored = len(db.exec(Prediction.__table__.select()).all())
+
+    print(f"=== PREDICTION PERSIST BENCHMARK: {REQUESTS:,} requests, commit delay {COMMIT_DELAY * 1000:.1f} ms ===")
+    print(f"store + commit (sync):   {percentiles(sync)}  total {sum(sync):7.2f} s")
+    print(f"write-behind submit:     {percentiles(behind)}  total {sum(behind):7.2f} s")
+    print(f"write-behind drain on stop: {drain * 1000:.1f} ms, flushes {stats['flushes']}, stored {stored:,}")
+
+
+if __name__ == "__main__":
+    main()
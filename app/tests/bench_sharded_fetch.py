@@ -0,0 +1,91 @@
+# app/tests/bench_sharded_fetch.py
+# Пропускная способность batch-выгрузки в зависимости от числа шардов (BATCH_FETCH_SHARDS).
+# Без ClickHouse — локальная заглушка сервера: запрос стоит latency + строки / скорость
+# одного потока ответа, сервер обслуживает не больше BENCH_SERVER_SLOTS запросов сразу:
+#   PYTHONPATH=. python app/tests/bench_sharded_fetch.py
+# С реальным ClickHouse (.env) — те же шарды через пул клиентов batch-профиля:
+#   BENCH_CLICKHOUSE=1 PYTHONPATH=. python app/tests/bench_sharded_fetch.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from app.ml.fetch import stream_user_features_batch, stream_user_features_sharded
+
+ROWS = int(os.getenv("BENCH_ROWS", "2000000"))
+SHARDS = [1, 2, 4, 8, 16]
+PARALLEL = int(os.getenv("BENCH_PARALLEL", "8"))
+LATENCY = float(os.getenv("BENCH_LATENCY_SECONDS", "0.2"))
+STREAM_ROWS_PER_SEC = float(os.getenv("BENCH_STREAM_ROWS_PER_SEC", "1000000"))
+SERVER_SLOTS = int(os.getenv("BENCH_SERVER_SLOTS", "8"))
+
+
+class StandInServer:
+    """
+    Заглушка ClickHouse: время ответа растёт с числом строк шарда,
+    одновременно выполняется не больше slots запросов.
+    """
+
+    def __init__(self, rows: int, slots: int):
+        self.rows = rows
+        self._slots = threading.Semaphore(slots)
+
+    def _respond(self, n: int) -> pd.DataFrame:
+        with self._slots:
+            time.sleep(LATENCY + n / STREAM_ROWS_PER_SEC)
+        return pd.DataFrame({
+            "user_email": np.arange(n).astype(str).astype(object),
+            "n_sales": np.ones(n, dtype=np.uint64),
+        })
+
+    def query_df(self, query, parameters=None, use_extended_dtypes=None):
+        shards = parameters["shards"]
+        n = self.rows // shards + (parameters["shard"] < self.rows % shards)
+        return self._respond(n)
+
+    @contextmanager
+    def query_df_stream(self, query, parameters=None, settings=None, use_extended_dtypes=None):
+        block = settings["max_block_size"]
+        frame = self._respond(self.rows)
+        yield (frame.iloc[i: i + block].copy() for i in range(0, self.rows, block))
+
+
+def run(shards: int, connection_factory) -> tuple[int, float]:
+    start = time.perf_counter()
+    if shards == 1:
+        with connection_factory() as client:
+            rows = sum(len(df) for df in stream_user_features_batch(client))
+    else:
+        rows = sum(len(df) for df in stream_user_features_sharded(connection_factory, shards, parallel=PARALLEL))
+    return rows, time.perf_counter() - start
+
+
+def main() -> None:
+    if os.getenv("BENCH_CLICKHOUSE") == "1":
+        from app.services.clickhouse_client import init_clickhouse_pool
+
+        connection_factory = init_clickhouse_pool("batch").connection
+        source = "clickhouse"
+    else:
+        server = StandInServer(ROWS, SERVER_SLOTS)
+
+        @contextmanager
+        def connection_factory():
+            yield server
+
+        source = f"stand-in: rows={ROWS:,}, latency={LATENCY}s, stream={STREAM_ROWS_PER_SEC:,.0f} rows/s, slots={SERVER_SLOTS}"
+
+    print(f"=== SHARDED FETCH BENCHMARK ({source}, parallel={PARALLEL}) ===")
+    print(f"{'shards':>6} | {'rows':>10} | {'time':>8} | {'rows/s':>11} | speedup")
+    baseline = None
+    for shards in SHARDS:
+        rows, elapsed = run(shards, connection_factory)
+        baseline = baseline or elapsed
+        print(f"{shards:>6} | {rows:>10,} | {elapsed:>7.2f}s | {rows / elapsed:>11,.0f} | x{baseline / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# app/tests/bench_singleflight.py
+# Card testing: одни и те же email десятки раз подряд. Async realtime-эндпоинт без single-flight
+# (каждый запрос — своя агрегация в ClickHouse) против single-flight (одна на email в полёте).
+# ClickHouse — заглушка из bench_async_realtime (BENCH_LATENCY_MS, BENCH_POOL_SIZE), без micro-batching.
+#   PYTHONPATH=. python app/tests/bench_singleflight.py
+from app.tests.bench_async_realtime import LATENCY, POOL_SIZE, StandInClient  # noqa: I001 — задаёт окружение
+
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+
+import app.routes.fraud as fraud
+import app.services.clickhouse_client as clickhouse_client
+import app.services.prediction_writer as prediction_writer
+from app.ml.model import load_model
+from app.services.clickhouse_client import ClickHousePool
+from app.services.prediction_writer import PredictionWriter
+from app.services.realtime_executor import start_realtime_executor, stop_realtime_executor
+from app.services.singleflight import SingleFlight
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "2000"))
+HOT_USERS = int(os.getenv("BENCH_HOT_USERS", "20"))
+CLIENTS = int(os.getenv("BENCH_CLIENTS", "200"))
+
+queries = itertools.count()
+
+
+class CountingClient(StandInClient):
+    def query(self, query, parameters=None, settings=None):
+        next(queries)
+        return super().query(query, parameters, settings)
+
+
+async def attack(total: int) -> float:
+    emails = iter(f"victim{i % HOT_USERS}@example.com" for i in range(total))
+
+    async def client_loop():
+        for email in emails:
+            await fraud.fraud_predict_user(email)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(CLIENTS)))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    global queries
+    load_model()
+    clickhouse_client._pool = ClickHousePool(factory=CountingClient, size=POOL_SIZE, acquire_timeout=600)
+    start_realtime_executor()
+
+    print(
+        f"=== SINGLE-FLIGHT: {REQUESTS:,} requests over {HOT_USERS} emails, {CLIENTS} concurrent, "
+        f"ClickHouse stand-in {LATENCY * 1000:.0f} ms, pool {POOL_SIZE} ==="
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        prediction_writer._writer = PredictionWriter(session_factory=None, spill_dir=tmp, overflow_policy="drop",
+                                                     max_queue=REQUESTS * 2)
+        for name, flight in (("off", None), ("on", SingleFlight("bench"))):
+            fraud.get_single_flight = lambda flight=flight: flight
+            queries = itertools.count()
+            elapsed = asyncio.run(attack(REQUESTS))
+            print(
+                f"single-flight {name:>3}: {REQUESTS / elapsed:8.0f} req/s   "
+                f"ClickHouse queries {next(queries):6,}   {f'coalesced {flight.stats()}' if flight else ''}"
+            )
+    stop_realtime_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# app/tests/bench_startup.py
+# Время старта сервиса по WORKER_MODE в чистом процессе:
+#   import  — import app.api (роутеры режима и их зависимости)
+#   live    — lifespan отработал, /health/live отвечает
+#   ready   — /health/ready = 200 (для воркеров — модель и encoders загружены)
+#   PYTHONPATH=. python app/tests/bench_startup.py
+# ClickHouse не нужен: прогрев пула выключен (CLICK_POOL_WARMUP=false).
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODES = ["api", "realtime", "batch"]
+REPEAT = int(os.getenv("BENCH_REPEAT", "3"))
+HEAVY_MODULES = ("pandas", "flaml", "lightgbm", "xgboost", "catboost", "clickhouse_connect")
+
+_PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import app.api
+imported = time.perf_counter() - start
+
+from fastapi.testclient import TestClient
+with TestClient(app.api.app) as client:
+    assert client.get("/health/live").status_code == 200
+    live = time.perf_counter() - start
+    while client.get("/health/ready").status_code != 200:
+        time.sleep(0.005)
+    ready = time.perf_counter() - start
+    modules = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+
+print(json.dumps({{"import": imported, "live": live, "ready": ready, "modules": modules}}))
+"""
+
+
+def run_once(mode: str) -> dict:
+    env = {
+        **os.environ,
+        "WORKER_MODE": mode,
+        "TESTING": "1",
+        "CLICK_POOL_WARMUP": "false",
+        "CLICK_HOST": os.getenv("CLICK_HOST", "localhost"),
+        "CLICK_USER": os.getenv("CLICK_USER", "default"),
+        "CLICK_PASSWORD": os.getenv("CLICK_PASSWORD", ""),
+    }
+    out = subprocess.run([sys.executable, "-c", _PROBE], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    print(f"{'mode':>9} | {'import':>8} | {'live':>8} | {'ready':>8} | heavy modules")
+    for mode in MODES:
+        runs = [run_once(mode) for _ in range(REPEAT)]
+        median = {k: statistics.median(r[k] for r in runs) for k in ("import", "live", "ready")}
+        print(
+            f"{mode:>9} | {median['import']:>7.2f}s | {median['live']:>7.2f}s | {median['ready']:>7.2f}s | "
+            f"{', '.join(runs[-1]['modules']) or '—'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
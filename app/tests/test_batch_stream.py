@@ -0,0 +1,88 @@
+# app/tests/test_batch_stream.py
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session, select
+
+import app.routes.fraud as fraud
+from app.database.database import engine
+from app.models.prediction import Prediction
+
+
+def test_batch_route_streams_chunks_as_json_array(monkeypatch):
+    SQLModel.metadata.create_all(engine)
+    emitted = []
+
+    def pipeline(client, **kwargs):
+        for chunk in range(3):
+            emitted.append(chunk)
+            yield pd.DataFrame({
+                "user_email": [f"stream{chunk}-{i}@x.com" for i in range(4)],
+                "risk_score": [0.1, 0.2, 0.8, 0.9],
+                "decision": ["ALLOW", "REVIEW", "BLOCK", "BLOCK"],
+            })
+
+    monkeypatch.setattr(fraud, "WORKER_MODE", "batch")
+    monkeypatch.setattr(fraud, "iter_batch_pipeline", pipeline)
+    monkeypatch.setattr(fraud, "get_clickhouse_pool", lambda: SimpleNamespace(connection=nullcontext))
+    monkeypatch.setattr(fraud, "create_snapshot_writer", lambda: None)
+    monkeypatch.setattr(fraud, "load_model", lambda: SimpleNamespace(version="v-stream"))
+
+    app = FastAPI()
+    app.include_router(fraud.fraud_route)
+    client = TestClient(app)
+
+    response = client.post("/predict/batch", params=[("decision", "BLOCK")])
+
+    assert response.status_code == 200
+    assert response.headers["X-Model-Version"] == "v-stream"
+    rows = response.json()
+    assert emitted == [0, 1, 2]
+    assert len(rows) == 6 and {r["decision"] for r in rows} == {"BLOCK"}
+    with Session(engine) as db:
+        stored = db.exec(select(Prediction.user_email).where(Prediction.user_email.like("stream%"))).all()
+    assert sorted(stored) == sorted(r["user_email"] for r in rows)
+
+    # пустой прогон — пустой массив
+    monkeypatch.setattr(fraud, "iter_batch_pipeline", lambda client, **kwargs: iter(()))
+    assert client.post("/predict/batch").json() == []
+
+
+def test_batch_route_reports_error_after_first_chunk(monkeypatch):
+    SQLModel.metadata.create_all(engine)
+    discarded = []
+
+    class Writer:
+        def publish(self):
+            raise AssertionError("broken run must not be published")
+
+        def discard(self):
+            discarded.append(True)
+
+    def pipeline(client, **kwargs):
+        yield pd.DataFrame({
+            "user_email": ["midstream@x.com", "midstream2@x.com"],
+            "risk_score": [0.9, 0.1],
+            "decision": ["BLOCK", "ALLOW"],
+        })
+        raise ConnectionError("ClickHouse went away")
+
+    monkeypatch.setattr(fraud, "WORKER_MODE", "batch")
+    monkeypatch.setattr(fraud, "iter_batch_pipeline", pipeline)
+    monkeypatch.setattr(fraud, "get_clickhouse_pool", lambda: SimpleNamespace(connection=nullcontext))
+    monkeypatch.setattr(fraud, "create_snapshot_writer", Writer)
+    monkeypatch.setattr(fraud, "load_model", lambda: SimpleNamespace(version="v-stream"))
+
+    app = FastAPI()
+    app.include_router(fraud.fraud_route)
+    response = TestClient(app).post("/predict/batch")
+
+    # заголовки уже ушли — статус 200, но массив закрыт явной ошибкой
+    assert response.status_code == 200
+    *rows, last = response.json()
+    assert [r["user_email"] for r in rows] == ["midstream@x.com", "midstream2@x.com"]
+    assert last == {"error": "ConnectionError: ClickHouse went away", "rows": 2}
+    assert discarded == [True]
@@ -0,0 +1,27 @@
+# app/tests/test_cache.py
+import time
+
+from app.ml.cache import FeatureCache
+
+
+def test_feature_cache_lru_and_ttl():
+    cache = FeatureCache(max_entries=2, ttl_seconds=0.05)
+    cache.put_features("a@x.com", 365, ("user_email",), ("a@x.com",))
+    cache.put_features("b@x.com", 365, ("user_email",), ("b@x.com",))
+
+    assert cache.get("a@x.com", 365) is not None          # a — самый свежий
+    cache.put_features("c@x.com", 365, ("user_email",), ("c@x.com",))
+
+    assert cache.get("b@x.com", 365) is None               # вытеснен по LRU
+    assert cache.get("a@x.com", 730) is None               # другой feature_days
+
+    cache.put_score("a@x.com", 365, {"risk_score": 0.1})
+    assert cache.get("a@x.com", 365).score == {"risk_score": 0.1}
+
+    time.sleep(0.06)
+    assert cache.get("a@x.com", 365) is None               # истёк TTL
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+    assert cache.invalidate() == 1
@@ -0,0 +1,87 @@
+# app/tests/test_clickhouse_pool.py
+import threading
+
+import pytest
+from clickhouse_connect.driver.exceptions import OperationalError
+
+from app.services.clickhouse_client import ClickHousePool, ClickHousePoolTimeout
+
+
+class FakeClient:
+    def __init__(self, alive: bool = True):
+        self.alive = alive
+        self.closed = False
+
+    def ping(self) -> bool:
+        return self.alive
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_pool_reuses_clients():
+    pool = ClickHousePool(factory=FakeClient, size=2)
+    pool.warm_up()
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    stats = pool.stats()
+    assert stats["created"] == 2
+    assert stats["acquires"] == 2
+    assert stats["in_use"] == 0
+
+
+def test_pool_times_out_when_exhausted():
+    pool = ClickHousePool(factory=FakeClient, size=1, acquire_timeout=0.05)
+    entered = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            entered.set()
+            release.wait()
+
+    t = threading.Thread(target=hold)
+    t.start()
+    entered.wait()
+    try:
+        assert pool.stats()["utilization"] == 1.0
+        with pytest.raises(ClickHousePoolTimeout):
+            with pool.connection():
+                pass
+    finally:
+        release.set()
+        t.join()
+
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_broken_session_is_recycled():
+    pool = ClickHousePool(factory=FakeClient, size=1)
+
+    with pytest.raises(OperationalError):
+        with pool.connection() as client:
+            raise OperationalError("connection reset")
+
+    with pool.connection() as fresh:
+        pass
+
+    assert client.closed
+    assert fresh is not client
+    assert pool.stats()["recycled"] == 1
+
+
+def test_stale_client_is_checked_with_ping():
+    pool = ClickHousePool(factory=FakeClient, size=1, check_idle_seconds=0)
+
+    with pool.connection() as client:
+        client.alive = False
+    with pool.connection() as fresh:
+        pass
+
+    assert fresh is not client
+    assert pool.stats()["recycled"] == 1
@@ -0,0 +1,66 @@
+# app/tests/test_decision.py
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app.ml.pipeline as pipeline
+from app.core.config import get_settings
+from app.core.decision import (
+    Decision,
+    DecisionPolicy,
+    ThresholdTable,
+    decision_labels,
+    load_decision_policy,
+    make_decision,
+)
+from app.ml.model import load_model
+from app.tests.test_pipeline import COLUMNS, ROWS
+
+
+def test_vectorized_decisions_match_scalar_rule():
+    settings = get_settings()
+    review, block = settings.FRAUD_REVIEW_THRESHOLD, settings.FRAUD_BLOCK_THRESHOLD
+    scores = np.array([0.0, np.nextafter(review, 0), review, 0.5, block, 1.0, np.nan])
+
+    labels = decision_labels(load_decision_policy().decide(scores))
+
+    assert labels.tolist() == [make_decision(float(s)).value for s in scores]
+    assert labels.tolist() == ["ALLOW", "ALLOW", "REVIEW", "REVIEW", "BLOCK", "BLOCK", "ALLOW"]
+
+
+def test_n_zone_tables_by_segment():
+    policy = DecisionPolicy(
+        default=ThresholdTable([(0.5, Decision.BLOCK)]),
+        segment_column="channel",
+        segments={"seo": ThresholdTable([(0.1, Decision.REVIEW), (0.3, Decision.REVIEW), (0.9, Decision.BLOCK)])},
+    )
+    scores = np.array([0.2, 0.6, 0.2, 0.95])
+    segments = np.array(["ppc", "seo", "seo", "seo"], dtype=object)
+
+    assert decision_labels(policy.decide(scores, segments)).tolist() == ["ALLOW", "REVIEW", "REVIEW", "BLOCK"]
+    assert policy.decide_one(0.6, "seo") is Decision.REVIEW
+    assert policy.decide_one(0.6, "ppc") is Decision.BLOCK
+
+
+def test_invalid_tables_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="strictly increasing"):
+        ThresholdTable([(0.7, Decision.BLOCK), (0.2, Decision.REVIEW)])
+
+    path = tmp_path / "tables.json"
+    path.write_text(json.dumps({"segments": {"seo": [[0.2, "BLOCK"]]}}))
+    with pytest.raises(ValueError, match="'segment' column is required"):
+        load_decision_policy(str(path))
+
+
+def test_batch_decisions_use_segment_tables(tmp_path, monkeypatch):
+    path = tmp_path / "tables.json"
+    path.write_text(json.dumps({"segment": "channel", "segments": {"seo": [[0.0, "BLOCK"]]}}))
+    monkeypatch.setattr(pipeline, "get_decision_policy", lambda: load_decision_policy(str(path)))
+
+    rows = [(f"u{i}@x.com",) + ROWS[0][1:-2] + (channel, ROWS[0][-1]) for i, channel in enumerate(["seo", "ppc"])]
+    df = pipeline.score_batch_frame(pd.DataFrame(rows, columns=list(COLUMNS)), model=load_model())
+
+    assert df["decision"].iloc[0] == "BLOCK"
+    assert df["decision"].iloc[1] == make_decision(float(df["risk_score"].iloc[1])).value
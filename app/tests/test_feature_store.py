@@ -0,0 +1,176 @@
+# app/tests/test_feature_store.py
+import re
+from datetime import date, timedelta
+from typing import Optional
+
+import pytest
+
+from app.core.config import get_settings
+from app.ml.feature_store import (
+    MEMBERS_TABLE,
+    SALES_TABLE,
+    build_store_features_query,
+    feature_store_ddl,
+    refresh_feature_store,
+)
+from app.ml.fetch import fetch_user_features_batch, fetch_user_features_users
+
+TODAY = date(2025, 6, 30)
+
+
+def _normalized(query: str) -> str:
+    return " ".join(query.split())
+
+
+# ---------------- PRODUCTION SQL ----------------
+
+class _Result:
+    def __init__(self, rows):
+        self.result_rows = rows
+
+
+class RecordingClient:
+    """
+    Заглушка ClickHouse: записывает команды с параметрами, watermark store —
+    последний день, подменённый через REPLACE PARTITION.
+    """
+
+    def __init__(self, watermarks: Optional[dict] = None):
+        self.watermarks = dict(watermarks or {})
+        self.commands = []
+        self._staged = {}
+
+    def command(self, statement, parameters=None):
+        statement = " ".join(statement.split())
+        self.commands.append((statement, parameters))
+        match = re.match(r"INSERT INTO (\S+_staging_\w+) SELECT lower", statement)
+        if match:
+            self._staged[match.group(1)] = parameters["end_day"] - timedelta(days=1)
+        match = re.match(r"ALTER TABLE (\S+) REPLACE PARTITION ID '\d+' FROM (\S+)", statement)
+        if match:
+            self.watermarks[match.group(1)] = self._staged[match.group(2)]
+
+    def query(self, query, parameters=None, settings=None):
+        table = query.rsplit(" ", 1)[-1]
+        watermark = self.watermarks.get(table)
+        return _Result([(watermark or date(1970, 1, 1), int(watermark is not None))])
+
+    def statements(self, prefix: str) -> list:
+        return [(statement, parameters) for statement, parameters in self.commands if statement.startswith(prefix)]
+
+
+def test_refresh_backfills_closed_days_through_staging():
+    client = RecordingClient()
+    stats = refresh_feature_store(client, backfill_days=60, today=TODAY)
+
+    start = TODAY - timedelta(days=60)
+    for table, column in ((SALES_TABLE, "event_date"), (MEMBERS_TABLE, "attraction_date")):
+        assert stats[table]["from"] == start.isoformat()
+        assert stats[table]["to"] == (TODAY - timedelta(days=1)).isoformat()
+        # в store напрямую ничего не вставляется — только в staging
+        assert client.statements(f"INSERT INTO {table} ") == []
+
+        (staging_ddl, _), = client.statements(f"CREATE TABLE {table}_staging_")
+        staging = staging_ddl.split()[2]
+        assert staging_ddl == f"CREATE TABLE {staging} AS {table}"
+
+        (copy, copy_params), (insert, params) = client.statements(f"INSERT INTO {staging} ")
+        assert copy.startswith(f"INSERT INTO {staging} SELECT * FROM {table} ")
+        assert copy_params == {"month_start": date(2025, 5, 1), "start_day": start}
+        assert f"{column} >= {{start_day:Date}} AND {column} < {{end_day:Date}}" in insert
+        assert params == {"start_day": start, "end_day": TODAY}
+
+        assert [statement for statement, _ in client.statements(f"ALTER TABLE {table} ")] == [
+            f"ALTER TABLE {table} REPLACE PARTITION ID '{month}' FROM {staging}" for month in (202505, 202506)
+        ]
+        assert client.statements(f"DROP TABLE IF EXISTS {staging}")
+
+
+def test_refresh_starts_after_watermark_and_repeat_is_noop():
+    watermark = TODAY - timedelta(days=4)
+    client = RecordingClient({SALES_TABLE: watermark, MEMBERS_TABLE: watermark})
+
+    refresh_feature_store(client, backfill_days=730, today=TODAY)
+    for table in (SALES_TABLE, MEMBERS_TABLE):
+        (_, params), = [
+            (statement, parameters) for statement, parameters in client.statements("INSERT INTO ")
+            if statement.startswith(f"INSERT INTO {table}_staging_") and "{end_day:Date}" in statement
+        ]
+        assert params == {"start_day": TODAY - timedelta(days=3), "end_day": TODAY}
+        assert client.watermarks[table] == TODAY - timedelta(days=1)
+
+    # второй запуск в тот же день: все закрытые дни уже в store
+    client.commands.clear()
+    stats = refresh_feature_store(client, backfill_days=730, today=TODAY)
+    assert client.statements("INSERT") == client.statements("ALTER") == []
+    assert stats[SALES_TABLE]["from"] is None
+
+
+def test_refresh_drops_staging_when_replace_fails():
+    class FailingClient(RecordingClient):
+        def command(self, statement, parameters=None):
+            super().command(statement, parameters)
+            if "REPLACE PARTITION" in statement:
+                raise RuntimeError("replace failed")
+
+    client = FailingClient()
+    with pytest.raises(RuntimeError):
+        refresh_feature_store(client, backfill_days=30, today=TODAY)
+    assert client.statements(f"DROP TABLE IF EXISTS {SALES_TABLE}_staging_")
+
+
+def test_store_tables_have_retention_ttl():
+    ddl = [" ".join(statement.split()) for statement in feature_store_ddl(400)]
+    for table in (SALES_TABLE, MEMBERS_TABLE):
+        (create,) = [statement for statement in ddl if f"CREATE TABLE IF NOT EXISTS {table}" in statement]
+        assert create.endswith("ORDER BY (user_email, day) TTL day + INTERVAL 400 DAY")
+
+
+def test_store_query_splits_window_at_watermark():
+    # store отдаёт дни окна до watermark, сырые таблицы — с watermark + 1 до сегодня включительно
+    for mode in ("batch", "batch_shard", "user", "users"):
+        query = _normalized(build_store_features_query(mode))
+        for table, column in ((SALES_TABLE, "event_date"), (MEMBERS_TABLE, "attraction_date")):
+            assert (
+                f"SELECT * FROM {table} WHERE day >= today() - {{feature_days:UInt16}} "
+                "AND user_email IN (SELECT user_email FROM active_users) UNION ALL"
+            ) in query
+            assert f"{column} >= greatest((SELECT max(day) + 1 FROM {table}), today() - {{feature_days:UInt16}})" in query
+        assert "< today()" not in query
+        assert "{start_day:Date}" not in query
+
+
+def test_batch_active_users_read_raw_days_after_watermark():
+    for mode in ("batch", "batch_shard"):
+        query = _normalized(build_store_features_query(mode))
+        assert f"FROM {SALES_TABLE} WHERE day >= today() - {{active_days:UInt16}}" in query
+        assert f"event_date >= greatest((SELECT max(day) + 1 FROM {SALES_TABLE}), today() - {{active_days:UInt16}})" in query
+        assert "event_date >= today()" not in query
+
+
+class _Rows:
+    column_names = ("user_email",)
+    result_rows = [("a@example.com",)]
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.calls = []
+
+    def query(self, query, parameters=None, settings=None):
+        self.calls.append((query, parameters))
+        return _Rows()
+
+
+def test_fetch_reads_store_when_enabled(monkeypatch):
+    monkeypatch.setattr(get_settings(), "FEATURE_STORE_ENABLED", True)
+    client = QueryRecorder()
+
+    fetch_user_features_users(client, ["a@example.com"], feature_days=365)
+    fetch_user_features_batch(client, active_days=30, feature_days=365, columnar=False)
+
+    (users_query, users_params), (batch_query, batch_params) = client.calls
+    assert users_query is build_store_features_query("users")
+    assert users_params == {"emails": ["a@example.com"], "feature_days": 365}
+    assert batch_query is build_store_features_query("batch")
+    assert batch_params == {"active_days": 30, "feature_days": 365}
@@ -0,0 +1,139 @@
+# app/tests/test_fetch.py
+from contextlib import contextmanager
+
+import pandas as pd
+import pytest
+
+from app.ml.feature_store import build_store_features_query
+from app.ml.fetch import (
+    ShardFetchError,
+    fetch_user_features_row,
+    fetch_user_features_users,
+    stream_user_features_batch,
+    stream_user_features_sharded,
+)
+
+
+class _Result:
+    column_names = ("user_email",)
+    result_rows = [("a@example.com",)]
+
+
+class RecordingClient:
+    def __init__(self):
+        self.calls = []
+
+    def query(self, query, parameters=None, settings=None):
+        self.calls.append((query, parameters))
+        return _Result()
+
+
+def test_feature_query_is_parameterized_and_reused():
+    client = RecordingClient()
+    fetch_user_features_row(client, "o'brien@example.com", feature_days=365)
+    fetch_user_features_row(client, "other@example.com", feature_days=730)
+
+    (q1, p1), (q2, p2) = client.calls
+    assert q1 is q2
+    assert "o'brien" not in q1
+    assert "{email:String}" in q1 and "{feature_days:UInt16}" in q1
+    assert p1 == {"email": "o'brien@example.com", "feature_days": 365}
+    assert p2 == {"email": "other@example.com", "feature_days": 730}
+
+
+def test_multi_user_query_uses_array_parameter():
+    client = RecordingClient()
+    fetch_user_features_users(client, ["a@example.com", "b@example.com"], feature_days=365)
+
+    query, params = client.calls[0]
+    assert "{emails:Array(String)}" in query
+    assert params == {"emails": ["a@example.com", "b@example.com"], "feature_days": 365}
+
+
+class _DfStream:
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    def __enter__(self):
+        return iter(self.blocks)
+
+    def __exit__(self, *exc):
+        return False
+
+
+class ColumnarClient:
+    def __init__(self, n_rows: int, block_size: int):
+        df = pd.DataFrame({
+            "user_email": [f"u{i}@example.com" for i in range(n_rows)],
+            "n_sales": pd.Series(range(n_rows), dtype="uint64"),
+        })
+        self.blocks = [df.iloc[i: i + block_size] for i in range(0, n_rows, block_size)]
+
+    def query_df_stream(self, query, parameters=None, settings=None, use_extended_dtypes=None):
+        return _DfStream(self.blocks)
+
+
+def test_columnar_stream_rechunks_blocks():
+    chunks = list(stream_user_features_batch(ColumnarClient(10, 3), chunk_size=4))
+
+    assert [len(c) for c in chunks] == [4, 4, 2]
+    assert pd.concat(chunks)["user_email"].tolist() == [f"u{i}@example.com" for i in range(10)]
+    assert all(c["n_sales"].dtype == "int64" for c in chunks)
+
+
+class ShardClient:
+    """
+    Отвечает на batch_shard-запрос строками своего шарда; падает заданное число раз.
+    """
+
+    def __init__(self, users: list[str], failures: dict):
+        self.users = users
+        self.failures = failures
+        self.calls = []
+
+    def query_df(self, query, parameters=None, use_extended_dtypes=None):
+        self.calls.append((query, parameters))
+        shard, shards = parameters["shard"], parameters["shards"]
+        if self.failures.get(shard, 0) > 0:
+            self.failures[shard] -= 1
+            raise ConnectionError(f"shard {shard} lost")
+        emails = [u for i, u in enumerate(self.users) if i % shards == shard]
+        return pd.DataFrame({"user_email": emails, "n_sales": pd.Series(range(len(emails)), dtype="uint64")})
+
+
+def _factory(client):
+    @contextmanager
+    def connection():
+        yield client
+    return connection
+
+
+def test_sharded_stream_retries_failed_shard_without_duplicates():
+    users = [f"u{i}@example.com" for i in range(10)]
+    client = ShardClient(users, failures={1: 2})
+
+    chunks = list(stream_user_features_sharded(
+        _factory(client), shards=3, parallel=2, chunk_size=4, retries=2, retry_backoff=0,
+    ))
+
+    assert sorted(pd.concat(chunks)["user_email"]) == sorted(users)
+    assert all(len(c) <= 4 for c in chunks)
+    assert all(c["n_sales"].dtype == "int64" for c in chunks)
+
+    query, params = client.calls[0]
+    assert "cityHash64(lower(trim(user_email))) % {shards:UInt16} = {shard:UInt16}" in query
+    # шард 1: две неудачи + успешный повтор
+    assert sorted(p["shard"] for _, p in client.calls) == [0, 1, 1, 1, 2]
+
+
+def test_sharded_stream_gives_up_after_retries():
+    client = ShardClient([f"u{i}@example.com" for i in range(10)], failures={2: 5})
+
+    with pytest.raises(ShardFetchError, match="shard 2/3 failed after 2 attempts"):
+        list(stream_user_features_sharded(_factory(client), shards=3, parallel=3, retries=1, retry_backoff=0))
+
+
+def test_store_shard_query_filters_both_sources():
+    query = build_store_features_query("batch_shard")
+    assert "cityHash64(user_email) % {shards:UInt16}" in query
+    assert "cityHash64(lower(trim(user_email))) % {shards:UInt16}" in query
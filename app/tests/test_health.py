@@ -4,3 +4,39 @@ def test_health(client):
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "healthy"}
+
+
+def test_liveness(client):
+    response = client.get("/health/live")
+    assert response.status_code == 200
+    assert response.json() == {"status": "alive"}
+
+
+def test_readiness_follows_lifespan():
+    from fastapi.testclient import TestClient
+    from app.api import app
+
+    with TestClient(app) as c:
+        response = c.get("/health/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+
+    # после shutdown воркер больше не готов принимать трафик
+    response = TestClient(app).get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"]["startup"] is False
+
+
+def test_gateway_does_not_import_ml_stack():
+    import os
+    import subprocess
+    import sys
+
+    code = (
+        "import sys, app.api; "
+        "print(','.join(m for m in ('pandas', 'flaml', 'lightgbm', 'xgboost', 'catboost', 'clickhouse_connect') "
+        "if m in sys.modules))"
+    )
+    env = {**os.environ, "WORKER_MODE": "api", "TESTING": "1"}
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1:] in ([], [""])
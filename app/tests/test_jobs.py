@@ -0,0 +1,110 @@
+# app/tests/test_jobs.py
+import threading
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session
+
+import app.ml.fetch as fetch
+import app.ml.model as model
+import app.ml.pipeline as pipeline
+import app.ml.snapshot as snapshot
+import app.routes.fraud as fraud
+from app.database.database import engine
+from app.services.jobs import JobManager
+
+CHUNKS = 3
+CHUNK_ROWS = 4
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    SQLModel.metadata.create_all(engine)
+    gate = threading.Event()
+    gate.set()
+
+    def stream(connection_factory, **kwargs):
+        for chunk in range(CHUNKS):
+            gate.wait(5)
+            yield pd.DataFrame({"user_email": [f"job{chunk}-{i}@x.com" for i in range(CHUNK_ROWS)]})
+
+    def score(df, snapshot_writer, loaded_model):
+        risk = [0.1 + 0.2 * i for i in range(len(df))]   # 0.1 / 0.3 / 0.5 / 0.7
+        decision = ["ALLOW", "REVIEW", "REVIEW", "BLOCK"][: len(df)]
+        return df.assign(risk_score=risk, decision=decision)
+
+    monkeypatch.setattr(fetch, "stream_batch_features", stream)
+    monkeypatch.setattr(pipeline, "score_batch_frame", score)
+    monkeypatch.setattr(model, "load_model", lambda: SimpleNamespace(version="v-job"))
+    monkeypatch.setattr(snapshot, "create_snapshot_writer", lambda feature_days: None)
+
+    manager = JobManager(connection_factory=nullcontext, session_factory=lambda: Session(engine), workers=1)
+    monkeypatch.setattr(fraud, "WORKER_MODE", "batch")
+    monkeypatch.setattr(fraud, "get_job_manager", lambda: manager)
+
+    app = FastAPI()
+    app.include_router(fraud.fraud_route)
+    yield TestClient(app), gate
+    manager.shutdown()
+
+
+def test_job_runs_and_pages_results_from_postgres(jobs):
+    client, _ = jobs
+
+    submitted = client.post("/jobs")
+    assert submitted.status_code == 202
+    job_id = submitted.json()["job_id"]
+
+    _wait_for(lambda: client.get(f"/jobs/{job_id}").json()["status"] == "DONE")
+    status = client.get(f"/jobs/{job_id}").json()
+    assert status["model_version"] == "v-job"
+    assert status["rows_fetched"] == status["rows_scored"] == status["rows_persisted"] == CHUNKS * CHUNK_ROWS
+    assert status["decision_counts"] == {"ALLOW": 3, "REVIEW": 6, "BLOCK": 3}
+    assert [j["job_id"] for j in client.get("/jobs").json()] == [job_id]
+
+    first = client.get(f"/jobs/{job_id}/results", params={"limit": 5}).json()
+    rest = client.get(f"/jobs/{job_id}/results", params={"offset": 5, "limit": 100}).json()
+    assert first["total"] == rest["total"] == CHUNKS * CHUNK_ROWS
+    emails = [r["user_email"] for r in first["items"] + rest["items"]]
+    assert emails == [f"job{c}-{i}@x.com" for c in range(CHUNKS) for i in range(CHUNK_ROWS)]
+
+    risky = client.get(
+        f"/jobs/{job_id}/results",
+        params=[("decision", "REVIEW"), ("decision", "BLOCK"), ("sort", "risk_desc")],
+    ).json()
+    assert risky["total"] == 9
+    assert [r["decision"] for r in risky["items"][:3]] == ["BLOCK"] * 3
+    assert [r["risk_score"] for r in risky["items"]] == sorted((r["risk_score"] for r in risky["items"]), reverse=True)
+
+
+def test_job_cancel_and_unknown_job(jobs):
+    client, gate = jobs
+    gate.clear()   # первый чанк ждёт — джоб висит в RUNNING
+
+    running = client.post("/jobs").json()["job_id"]
+    pending = client.post("/jobs").json()["job_id"]   # один воркер — второй ждёт очереди
+    _wait_for(lambda: client.get(f"/jobs/{running}").json()["status"] == "RUNNING")
+
+    assert client.delete(f"/jobs/{pending}").json()["status"] == "CANCELLED"
+    client.delete(f"/jobs/{running}")
+    gate.set()
+
+    _wait_for(lambda: client.get(f"/jobs/{running}").json()["status"] == "CANCELLED")
+    status = client.get(f"/jobs/{running}").json()
+    assert status["rows_fetched"] < CHUNKS * CHUNK_ROWS
+    assert client.get(f"/jobs/{running}/results").json()["total"] == status["rows_persisted"]
+
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.delete("/jobs/missing").status_code == 404
@@ -0,0 +1,113 @@
+# app/tests/test_metrics.py
+import asyncio
+
+import pandas as pd
+from fastapi import APIRouter, FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import app.services.prediction_writer as prediction_writer
+from app.core.metrics import CONTENT_TYPE, render
+from app.middleware.analytics import RequestLoggingMiddleware
+from app.ml.model import load_model
+from app.ml.pipeline import score_batch_frame
+from app.services.prediction_writer import PredictionWriter
+from app.tests.test_pipeline import COLUMNS, ROWS
+
+
+def _count(pipeline: str, stage: str) -> float:
+    return REGISTRY.get_sample_value(
+        "antifraud_pipeline_stage_seconds_count", {"pipeline": pipeline, "stage": stage},
+    ) or 0
+
+
+def test_batch_stages_and_decisions_are_recorded():
+    before = {stage: _count("batch", stage) for stage in ("features", "preprocess", "predict", "decision")}
+
+    df = score_batch_frame(pd.DataFrame(ROWS, columns=list(COLUMNS)), model=load_model())
+
+    for stage, count in before.items():
+        assert _count("batch", stage) == count + 1
+    text = render().decode()
+    for decision in df["decision"].unique():
+        assert f'antifraud_decisions_total{{decision="{decision}",pipeline="batch"}}' in text
+
+
+def test_scrape_collectors(monkeypatch, tmp_path):
+    model = load_model()
+    writer = PredictionWriter(session_factory=None, spill_dir=str(tmp_path))
+    monkeypatch.setattr(prediction_writer, "_writer", writer)
+
+    assert REGISTRY.get_sample_value(
+        "antifraud_model_info", {"version": model.version, "runtime": model.runtime},
+    ) == 1
+    assert REGISTRY.get_sample_value("antifraud_prediction_queue_size") == 0
+    assert REGISTRY.get_sample_value("antifraud_prediction_records_total", {"outcome": "written"}) == 0
+
+    # без writer серии пропадают, scrape не падает
+    monkeypatch.setattr(prediction_writer, "_writer", None)
+    assert REGISTRY.get_sample_value("antifraud_prediction_queue_size") is None
+    assert b"antifraud_model_info" in render()
+
+
+def test_metrics_endpoint(client):
+    client.get("/health/live")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    assert 'antifraud_http_request_duration_seconds_count{method="GET",route="/health/live",status="2xx"}' in response.text
+    assert "antifraud_http_requests_in_flight" in response.text
+
+
+def _latency(route: str, stat: str) -> float:
+    return REGISTRY.get_sample_value(
+        f"antifraud_http_request_duration_seconds_{stat}", {"method": "GET", "route": route, "status": "2xx"},
+    ) or 0
+
+
+def _app() -> FastAPI:
+    router = APIRouter()
+
+    @router.get("/item/{item_id}")
+    def item(item_id: str):
+        return {"id": item_id}
+
+    @router.get("/stream")
+    def stream():
+        async def body():
+            for chunk in (b"[", b"1", b"]"):
+                await asyncio.sleep(0.1)
+                yield chunk
+        return StreamingResponse(body(), media_type="application/json")
+
+    outer = APIRouter()
+    outer.include_router(router, prefix="/metrics")
+
+    app = FastAPI()
+    app.include_router(outer, prefix="/test")
+    app.add_middleware(RequestLoggingMiddleware)
+    return app
+
+
+def test_route_label_is_template_with_prefix():
+    with TestClient(_app()) as client:
+        before = _latency("/test/metrics/item/{item_id}", "count")
+        client.get("/test/metrics/item/a@x.com")
+        client.get("/test/metrics/nope")
+
+    assert _latency("/test/metrics/item/{item_id}", "count") == before + 1
+    assert REGISTRY.get_sample_value(
+        "antifraud_http_request_duration_seconds_count", {"method": "GET", "route": "<unmatched>", "status": "4xx"},
+    )
+
+
+def test_streamed_response_latency_covers_body():
+    with TestClient(_app()) as client:
+        before = _latency("/test/metrics/stream", "sum")
+        assert client.get("/test/metrics/stream").content == b"[1]"
+
+    assert _latency("/test/metrics/stream", "sum") - before >= 0.3
+    assert REGISTRY.get_sample_value("antifraud_http_requests_in_flight") == 0
@@ -0,0 +1,36 @@
+# app/tests/test_microbatch.py
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from app.services.microbatch import MicroBatcher
+
+
+def test_microbatcher_merges_concurrent_requests():
+    calls = []
+
+    def score_fn(client, emails):
+        calls.append(list(emails))
+        return {
+            e: {"user_email": e, "risk_score": 0.5, "decision": "REVIEW"}
+            for e in emails
+            if e != "missing@example.com"
+        }
+
+    batcher = MicroBatcher(
+        score_fn=score_fn,
+        connection_factory=nullcontext,
+        max_batch_size=32,
+        max_wait_ms=50,
+    )
+    batcher.start()
+    try:
+        emails = [f"User{i}@Example.com " for i in range(20)] + ["missing@example.com"]
+        with ThreadPoolExecutor(max_workers=len(emails)) as pool:
+            results = list(pool.map(batcher.score, emails))
+    finally:
+        batcher.stop()
+
+    assert results[-1] is None
+    assert [r["user_email"] for r in results[:-1]] == emails[:-1]
+    assert len(calls) < len(emails)
+    assert batcher.stats()["requests"] == len(emails)
@@ -0,0 +1,64 @@
+# app/tests/test_migrations.py
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+from sqlmodel import SQLModel
+
+import app.database.database as database
+import app.models.prediction  # noqa: F401
+import app.models.user  # noqa: F401
+
+
+def _config(url: str) -> Config:
+    config = Config(database.ALEMBIC_INI)
+    config.set_main_option("sqlalchemy.url", url)
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def _diff(engine) -> list:
+    with engine.connect() as conn:
+        return compare_metadata(MigrationContext.configure(conn), SQLModel.metadata)
+
+
+def test_migrations_build_the_model_schema(tmp_path):
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    command.upgrade(_config(url), "head")
+
+    assert _diff(create_engine(url)) == []
+
+
+def test_migrations_upgrade_database_created_by_create_all(tmp_path):
+    # база до prediction.job_id: таблицы из create_all, ревизии alembic нет
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_prediction_job_id"))
+        conn.execute(text("ALTER TABLE prediction DROP COLUMN job_id"))
+        conn.execute(text(
+            "INSERT INTO prediction (user_email, risk_score, decision, created_at) "
+            "VALUES ('old@x.com', 0.5, 'REVIEW', '2025-01-01 00:00:00')"
+        ))
+
+    command.upgrade(_config(url), "head")
+
+    assert _diff(engine) == []
+    assert "ix_prediction_job_id" in {i["name"] for i in inspect(engine).get_indexes("prediction")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT user_email, job_id FROM prediction")).all() == [("old@x.com", None)]
+
+
+def test_startup_requires_migrated_schema(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    monkeypatch.setattr(database, "engine", create_engine(url))
+
+    command.upgrade(_config(url), "0001")
+    with pytest.raises(RuntimeError, match="upgrade head"):
+        database.check_schema_version()
+
+    command.upgrade(_config(url), "head")
+    database.check_schema_version()
@@ -0,0 +1,112 @@
+# app/tests/test_model_registry.py
+import time
+
+import numpy as np
+import pytest
+
+from app.ml.model import LoadedModel, load_model
+from app.ml.registry import (
+    ModelRegistry,
+    ModelValidationError,
+    artifact_paths,
+    artifacts_version,
+    load_artifacts,
+)
+
+
+class ConstantModel:
+    def __init__(self, risk: float):
+        self.risk = risk
+
+    def predict_proba(self, X):
+        return np.column_stack([1 - np.full(len(X), self.risk), np.full(len(X), self.risk)])
+
+
+def _version(name: str, risk: float = 0.2, features: list[str] | None = None) -> LoadedModel:
+    base = load_model()
+    return LoadedModel(
+        "automl",
+        ConstantModel(risk),
+        features or list(base.features),
+        0.3,
+        encoding=base.encoding,
+        version=name,
+    )
+
+
+class Loader:
+    """
+    Отдаёт заранее заданные версии по очереди (как будто файлы на диске меняются).
+    """
+
+    def __init__(self, *versions: LoadedModel):
+        self.versions = list(versions)
+
+    def __call__(self) -> LoadedModel:
+        return self.versions[0] if len(self.versions) == 1 else self.versions.pop(0)
+
+
+def test_registry_version_matches_artifacts():
+    model = ModelRegistry(loader=load_artifacts).current()
+    assert model.version == artifacts_version(artifact_paths())
+    assert model.encoding is not None
+
+
+def test_reload_swaps_and_keeps_previous_for_rollback():
+    swaps = []
+    registry = ModelRegistry(
+        loader=Loader(_version("v1", 0.1), _version("v2", 0.9)),
+        keep=2,
+        on_swap=lambda old, new: swaps.append((old.version, new.version)),
+    )
+    in_flight = registry.current()
+    assert in_flight.version == "v1"
+
+    assert registry.reload().version == "v2"
+    assert registry.current().version == "v2"
+    assert swaps == [("v1", "v2")]
+    # запрос, взявший старую версию, дорабатывает на ней
+    assert float(in_flight.predict(np.zeros((1, len(in_flight.features))))[0]) == pytest.approx(0.1)
+
+    # тот же файл ещё раз — версия не меняется
+    assert registry.reload().version == "v2"
+    assert registry.reloads == 1
+
+    assert registry.rollback().version == "v1"
+    assert [m["version"] for m in registry.stats()["previous"]] == ["v2"]
+    assert registry.rollback("v2").version == "v2"
+    with pytest.raises(LookupError):
+        registry.rollback("missing")
+
+
+def test_invalid_versions_are_rejected():
+    base = _version("v1")
+    changed = list(reversed(base.features))
+    registry = ModelRegistry(loader=Loader(base, _version("bad", risk=1.5), _version("v3", features=changed), _version("v3", features=changed)))
+    registry.current()
+
+    with pytest.raises(ModelValidationError, match="invalid probabilities"):
+        registry.reload()
+    with pytest.raises(ModelValidationError, match="FEATURES contract changed"):
+        registry.reload()
+    assert registry.current().version == "v1"
+    assert registry.stats()["failures"] == 2
+
+    assert registry.reload(force=True).version == "v3"
+
+
+def test_watcher_reloads_after_artifacts_settle(tmp_path):
+    artifact = tmp_path / "model.bin"
+    artifact.write_bytes(b"v1")
+
+    registry = ModelRegistry(loader=Loader(_version("v1"), _version("v2")))
+    registry.current()
+    registry.start_watching(0.02, paths=lambda: [str(artifact)])
+    try:
+        artifact.write_bytes(b"v2-bigger")
+        deadline = time.monotonic() + 2
+        while registry.current().version != "v2" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert registry.current().version == "v2"
+    finally:
+        registry.stop_watching()
@@ -0,0 +1,119 @@
+# app/tests/test_native_model.py
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app.ml.model as model_module
+from app.ml.fe import apply_feature_engineering
+from app.ml.native_model import MANIFEST_FILE, export_native_model, load_native_model
+from app.ml.preprocess import preprocess_for_model
+from app.tests.test_pipeline import COLUMNS, ROWS
+
+# learner FLAML → kind родного формата
+LEARNERS = {
+    "lgbm": "lightgbm",
+    "xgboost": "xgboost",
+    "xgb_limitdepth": "xgboost",
+    "catboost": "catboost",
+}
+SYNTHETIC_FEATURES = [f"f{i}" for i in range(8)]
+
+
+def _model_ready(n: int = 500) -> pd.DataFrame:
+    """
+    Строки пайплайна + случайные строки в диапазоне признаков.
+    """
+    X = preprocess_for_model(apply_feature_engineering(pd.DataFrame(ROWS, columns=list(COLUMNS))))
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 10, size=(n, X.shape[1])).astype(np.float64)
+    return pd.concat([X.astype(np.float64), pd.DataFrame(noise, columns=X.columns)], ignore_index=True)
+
+
+def _synthetic(n: int, seed: int) -> tuple[pd.DataFrame, pd.Series]:
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, len(SYNTHETIC_FEATURES))), columns=SYNTHETIC_FEATURES)
+    y = (X["f0"] + X["f1"] * X["f2"] + rng.normal(scale=0.5, size=n) > 0).astype(int)
+    return X, y
+
+
+def _fit_payload(learner: str) -> dict:
+    """
+    Маленький AutoML с одним learner — как в ноутбуке обучения, но за доли секунды.
+    """
+    from flaml import AutoML
+
+    X, y = _synthetic(400, seed=0)
+    automl = AutoML()
+    automl.fit(X, y, task="classification", estimator_list=[learner], max_iter=1, verbose=0)
+    return {"automl": automl, "features": SYNTHETIC_FEATURES, "best_threshold": 0.5}
+
+
+@pytest.fixture(scope="module", params=["pickle", *LEARNERS])
+def case(request):
+    """
+    (payload, вход для predict, ожидаемый kind): загруженный pickle сервиса
+    и маленькие модели каждого поддерживаемого learner.
+    """
+    if request.param == "pickle":
+        payload = model_module.load_model().payload
+        if payload is None:
+            pytest.skip("AutoML pickle is not loaded (MODEL_RUNTIME=native)")
+        return payload, _model_ready(), None
+    return _fit_payload(request.param), _synthetic(300, seed=1)[0], LEARNERS[request.param]
+
+
+def test_native_export_matches_automl(case, tmp_path):
+    payload, X, kind = case
+    manifest_path = export_native_model(payload, str(tmp_path))
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    assert os.path.exists(tmp_path / manifest["model_file"])
+    assert manifest["features"] == list(payload["features"])
+    assert manifest["best_threshold"] == payload.get("best_threshold")
+    if kind is not None:
+        assert manifest["kind"] == kind
+
+    native = load_native_model(str(tmp_path), num_threads=1)
+
+    expected = payload["automl"].predict_proba(X)[:, 1]
+    assert np.allclose(native.predict(X), expected, rtol=0, atol=1e-9)
+    # голый массив в порядке FEATURES
+    assert np.allclose(native.predict(X.to_numpy()), expected, rtol=0, atol=1e-9)
+
+
+def test_native_model_reorders_columns(case, tmp_path):
+    payload, X, _ = case
+    export_native_model(payload, str(tmp_path))
+    native = load_native_model(str(tmp_path))
+    X = X.iloc[:50]
+
+    shuffled = X[list(reversed(X.columns))]
+    assert np.array_equal(native.predict(shuffled), native.predict(X))
+
+
+def test_native_model_honours_booster_feature_order(case, tmp_path):
+    payload, X, _ = case
+    export_native_model(payload, str(tmp_path))
+    manifest_path = tmp_path / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text())
+
+    # FEATURES сервиса в другом порядке, чем вход бустера
+    manifest["features"] = list(reversed(manifest["booster_features"]))
+    manifest_path.write_text(json.dumps(manifest))
+
+    native = load_native_model(str(tmp_path))
+    X = X.iloc[:50]
+    expected = payload["automl"].predict_proba(X)[:, 1]
+
+    reversed_array = X[manifest["features"]].to_numpy()
+    assert np.allclose(native.predict(reversed_array), expected, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("learner", ["rf", "extra_tree"])
+def test_unsupported_learner_is_rejected(learner, tmp_path):
+    with pytest.raises(ValueError, match="Unsupported estimator for native export"):
+        export_native_model(_fit_payload(learner), str(tmp_path))
+    assert not (tmp_path / MANIFEST_FILE).exists()
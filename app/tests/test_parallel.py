@@ -0,0 +1,78 @@
+# app/tests/test_parallel.py
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.ml.fe import apply_feature_engineering
+from app.ml.fetch import to_signed_counts
+from app.ml.model import load_model
+from app.ml.parallel import ParallelScorer, _factorize, _restore
+from app.ml.preprocess import preprocess_for_model
+from app.tests.test_pipeline import COLUMNS, ROWS, _columnar_frame
+
+
+@pytest.fixture(scope="module")
+def scorer():
+    scorer = ParallelScorer(workers=2, shard_rows=3, start_method="spawn")
+    yield scorer
+    scorer.shutdown()
+
+
+def _rows(n: int) -> list[tuple]:
+    return [(f"u{i}@x.com",) + ROWS[i % 2][1:] for i in range(n)]
+
+
+@pytest.mark.parametrize("columnar", [True, False])
+def test_parallel_scores_match_single_process(scorer, columnar):
+    rows = _rows(11)
+    df = to_signed_counts(_columnar_frame(rows)) if columnar else pd.DataFrame(rows, columns=list(COLUMNS))
+    model = load_model()
+
+    expected_X = preprocess_for_model(apply_feature_engineering(df), model=model)
+    expected = model.predict(expected_X)
+
+    risks, X = scorer.score(df, model, with_features=True)
+
+    # порядок строк сохранён при сборке шардов
+    assert np.array_equal(risks, expected)
+    assert np.array_equal(X.to_numpy(), expected_X.to_numpy(dtype=np.float64))
+    assert list(X.columns) == model.features
+
+    risks_only, no_features = scorer.score(df, model)
+    assert np.array_equal(risks_only, expected)
+    assert no_features is None
+
+
+def test_dead_worker_restarts_pool():
+    scorer = ParallelScorer(workers=2, shard_rows=3, start_method="spawn")
+    df = pd.DataFrame(_rows(7), columns=list(COLUMNS))
+    model = load_model()
+    try:
+        expected, _ = scorer.score(df, model)
+
+        # процесс пула умирает, как при OOM kill: пул становится BrokenProcessPool
+        broken = scorer._executor
+        with pytest.raises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+
+        risks, _ = scorer.score(df, model)
+        assert np.array_equal(risks, expected)
+        assert scorer._executor is not broken
+    finally:
+        scorer.shutdown()
+
+
+def test_string_columns_roundtrip_through_codes():
+    values = np.array(["ios", None, "android", np.nan, "ios", ""], dtype=object)
+    codes, uniques = _factorize(values)
+    shard = codes[1:5]
+    used = np.unique(shard[shard >= 0])
+
+    restored = _restore(shard, used, uniques[used])
+    # None и NaN различаются: preprocess кодирует их через astype(str)
+    assert restored[0] is None
+    assert restored[1:2].tolist() == ["android"] and pd.isna(restored[2]) and restored[2] is not None
+    assert restored[3] == "ios"
@@ -0,0 +1,25 @@
+# app/tests/test_persistence.py
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app.models.prediction import Prediction
+from app.services.crud.prediction import bulk_insert_predictions
+
+
+def test_bulk_insert_predictions_sqlite():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+
+    rows = [(f"user{i}@example.com", i / 100, "ALLOW") for i in range(25)]
+    with Session(engine) as db:
+        # copy на SQLite откатывается на executemany
+        stats = bulk_insert_predictions(db, rows, chunk_size=10, method="copy")
+        stored = db.exec(select(Prediction).order_by(Prediction.id)).all()
+
+    assert stats["rows"] == 25
+    assert [(p.user_email, p.risk_score, p.decision) for p in stored] == rows
+    assert all(p.created_at is not None for p in stored)
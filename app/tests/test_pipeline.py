@@ -0,0 +1,110 @@
+# app/tests/test_pipeline.py
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from app.ml.fe import apply_feature_engineering
+from app.ml.preprocess import preprocess_for_model
+from app.ml.model import predict, FEATURES
+from app.ml.fetch import normalize_email, to_signed_counts
+from app.ml.pipeline import build_realtime_features, run_multi_user_pipeline, score_batch_frame
+from app.ml.snapshot import email_key
+
+# Колонки в порядке SELECT из _build_features_query
+COLUMNS = (
+    "user_email", "n_sales", "n_declines", "decline_ratio", "avg_sale_amount",
+    "max_sale_amount", "min_sale_amount", "n_active_days", "sales_density",
+    "min_sale_date", "unique_countries", "unique_card_brands", "unique_gateways",
+    "unique_mids", "unique_sites", "unique_projects", "n_trials", "n_rebills",
+    "n_upgrades", "n_conversions", "n_onetime", "multi_site_flag",
+    "multi_project_flag", "geo_mismatch_any", "main_affiliate", "unique_affiliates",
+    "n_members", "n_dc_events", "first_reg_date", "last_reg_date", "n_reg_dates",
+    "members_per_regdate", "device_type", "os", "channel", "cross_ratio",
+)
+
+ROWS = [
+    (
+        "test@example.com", 12, 5, 5 / 12, 39.9, 79.0, 9.99, 4, 4 / 12,
+        date(2025, 3, 1), 2, 2, 3, 4, 3, 2, 1, 6, 0, 1, 2, 0,
+        0, 1, "unknown_affiliate", 3, 2, 14, date(2024, 1, 1), date(2025, 1, 1), 3,
+        2 / 3, "mobile", "ios", "seo", 0.75,
+    ),
+    (
+        "empty@example.com", 0, 0, 0, 0.0, 0.0, 0.0, 0, 0,
+        date(1970, 1, 1), 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+        0, 0, "", 0, 0, 0, date(1970, 1, 1), date(1970, 1, 1), 0,
+        float("nan"), "", "", "", float("nan"),
+    ),
+]
+
+
+def test_realtime_features_match_dataframe_path():
+    for row in ROWS:
+        expected = preprocess_for_model(
+            apply_feature_engineering(pd.DataFrame([row], columns=list(COLUMNS)))
+        )
+        X = build_realtime_features(COLUMNS, row)
+
+        assert list(X.columns) == FEATURES
+        assert np.allclose(X.to_numpy(dtype=float), expected.to_numpy(dtype=float))
+        assert float(predict(X)[0]) == float(predict(expected)[0])
+
+
+def _columnar_frame(rows) -> pd.DataFrame:
+    """
+    Как query_df: UInt64-счётчики, Float64, Date → datetime64, строки → object.
+    """
+    df = pd.DataFrame(rows, columns=list(COLUMNS))
+    for col, value in zip(COLUMNS, rows[0]):
+        if isinstance(value, date):
+            df[col] = pd.to_datetime(df[col])
+        elif isinstance(value, int):
+            df[col] = df[col].astype("uint64")
+        elif isinstance(value, float):
+            df[col] = df[col].astype("float64")
+    return df
+
+
+def test_columnar_frame_matches_rows_frame():
+    # ребиллов больше, чем отказов: pressure_score < 0
+    rebills = list(ROWS[0])
+    rebills[COLUMNS.index("n_rebills")] = 20
+    rows = ROWS + [tuple(rebills)]
+
+    expected_fe = apply_feature_engineering(pd.DataFrame(rows, columns=list(COLUMNS)))
+    columnar_fe = apply_feature_engineering(to_signed_counts(_columnar_frame(rows)))
+    assert columnar_fe["pressure_score"].tolist() == expected_fe["pressure_score"].tolist()
+
+    expected = score_batch_frame(pd.DataFrame(rows, columns=list(COLUMNS)))
+    result = score_batch_frame(to_signed_counts(_columnar_frame(rows)))
+    pd.testing.assert_frame_equal(result, expected)
+
+
+class ClickHouseLower:
+    """
+    Отдаёт ROWS[0] для каждого email так, как его нормализует ClickHouse:
+    lower(trim(...)) меняет регистр только ASCII-букв.
+    """
+
+    column_names = COLUMNS
+
+    def __init__(self):
+        self.result_rows = []
+
+    def query(self, query, parameters=None, settings=None):
+        fold = {c: c.lower() for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"}
+        self.result_rows = [
+            ("".join(fold.get(c, c) for c in e.strip(" ")),) + ROWS[0][1:] for e in parameters["emails"]
+        ]
+        return self
+
+
+def test_multi_user_finds_non_ascii_uppercase_email():
+    requested = ["ÄBC@X.DE", "Test@Example.com"]
+    results = run_multi_user_pipeline(ClickHouseLower(), requested)
+
+    assert normalize_email("ÄBC@X.DE") == "Äbc@x.de"
+    assert sorted(results) == sorted(normalize_email(e) for e in requested)
+    # ключ снимка/кэша realtime совпадает с ключом строки, записанной batch
+    assert email_key("ÄBC@X.DE") == email_key("Äbc@x.de") != email_key("äbc@x.de")
@@ -0,0 +1,92 @@
+# app/tests/test_predict_users.py
+import asyncio
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from sqlmodel import SQLModel, Session, select
+
+import app.routes.fraud as fraud
+from app.database.database import engine
+from app.ml.fetch import normalize_email
+from app.models.prediction import Prediction
+from app.routes.gateway import gateway_route
+from app.schemas.request import PredictUsersRequest
+from app.services.http_client import get_http_client
+from app.services.realtime_executor import start_realtime_executor, stop_realtime_executor
+from app.services.upstreams import UpstreamPool, get_realtime_upstreams
+
+
+@pytest.fixture
+def realtime(monkeypatch):
+    calls = []
+
+    def pipeline(client, emails):
+        calls.append(list(emails))
+        return {
+            normalize_email(e): {"user_email": normalize_email(e), "risk_score": 0.8, "decision": "BLOCK",
+                                 "model_version": "v"}
+            for e in emails if not e.startswith("ghost")
+        }
+
+    monkeypatch.setattr(fraud, "WORKER_MODE", "realtime")
+    monkeypatch.setattr(fraud, "get_clickhouse_pool", lambda: SimpleNamespace(connection=nullcontext))
+    monkeypatch.setattr(fraud, "run_multi_user_pipeline", pipeline)
+    monkeypatch.setattr(fraud, "get_prediction_writer", lambda: None)
+    start_realtime_executor(workers=2)
+    yield calls
+    stop_realtime_executor()
+
+
+def test_bulk_scores_once_and_reports_not_found(realtime):
+    SQLModel.metadata.create_all(engine)
+    emails = ["Bulk1@X.com", "ghost@x.com", "bulk2@x.com", " bulk1@x.com"]
+
+    response = asyncio.run(fraud.fraud_predict_users(PredictUsersRequest(user_emails=emails)))
+
+    assert realtime == [["Bulk1@X.com", "ghost@x.com", "bulk2@x.com"]]   # один запрос, без повторов
+    assert [r.user_email for r in response.results] == ["Bulk1@X.com", "bulk2@x.com"]
+    assert response.not_found == ["ghost@x.com"]
+    with Session(engine) as db:
+        stored = db.exec(select(Prediction.user_email).where(Prediction.user_email.in_(emails))).all()
+    assert sorted(stored) == ["Bulk1@X.com", "bulk2@x.com"]
+
+
+def test_bulk_rejects_too_many_emails(realtime, monkeypatch):
+    monkeypatch.setattr(fraud.get_settings(), "REALTIME_BULK_MAX_USERS", 2)
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(fraud.fraud_predict_users(PredictUsersRequest(user_emails=["a@x.com", "b@x.com", "c@x.com"])))
+
+    assert e.value.status_code == 422
+    assert realtime == []
+
+
+def test_gateway_forwards_bulk_once():
+    sent = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"results": [], "not_found": ["a@x.com"]})
+
+    upstreams = UpstreamPool(["http://r1", "http://r2"])
+    app = FastAPI()
+    app.include_router(gateway_route, prefix="/api")
+    app.dependency_overrides[get_http_client] = lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    app.dependency_overrides[get_realtime_upstreams] = lambda: upstreams
+
+    async def call():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gw") as http:
+            ok = await http.post("/api/fraud/predict/users", json={"user_emails": ["a@x.com"]})
+            empty = await http.post("/api/fraud/predict/users", json={"user_emails": []})
+            return ok, empty
+
+    ok, empty = asyncio.run(call())
+
+    assert ok.status_code == 200 and ok.json()["not_found"] == ["a@x.com"]
+    assert empty.status_code == 422
+    assert len(sent) == 1 and sent[0].url.path == "/predict/users"
+    assert upstreams.stats()["retried"] == 0
@@ -0,0 +1,135 @@
+# app/tests/test_prediction_writer.py
+import os
+import socket
+import time
+from datetime import datetime
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app.models.prediction import Prediction
+from app.services.prediction_writer import PredictionWriter
+
+
+def _engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def _stored(engine) -> list[Prediction]:
+    with Session(engine) as db:
+        return db.exec(select(Prediction).order_by(Prediction.id)).all()
+
+
+def test_writer_flushes_in_batches_and_on_stop(tmp_path):
+    engine = _engine()
+    writer = PredictionWriter(
+        session_factory=lambda: Session(engine),
+        flush_rows=10,
+        flush_interval_ms=10_000,
+        spill_dir=str(tmp_path),
+    )
+    writer.start()
+    for i in range(25):
+        assert writer.submit(f"user{i}@example.com", i / 100, "ALLOW")
+
+    # две полные пачки уходят сразу, хвост — при остановке
+    deadline = time.monotonic() + 5
+    while writer.stats()["written"] < 20 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.stats()["written"] == 20
+    submitted_by = datetime.utcnow()
+    writer.stop()
+
+    stored = _stored(engine)
+    assert [p.user_email for p in stored] == [f"user{i}@example.com" for i in range(25)]
+    assert all(p.created_at <= submitted_by for p in stored)   # время скоринга, а не записи
+    assert writer.stats()["flushes"] == 3
+
+
+def test_overflow_spills_and_replays(tmp_path):
+    broken = PredictionWriter(
+        session_factory=lambda: (_ for _ in ()).throw(ConnectionError("db down")),
+        max_queue=2,
+        flush_retries=0,
+        spill_dir=str(tmp_path),
+    )
+    # поток не запущен: очередь из 2 мест заполняется, остальное — в spill
+    accepted = [broken.submit(f"u{i}@x.com", 0.9, "BLOCK") for i in range(5)]
+    broken.stop()
+
+    assert accepted == [True, True, False, False, False]
+    assert broken.stats()["spilled"] == 5
+    assert broken.stats()["dropped"] == 0
+
+    engine = _engine()
+    writer = PredictionWriter(session_factory=lambda: Session(engine), spill_dir=str(tmp_path))
+    writer.start()
+    writer.stop()
+
+    assert sorted(p.user_email for p in _stored(engine)) == [f"u{i}@x.com" for i in range(5)]
+    assert writer.stats()["replayed"] == 5
+    assert not list(tmp_path.iterdir())
+
+
+def test_drop_policy_counts_rejected_records(tmp_path):
+    writer = PredictionWriter(
+        session_factory=lambda: Session(_engine()),
+        max_queue=3,
+        overflow_policy="drop",
+        spill_dir=str(tmp_path),
+    )
+
+    accepted = [writer.submit(f"u{i}@x.com", 0.1, "ALLOW") for i in range(5)]
+
+    assert accepted.count(False) == 2
+    assert writer.stats()["dropped"] == 2
+    assert not list(tmp_path.iterdir())
+
+
+def test_spill_files_are_owned_per_container(tmp_path):
+    engine = _engine()
+    writer = PredictionWriter(session_factory=lambda: Session(engine), spill_dir=str(tmp_path))
+    # у каждого контейнера свой файл, хотя pid везде 1
+    assert writer._spill_path.name.startswith(f"spill-{socket.gethostname()}.{os.getpid()}.")
+
+    row = '["{email}", 0.5, "REVIEW", "2026-01-01T00:00:00"]\n'
+    files = {
+        # другой контейнер: spill дописывается прямо сейчас, replay — в работе
+        "spill-other-host.1.aaaa.jsonl": ("busy-spill@x.com", 0),
+        "replay-other-host.1.bbbb-0.jsonl": ("busy-replay@x.com", 0),
+        # другой контейнер упал: файлы давно не трогали
+        "spill-dead-host.1.cccc.jsonl": ("old-spill@x.com", 30),
+        "replay-dead-host.1.dddd-3.jsonl": ("old-replay@x.com", 120),
+        # прошлый запуск этого контейнера: тот же hostname и pid, другой nonce
+        f"replay-{socket.gethostname()}.{os.getpid()}.eeee-0.jsonl": ("restart@x.com", 0),
+    }
+    now = time.time()
+    for name, (email, age) in files.items():
+        path = tmp_path / name
+        path.write_text(row.format(email=email))
+        os.utime(path, (now - age, now - age))
+
+    writer.start()
+    writer.stop()
+
+    assert sorted(p.user_email for p in _stored(engine)) == ["old-replay@x.com", "old-spill@x.com", "restart@x.com"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["replay-other-host.1.bbbb-0.jsonl", "spill-other-host.1.aaaa.jsonl"]
+
+
+def test_submit_many_queues_what_fits_and_spills_the_rest(tmp_path):
+    writer = PredictionWriter(session_factory=None, max_queue=3, spill_dir=str(tmp_path))   # поток не запущен
+    rows = [(f"u{i}@x.com", 0.5, "REVIEW") for i in range(5)]
+
+    assert writer.submit_many_nowait(rows) == 3
+    assert writer.submit_many_nowait(rows[3:]) == 0   # без ожидания и без диска
+    assert not list(tmp_path.iterdir())
+
+    assert writer.submit_many(rows[3:]) == 0
+    assert writer.stats()["submitted"] == 5 and writer.stats()["spilled"] == 2
+    assert len(writer._spill_path.read_text().splitlines()) == 2
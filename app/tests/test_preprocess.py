@@ -11,3 +11,18 @@ def test_preprocess_contract():
 
     assert list(X.columns) == FEATURES
     assert X.shape[1] == len(FEATURES)
+
+
+def test_label_encoding_matches_encoders():
+    from app.ml.preprocess import LABEL_ENCODERS, ENCODING_TABLES, encode_column
+
+    for col, encoder in LABEL_ENCODERS.items():
+        values = pd.Series(list(encoder.classes_) + ["__unknown__", None])
+
+        expected = encoder.transform(
+            values.astype(str).map(
+                lambda v: v if v in encoder.classes_ else encoder.classes_[0]
+            )
+        )
+
+        assert list(encode_column(values, ENCODING_TABLES[col])) == list(expected)
@@ -0,0 +1,221 @@
+# app/tests/test_realtime_async.py
+import asyncio
+import threading
+import time
+from contextlib import nullcontext
+
+import httpx
+from fastapi import FastAPI
+from sqlmodel import SQLModel, Session, select
+
+import app.routes.fraud as fraud
+from app.database.config import get_settings as get_db_settings
+from app.database.database import async_session, close_async_engine, engine, get_async_engine
+from app.models.prediction import Prediction
+from app.services.microbatch import MicroBatcher
+from app.services.prediction_writer import PredictionWriter
+from app.services.realtime_executor import start_realtime_executor, stop_realtime_executor
+
+
+def test_async_microbatch_requests_wait_without_threads():
+    calls = []
+
+    def score_fn(client, emails):
+        calls.append(list(emails))
+        time.sleep(0.01)
+        return {e: {"user_email": e, "risk_score": 0.9, "decision": "BLOCK"} for e in emails}
+
+    batcher = MicroBatcher(score_fn=score_fn, connection_factory=nullcontext, max_batch_size=64, max_wait_ms=20)
+    batcher.start()
+    threads = threading.active_count()
+
+    async def burst():
+        results = await asyncio.gather(*(batcher.score_async(f"User{i}@x.com") for i in range(300)))
+        return results, threading.active_count()
+
+    try:
+        results, threads_after = asyncio.run(burst())
+    finally:
+        batcher.stop()
+
+    assert [r["user_email"] for r in results] == [f"User{i}@x.com" for i in range(300)]
+    assert sum(map(len, calls)) == 300 and len(calls) < 20
+    assert threads_after == threads   # ожидающие запросы не держат потоков
+
+
+def test_async_route_scores_in_sized_executor(monkeypatch, tmp_path):
+    SQLModel.metadata.create_all(engine)
+    writer = PredictionWriter(session_factory=lambda: Session(engine), spill_dir=str(tmp_path))
+    peak, active, lock = [0], [0], threading.Lock()
+
+    def score_user(user_email):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return {"user_email": user_email, "risk_score": 0.2, "decision": "REVIEW", "model_version": "v"}
+
+    monkeypatch.setattr(fraud, "WORKER_MODE", "realtime")
+    monkeypatch.setattr(fraud, "_score_user", score_user)
+    monkeypatch.setattr(fraud, "get_microbatcher", lambda: None)
+    monkeypatch.setattr(fraud, "get_prediction_writer", lambda: writer)
+
+    emails = [f"async{i}@x.com" for i in range(40)]
+
+    async def burst():
+        return await asyncio.gather(*(fraud.fraud_predict_user(e) for e in emails))
+
+    stop_realtime_executor()
+    start_realtime_executor(workers=4)
+    writer.start()
+    try:
+        responses = asyncio.run(burst())
+    finally:
+        stop_realtime_executor()
+        writer.stop()
+
+    assert [r.user_email for r in responses] == emails
+    assert peak[0] <= 4
+    with Session(engine) as db:
+        stored = db.exec(select(Prediction.user_email).where(Prediction.user_email.in_(emails))).all()
+    assert sorted(stored) == sorted(emails)
+
+
+def test_cancelled_async_request_does_not_break_batcher():
+    def score_fn(client, emails):
+        return {e: {"user_email": e, "risk_score": 0.1, "decision": "ALLOW"} for e in emails}
+
+    batcher = MicroBatcher(score_fn=score_fn, connection_factory=nullcontext, max_wait_ms=50)
+    batcher.start()
+
+    async def scenario():
+        waiting = asyncio.ensure_future(batcher.score_async("gone@x.com"))
+        await asyncio.sleep(0.01)
+        waiting.cancel()   # клиент отключился, пока батч собирался
+        return await asyncio.wait_for(batcher.score_async("next@x.com"), timeout=5)
+
+    try:
+        result = asyncio.run(scenario())
+    finally:
+        batcher.stop()
+
+    assert result["user_email"] == "next@x.com"
+
+
+def test_full_write_behind_queue_does_not_block_event_loop(monkeypatch, tmp_path):
+    writer = PredictionWriter(
+        session_factory=None, max_queue=1, overflow_policy="block", block_timeout_ms=200, spill_dir=str(tmp_path),
+    )
+    assert writer.submit("first@x.com", 0.1, "ALLOW")   # поток не запущен — очередь полна
+    monkeypatch.setattr(fraud, "get_prediction_writer", lambda: writer)
+    result = {"user_email": "second@x.com", "risk_score": 0.9, "decision": "BLOCK"}
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.ensure_future(ticker())
+        start = time.perf_counter()
+        await fraud._persist_prediction(result)
+        elapsed = time.perf_counter() - start
+        ticking.cancel()
+        return ticks, elapsed
+
+    stop_realtime_executor()
+    start_realtime_executor(workers=2)
+    try:
+        ticks, elapsed = asyncio.run(scenario())
+    finally:
+        stop_realtime_executor()
+
+    # block ждал место 200 мс в пуле realtime, а loop всё это время обслуживал другие задачи
+    assert elapsed >= 0.2
+    assert ticks >= 10
+    assert writer.stats()["dropped"] == 1
+
+
+def test_bulk_persist_queues_batch_without_blocking_event_loop(monkeypatch, tmp_path):
+    writer = PredictionWriter(
+        session_factory=None, max_queue=600, overflow_policy="block", block_timeout_ms=200, spill_dir=str(tmp_path),
+    )
+    monkeypatch.setattr(fraud, "get_prediction_writer", lambda: writer)
+    results = [{"user_email": f"bulk{i}@x.com", "risk_score": 0.5, "decision": "REVIEW"} for i in range(1000)]
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.ensure_future(ticker())
+        await fraud._persist_predictions(results)
+        ticking.cancel()
+        return ticks
+
+    stop_realtime_executor()
+    start_realtime_executor(workers=2)
+    try:
+        ticks = asyncio.run(scenario())
+    finally:
+        stop_realtime_executor()
+
+    # 600 записей — в очередь сразу, хвост ждал место в пуле realtime и отброшен
+    assert ticks >= 10
+    assert writer.stats()["queue_size"] == 600
+    assert writer.stats()["dropped"] == 400
+
+
+def test_routes_persist_through_async_session(monkeypatch):
+    monkeypatch.setenv("USE_ASYNC", "1")
+    get_db_settings.cache_clear()
+    monkeypatch.setattr(fraud, "WORKER_MODE", "realtime")
+    monkeypatch.setattr(fraud, "get_prediction_writer", lambda: None)
+    monkeypatch.setattr(fraud, "get_single_flight", lambda: None)
+    monkeypatch.setattr(fraud, "get_microbatcher", lambda: None)
+    monkeypatch.setattr(
+        fraud, "_score_user",
+        lambda email: {"user_email": email, "risk_score": 0.7, "decision": "REVIEW", "model_version": "v"},
+    )
+    monkeypatch.setattr(
+        fraud, "_score_users",
+        lambda emails: {e: {"user_email": e, "risk_score": 0.9, "decision": "BLOCK", "model_version": "v"} for e in emails},
+    )
+
+    app = FastAPI()
+    app.include_router(fraud.fraud_route)
+
+    async def scenario():
+        async with get_async_engine().begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+                single = await http.get("/predict/user/async-one@x.com")
+                bulk = await http.post("/predict/users", json={"user_emails": ["async-a@x.com", "async-b@x.com"]})
+            async with async_session() as db:
+                stored = (await db.exec(select(Prediction.user_email, Prediction.decision))).all()
+        finally:
+            await close_async_engine()
+        return single, bulk, stored
+
+    stop_realtime_executor()
+    start_realtime_executor(workers=2)
+    try:
+        assert get_db_settings().USE_ASYNC
+        single, bulk, stored = asyncio.run(scenario())
+    finally:
+        stop_realtime_executor()
+        monkeypatch.delenv("USE_ASYNC")
+        get_db_settings.cache_clear()
+
+    assert single.status_code == 200 and bulk.status_code == 200
+    assert sorted(stored) == [("async-a@x.com", "BLOCK"), ("async-b@x.com", "BLOCK"), ("async-one@x.com", "REVIEW")]
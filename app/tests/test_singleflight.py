@@ -0,0 +1,123 @@
+# app/tests/test_singleflight.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from prometheus_client import REGISTRY
+
+import app.routes.fraud as fraud
+from app.services.prediction_writer import PredictionWriter
+from app.services.realtime_executor import start_realtime_executor, stop_realtime_executor
+from app.services.singleflight import SingleFlight
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert condition()
+
+
+def test_sync_callers_share_one_execution():
+    flight = SingleFlight("test-sync")
+    release = threading.Event()
+    calls = []
+
+    def lookup():
+        calls.append(1)
+        release.wait(5)
+        return {"risk_score": 0.9}
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        futures = [pool.submit(flight.do, "card@x.com", lookup) for _ in range(10)]
+        _wait_for(lambda: flight.stats()["coalesced"] == 9)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 9}
+    assert REGISTRY.get_sample_value("antifraud_singleflight_coalesced_total", {"name": "test-sync"}) == 9
+
+    # ключ освобождён — следующий вызов выполняется заново
+    assert flight.do("card@x.com", lambda: "fresh") == "fresh"
+
+
+def test_async_and_sync_callers_coalesce_and_share_errors():
+    flight = SingleFlight("test-async")
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise TimeoutError("clickhouse")
+
+    async def scenario():
+        waiters = [asyncio.ensure_future(flight.do_async("k", lookup)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        # синхронный вызов из потока присоединяется к async-выполнению
+        sync_waiter = asyncio.get_running_loop().run_in_executor(None, flight.do, "k", lambda: "not called")
+        return await asyncio.gather(*waiters, sync_waiter, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert all(isinstance(r, TimeoutError) for r in results)
+    assert flight.stats()["coalesced"] == 5
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight("test-cancel")
+
+    async def lookup():
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.do_async("k", lookup))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do_async("k", lookup))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower, leader
+
+    value, leader = asyncio.run(scenario())
+
+    assert value == 42
+    assert leader.cancelled()
+
+
+def test_route_coalesces_same_normalized_email(monkeypatch, tmp_path):
+    calls = []
+
+    def score_user(user_email):
+        calls.append(user_email)
+        time.sleep(0.05)
+        return {"user_email": user_email, "risk_score": 0.95, "decision": "BLOCK", "model_version": "v"}
+
+    flight = SingleFlight("test-route")
+    monkeypatch.setattr(fraud, "WORKER_MODE", "realtime")
+    monkeypatch.setattr(fraud, "_score_user", score_user)
+    monkeypatch.setattr(fraud, "get_microbatcher", lambda: None)
+    monkeypatch.setattr(fraud, "get_single_flight", lambda: flight)
+    writer = PredictionWriter(session_factory=None, spill_dir=str(tmp_path))   # поток не запущен
+    monkeypatch.setattr(fraud, "get_prediction_writer", lambda: writer)
+
+    emails = ["Card@X.com", " card@x.com", "card@x.com "] * 10
+
+    async def burst():
+        return await asyncio.gather(*(fraud.fraud_predict_user(e) for e in emails))
+
+    start_realtime_executor(workers=2)
+    try:
+        responses = asyncio.run(burst())
+    finally:
+        stop_realtime_executor()
+
+    assert len(calls) == 1
+    assert [r.user_email for r in responses] == emails
+    assert {r.decision for r in responses} == {"BLOCK"}
+    assert flight.stats()["coalesced"] == len(emails) - 1
+    assert writer.stats()["submitted"] == len(emails)   # предсказание сохраняет каждый запрос
+
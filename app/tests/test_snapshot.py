@@ -0,0 +1,114 @@
+# app/tests/test_snapshot.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.ml.fe import apply_feature_engineering
+from app.ml.model import predict
+from app.ml.preprocess import preprocess_for_model
+from app.ml.snapshot import SnapshotReader, SnapshotWriter
+from app.tests.test_pipeline import COLUMNS, ROWS
+
+
+def _model_ready():
+    df = pd.DataFrame(ROWS, columns=list(COLUMNS))
+    return df["user_email"], preprocess_for_model(apply_feature_engineering(df))
+
+
+def test_snapshot_lookup_matches_batch_rows(tmp_path):
+    emails, X = _model_ready()
+    writer = SnapshotWriter(str(tmp_path), feature_days=365)
+    writer.add(emails, X)
+    writer.publish()
+
+    reader = SnapshotReader(str(tmp_path), check_seconds=0)
+    for i, email in enumerate(emails):
+        row = reader.lookup(email.upper() + " ", feature_days=365)
+        assert np.array_equal(row.to_numpy(), X.iloc[[i]].to_numpy(dtype=float))
+        assert float(predict(row)[0]) == float(predict(X.iloc[[i]])[0])
+
+    assert reader.lookup("missing@example.com") is None
+    assert reader.lookup(emails[0], feature_days=730) is None
+
+    found, matrix = reader.lookup_many(["missing@example.com", emails[1]])
+    assert found == [emails[1]]
+    assert np.array_equal(matrix, X.iloc[[1]].to_numpy(dtype=float))
+
+
+def test_snapshot_swap_keeps_old_version_readable(tmp_path):
+    emails, X = _model_ready()
+    reader = SnapshotReader(str(tmp_path), check_seconds=0)
+    assert reader.current() is None
+
+    first = SnapshotWriter(str(tmp_path), keep=1)
+    first.add(emails[:1], X.iloc[:1])
+    first.publish()
+    old = reader.current()
+
+    second = SnapshotWriter(str(tmp_path), keep=1)
+    second.add(emails, X)
+    second.publish()
+    new = reader.current()
+
+    assert new is not old
+    assert len(new) == 2
+    # каталог старой версии удалён, но открытый mmap продолжает читаться
+    assert old.find(emails[0]) == 0
+    assert np.array_equal(np.asarray(old.matrix[0]), X.iloc[0].to_numpy(dtype=float))
+
+
+def test_stale_snapshot_is_a_miss(tmp_path):
+    emails, X = _model_ready()
+    writer = SnapshotWriter(str(tmp_path))
+    writer.add(emails, X)
+    writer.publish()
+
+    reader = SnapshotReader(str(tmp_path), max_age_seconds=-1, check_seconds=0)
+    assert reader.lookup(emails[0]) is None
+    assert reader.stats()["stale"] == 1
+
+
+def test_snapshot_of_another_model_version_is_rejected(tmp_path):
+    emails, X = _model_ready()
+    writer = SnapshotWriter(str(tmp_path))
+    writer.add(emails, X, model_version="v-old")
+    with pytest.raises(ValueError):
+        writer.add(emails, X, model_version="v-new")
+    writer.publish()
+
+    reader = SnapshotReader(str(tmp_path), check_seconds=0)
+    assert reader.current().model_version == "v-old"
+    assert reader.lookup(emails[0], model_version="v-old") is not None
+
+    # encoders сменились вместе с версией — закодированные строки снимка больше не годятся
+    assert reader.lookup(emails[0], model_version="v-new") is None
+    assert reader.lookup_many(list(emails), model_version="v-new")[0] == []
+    assert reader.lookup(emails[0]) is None   # текущая модель — не v-old
+    stats = reader.stats()
+    assert stats["model_mismatch"] == 1 + len(emails) + 1
+    assert stats["hits"] == 1
+
+
+def test_writer_stages_chunks_on_disk(tmp_path):
+    emails, X = _model_ready()
+    writer = SnapshotWriter(str(tmp_path))
+    # чанки с повтором email: побеждает последняя строка
+    writer.add(emails, X)
+    writer.add(emails[:1], X.iloc[[1]])
+    assert writer.rows == len(X) + 1
+    assert not hasattr(writer, "_matrices")   # в памяти ничего не копится
+    staging = [p for p in tmp_path.iterdir() if p.name.startswith(".tmp-")]
+    assert len(staging) == 1 and (staging[0] / "matrix.bin").stat().st_size == (len(X) + 1) * X.shape[1] * 8
+
+    writer.publish()
+    assert not [p for p in tmp_path.iterdir() if p.name.startswith(".tmp-")]
+    reader = SnapshotReader(str(tmp_path), check_seconds=0)
+    assert len(reader.current()) == len(X)
+    assert np.array_equal(reader.lookup(emails[0]).to_numpy(), X.iloc[[1]].to_numpy(dtype=float))
+    assert np.array_equal(reader.lookup(emails[1]).to_numpy(), X.iloc[[1]].to_numpy(dtype=float))
+
+    # оборвавшийся прогон не оставляет временного каталога
+    aborted = SnapshotWriter(str(tmp_path))
+    aborted.add(emails, X)
+    aborted.discard()
+    assert not [p for p in tmp_path.iterdir() if p.name.startswith(".tmp-")]
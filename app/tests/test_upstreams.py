@@ -0,0 +1,102 @@
+# app/tests/test_upstreams.py
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes.gateway import gateway_route
+from app.services.http_client import get_http_client
+from app.services.upstreams import UpstreamPool, get_realtime_upstreams
+
+
+def _client(handlers: dict) -> httpx.AsyncClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return await handlers[request.url.host](request)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_failing_upstream_is_ejected():
+    async def ok(request):
+        return httpx.Response(200, json={"host": request.url.host})
+
+    async def broken(request):
+        return httpx.Response(503)
+
+    async def scenario():
+        pool = UpstreamPool(["http://a", "http://b"], strategy="round_robin", max_failures=2, eject_seconds=60)
+        async with _client({"a": ok, "b": broken}) as client:
+            statuses = [(await pool.request(client, "GET", "/predict/user/x")).status_code for _ in range(10)]
+        return pool, statuses
+
+    pool, statuses = asyncio.run(scenario())
+    stats = {u["url"]: u for u in pool.stats()["upstreams"]}
+
+    assert stats["http://b"]["available"] is False
+    assert stats["http://b"]["requests"] == 2
+    assert statuses[-6:] == [200] * 6
+
+
+def test_connection_error_fails_over():
+    async def ok(request):
+        return httpx.Response(200)
+
+    async def down(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    async def scenario():
+        pool = UpstreamPool(["http://a", "http://b"], strategy="round_robin")
+        async with _client({"a": down, "b": ok}) as client:
+            return pool, [(await pool.request(client, "GET", "/")).status_code for _ in range(4)]
+
+    pool, statuses = asyncio.run(scenario())
+    assert statuses == [200] * 4
+    assert pool.retried > 0
+
+
+def test_request_that_reached_replica_is_not_retried():
+    sent = []
+
+    async def timeout(request):
+        sent.append(request.url.host)
+        raise httpx.ReadTimeout("no response", request=request)
+
+    async def broken(request):
+        sent.append(request.url.host)
+        raise httpx.RemoteProtocolError("connection closed", request=request)
+
+    async def scenario(handlers):
+        pool = UpstreamPool(["http://a", "http://b"], strategy="round_robin")
+        async with _client(handlers) as client:
+            with pytest.raises(httpx.TransportError):
+                await pool.request(client, "GET", "/predict/user/x")
+        return pool
+
+    for handler in (timeout, broken):
+        sent.clear()
+        pool = asyncio.run(scenario({"a": handler, "b": handler}))
+        # реплика могла уже записать предсказание — во вторую запрос не уходит
+        assert sent == ["a"]
+        assert pool.retried == 0
+
+
+def test_gateway_sends_prediction_once():
+    sent = []
+
+    async def slow(request):
+        sent.append(request.url.host)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"user_email": "x@y.com", "risk_score": 0.5, "decision": "REVIEW"})
+
+    pool = UpstreamPool(["http://a", "http://b"])
+    app = FastAPI()
+    app.include_router(gateway_route, prefix="/api")
+    app.dependency_overrides[get_http_client] = lambda: _client({"a": slow, "b": slow})
+    app.dependency_overrides[get_realtime_upstreams] = lambda: pool
+
+    r = TestClient(app).get("/api/fraud/predict/user/x@y.com")
+
+    assert r.status_code == 200
+    assert len(sent) == 1   # воркер сохраняет предсказание — второй копии запроса нет